@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+データ収集のレイテンシ・ベンチマーク
+スタブサーバー（scripts/collector/stub_server.py）に対して、同時取得（接続プール共有）と
+逐次取得（リクエストごとに新規接続）の1回分の収集時間を比較する。ネットワークは使わない。
+同時取得はレスポンスキャッシュ（条件付きリクエスト）の有無でも計測する。
+
+使い方:
+    python benchmarks/bench_collector.py [--runs 20] [--delay-ms 80] [--json bench_output.json]
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List
+
+import requests
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from scripts.collector import CollectorConfig, collect_async, create_session
+from scripts.collector.http_cache import ResponseCache
+from scripts.collector.runner import build_requests, observation_time, source_parsers
+from scripts.collector.stub_server import start_stub_server
+from scripts.history_store import JST
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    ordered = sorted(samples)
+
+    def pick(q: float) -> float:
+        return round(ordered[min(int(q * len(ordered)), len(ordered) - 1)], 2)
+
+    return {
+        'min': round(ordered[0], 2),
+        'p50': pick(0.50),
+        'p95': pick(0.95),
+        'max': round(ordered[-1], 2),
+        'mean': round(statistics.mean(ordered), 2)
+    }
+
+
+def run_sequential(config: CollectorConfig) -> float:
+    """逐次取得（従来方式）: ソースごとに新規接続で順番に取得して解析"""
+    started = time.perf_counter()
+    now = datetime.now(JST)
+    obs_time = observation_time(now)
+    parsers = source_parsers(config, obs_time)
+    for name, request in build_requests(config, obs_time).items():
+        response = requests.get(request['url'], params=request['params'], timeout=config.timeouts.get(name, 15.0))
+        response.raise_for_status()
+        parsers[name](response.content)
+    return (time.perf_counter() - started) * 1000
+
+
+def run_benchmark(runs: int, delay_ms: float) -> Dict[str, Any]:
+    server = start_stub_server(delay_ms=delay_ms)
+    base = server.base_url
+    config = CollectorConfig(bousai_base=base, yahoo_base=base, jma_base=base, yahoo_appid="stub")
+
+    sequential = [run_sequential(config) for _ in range(runs)]
+
+    async def concurrent_runs(cache=None) -> List[float]:
+        session = create_session(config.pool_size)
+        samples = []
+        try:
+            for _ in range(runs):
+                outcome = await collect_async(config, session=session, cache=cache)
+                if outcome['errors']:
+                    raise RuntimeError(f"収集に失敗しました: {outcome['errors']}")
+                samples.append(outcome['timings']['total_ms'])
+        finally:
+            session.close()
+        return samples
+
+    concurrent = asyncio.run(concurrent_runs())
+    cache = ResponseCache()
+    cached = asyncio.run(concurrent_runs(cache))
+    server.shutdown()
+
+    return {
+        'runs': runs,
+        'delay_ms': delay_ms,
+        'sequential_ms': percentiles(sequential),
+        'concurrent_ms': percentiles(concurrent),
+        'concurrent_cached_ms': percentiles(cached),
+        'cache': cache.metrics_dict(),
+        'speedup_p50': round(percentiles(sequential)['p50'] / max(percentiles(concurrent)['p50'], 0.01), 2)
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="データ収集のレイテンシ・ベンチマーク")
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--delay-ms", type=float, default=80.0, help="スタブサーバーの応答遅延（上流の応答時間の想定）")
+    parser.add_argument("--json", type=Path, help="結果をJSONで保存")
+    args = parser.parse_args()
+
+    result = run_benchmark(args.runs, args.delay_ms)
+    print(f"逐次取得: {result['sequential_ms']}")
+    print(f"同時取得: {result['concurrent_ms']}")
+    print(f"同時取得（キャッシュあり）: {result['concurrent_cached_ms']}")
+    print(f"p50 短縮倍率: {result['speedup_p50']}x")
+    if args.json:
+        args.json.write_text(json.dumps(result, ensure_ascii=False, indent=2), encoding='utf-8')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+履歴データ圧縮のベンチマーク
+非圧縮JSON（HHMM.json）と各圧縮形式について、ディスク使用量・コールド読み込み・ウォーム読み込みを比較する
+
+使い方:
+    python benchmarks/bench_history_compression.py                 # data/history を対象
+    python benchmarks/bench_history_compression.py --synthetic-days 365
+    python benchmarks/bench_history_compression.py --json bench_output.json
+
+コールド読み込みは posix_fadvise(DONTNEED) でページキャッシュを破棄してから計測する（対応OSのみ）。
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from scripts import history_codec
+from scripts.history_codec import available_codecs, build_dictionary, save_dictionary
+from scripts.history_store import (
+    JST, compact_day, iter_day_dirs, load_day_snapshots, snapshot_key, write_snapshot
+)
+
+
+def load_source_snapshots(history_dir: Path) -> List[Dict[str, Any]]:
+    """既存の履歴データを時刻順に読み込む"""
+    snapshots = []
+    for day_dir in iter_day_dirs(history_dir):
+        day_snapshots, _ = load_day_snapshots(day_dir)
+        snapshots.extend(day_snapshots)
+    return snapshots
+
+
+def synthesize_snapshots(templates: List[Dict[str, Any]], days: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """実データをひな形に、10分間隔で days 日分のスナップショットを作る"""
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1, tzinfo=JST)
+    snapshots = []
+    for i in range(days * 144):
+        data_time = start + timedelta(minutes=10 * i)
+        data = json.loads(json.dumps(templates[i % len(templates)]))
+        data['data_time'] = data_time.isoformat()
+        data['timestamp'] = (data_time + timedelta(minutes=rng.randint(3, 9), seconds=rng.random())).isoformat()
+        if data.get('dam', {}).get('water_level') is not None:
+            data['dam']['water_level'] = round(data['dam']['water_level'] + rng.uniform(-0.05, 0.05), 2)
+        if data.get('river', {}).get('water_level') is not None:
+            data['river']['water_level'] = round(data['river']['water_level'] + rng.uniform(-0.02, 0.02), 2)
+        snapshots.append(data)
+    return snapshots
+
+
+def dir_usage(root: Path) -> Dict[str, int]:
+    """ファイル数・論理サイズ・実ブロック使用量"""
+    files = [p for p in root.rglob('*') if p.is_file()]
+    return {
+        'files': len(files),
+        'bytes': sum(p.stat().st_size for p in files),
+        'disk_bytes': sum(getattr(p.stat(), 'st_blocks', 0) * 512 for p in files)
+    }
+
+
+def drop_page_cache(root: Path) -> bool:
+    """ページキャッシュを破棄（非対応環境では False）"""
+    if not hasattr(os, 'posix_fadvise'):
+        return False
+    for path in root.rglob('*'):
+        if not path.is_file():
+            continue
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(fd)
+    return True
+
+
+def read_all(history_dir: Path) -> int:
+    """全日付を読み込み、件数を返す"""
+    count = 0
+    for day_dir in iter_day_dirs(history_dir):
+        day_snapshots, _ = load_day_snapshots(day_dir)
+        count += len(day_snapshots)
+    return count
+
+
+def build_variant(root: Path, snapshots: List[Dict[str, Any]], layout: str, codec: Optional[str]) -> Path:
+    """指定レイアウト・圧縮形式で履歴ディレクトリを作成"""
+    history_dir = root / f"{layout}-{codec or 'plain'}"
+    if codec in ('zlib', 'zstd'):
+        samples = [json.dumps(data, ensure_ascii=False, indent=2).encode('utf-8') for data in snapshots[-1000:]]
+        save_dictionary(history_dir, build_dictionary(samples, codec), codec)
+
+    for data in snapshots:
+        write_snapshot(history_dir, data, mode="files", codec=codec if layout == "files" else None)
+    if layout == "compacted":
+        for day_dir in iter_day_dirs(history_dir):
+            compact_day(day_dir, codec=codec)
+    return history_dir
+
+
+def bench_variant(history_dir: Path, expected: int, warm_runs: int) -> Dict[str, Any]:
+    result = dir_usage(history_dir)
+
+    history_codec.clear_dictionary_cache()
+    result['cold_cache_dropped'] = drop_page_cache(history_dir)
+    t0 = time.perf_counter()
+    count = read_all(history_dir)
+    result['cold_read_ms'] = round((time.perf_counter() - t0) * 1000, 2)
+    if count != expected:
+        raise RuntimeError(f"{history_dir.name}: 読み込み件数が一致しません ({count} != {expected})")
+
+    timings = []
+    for _ in range(warm_runs):
+        t0 = time.perf_counter()
+        read_all(history_dir)
+        timings.append((time.perf_counter() - t0) * 1000)
+    result['warm_read_ms'] = round(min(timings), 2)
+    return result
+
+
+def run_benchmark(snapshots: List[Dict[str, Any]], label: str, warm_runs: int) -> Dict[str, Any]:
+    variants = [("files", None)]
+    variants += [("files", codec) for codec in available_codecs()]
+    variants += [("compacted", None)]
+    variants += [("compacted", codec) for codec in available_codecs()]
+
+    results = {}
+    root = Path(tempfile.mkdtemp(prefix="kotogawa-bench-"))
+    try:
+        for layout, codec in variants:
+            name = f"{layout}/{codec or 'plain'}"
+            history_dir = build_variant(root, snapshots, layout, codec)
+            results[name] = bench_variant(history_dir, len(snapshots), warm_runs)
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    baseline = results["files/plain"]
+    for result in results.values():
+        result['size_ratio'] = round(result['bytes'] / baseline['bytes'], 4)
+    return {'dataset': label, 'snapshots': len(snapshots), 'results': results}
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    print(f"\n## {report['dataset']} ({report['snapshots']} snapshots)")
+    print(f"{'variant':<20}{'files':>8}{'bytes':>14}{'disk_bytes':>14}{'ratio':>8}{'cold_ms':>10}{'warm_ms':>10}")
+    for name, r in report['results'].items():
+        print(f"{name:<20}{r['files']:>8}{r['bytes']:>14}{r['disk_bytes']:>14}{r['size_ratio']:>8}"
+              f"{r['cold_read_ms']:>10}{r['warm_read_ms']:>10}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="履歴データ圧縮のベンチマーク")
+    parser.add_argument("--history-dir", type=Path, default=Path(__file__).resolve().parent.parent / "data" / "history")
+    parser.add_argument("--synthetic-days", type=int, default=0, help="実データをひな形にした合成データの日数（例: 365）")
+    parser.add_argument("--warm-runs", type=int, default=3)
+    parser.add_argument("--json", type=Path, help="結果をJSONで保存するパス")
+    args = parser.parse_args()
+
+    source = load_source_snapshots(args.history_dir)
+    if not source:
+        print("履歴データがありません")
+        return 1
+    source.sort(key=snapshot_key)
+
+    reports = [run_benchmark(source, str(args.history_dir), args.warm_runs)]
+    if args.synthetic_days:
+        synthetic = synthesize_snapshots(source, args.synthetic_days)
+        reports.append(run_benchmark(synthetic, f"synthetic {args.synthetic_days} days", args.warm_runs))
+
+    for report in reports:
+        print_report(report)
+    if args.json:
+        args.json.write_text(json.dumps(reports, ensure_ascii=False, indent=2), encoding='utf-8')
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+過去時点の検索ベンチマーク
+「時刻 T 以前で最新のスナップショット」を、履歴インデックス（二分探索 + seek）と
+履歴の走査（iter_snapshots で T の前日から読み進める）で求め、時間と結果の一致を比較する。
+
+使い方:
+    python benchmarks/bench_history_index.py [--history-dir data/history] [--queries 200] [--json bench_output.json]
+"""
+
+import argparse
+import json
+import random
+import statistics
+import sys
+import time
+from datetime import timedelta
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from scripts.history_index import HistoryIndex
+from scripts.history_store import iter_snapshots
+
+
+def scan_as_of(history_dir: Path, as_of) -> Optional[Dict[str, Any]]:
+    """インデックスを使わない場合（前日からの走査）"""
+    found = None
+    for data in iter_snapshots(history_dir, as_of - timedelta(days=1), as_of):
+        found = data
+    return found
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="過去時点の検索ベンチマーク")
+    parser.add_argument("--history-dir", type=Path, default=Path(__file__).resolve().parent.parent / "data" / "history")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", type=Path, help="結果をJSONで保存")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    index = HistoryIndex(args.history_dir)
+    build_ms = (time.perf_counter() - started) * 1000
+    # 変更がないときの refresh（表示のたびに各日の stat だけを行う）
+    started = time.perf_counter()
+    index.refresh()
+    refresh_ms = (time.perf_counter() - started) * 1000
+    if index.first is None:
+        sys.exit(f"履歴がありません: {args.history_dir}")
+
+    rng = random.Random(args.seed)
+    span = (index.last - index.first).total_seconds()
+    queries = [index.first + timedelta(seconds=rng.uniform(0, span)) for _ in range(args.queries)]
+
+    samples = {'index': [], 'scan': []}
+    mismatches = 0
+    for as_of in queries:
+        started = time.perf_counter()
+        indexed = index.snapshot_as_of(as_of)
+        samples['index'].append((time.perf_counter() - started) * 1000)
+        started = time.perf_counter()
+        scanned = scan_as_of(args.history_dir, as_of)
+        samples['scan'].append((time.perf_counter() - started) * 1000)
+        if (indexed or {}).get('data_time') != (scanned or {}).get('data_time'):
+            mismatches += 1
+
+    result = {
+        'snapshots': len(index),
+        'build_ms': round(build_ms, 2),
+        'refresh_ms': round(refresh_ms, 2),
+        'queries': len(queries),
+        'mismatches': mismatches,
+        **{f"{name}_p50_ms": round(statistics.median(values), 3) for name, values in samples.items()},
+        **{f"{name}_mean_ms": round(statistics.mean(values), 3) for name, values in samples.items()}
+    }
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    if args.json:
+        args.json.write_text(json.dumps(result, ensure_ascii=False, indent=2), encoding='utf-8')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+メモリ上の履歴の大きさの比較（dict のリスト / CompactHistory）
+load_history_data が返す履歴について、1,000 スナップショットあたりの次の値を比べる。
+
+- retained: 保持しているメモリ（tracemalloc で計測、JSON から復元した dict のリスト / 列で持つ CompactHistory）
+- cached: st.cache_data が保持する pickle の大きさ
+- restore: キャッシュのヒット時の復元（pickle.loads）の時間
+- build: dict のリストから CompactHistory を作る時間（キャッシュのミス時に1回）
+- scan: 全行の river.water_level を item.get で読む時間（既存のグラフ関数と同じ読み方）
+
+データセットは bench_suite.py と同じ合成履歴を使う。
+
+使い方:
+    python benchmarks/bench_history_memory.py [--dataset 7d] [--repeat 5] [--json memory.json]
+"""
+
+import argparse
+import gc
+import json
+import pickle
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from bench_suite import DATASETS, ensure_dataset
+from scripts.history_records import CompactHistory
+from scripts.history_store import iter_day_dirs, load_day_snapshots
+
+PER = 1000
+
+
+def retained_bytes(build: Callable[[], Any]) -> int:
+    """build() の結果が保持しているメモリ（途中で解放されたものは含まない）"""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        result = build()
+        gc.collect()
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    del result
+    return after - before
+
+
+def median_ms(func: Callable[[], Any], repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def scan(history) -> List[Any]:
+    return [item.get('river', {}).get('water_level') for item in history]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="メモリ上の履歴の大きさの比較")
+    parser.add_argument("--dataset", default="7d", choices=list(DATASETS))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", type=Path, help="結果の保存先")
+    args = parser.parse_args()
+
+    data_dir = ensure_dataset(args.dataset)
+    lines = []
+    for day_dir in iter_day_dirs(data_dir / "history"):
+        lines.extend(json.dumps(snapshot, ensure_ascii=False) for snapshot in load_day_snapshots(day_dir)[0])
+    snapshots = [json.loads(line) for line in lines]
+    compact = CompactHistory.from_snapshots(snapshots)
+    assert compact.to_dicts() == snapshots
+    scale = PER / len(snapshots)
+
+    results: Dict[str, Dict[str, float]] = {}
+    for name, history, build in (
+        ('dicts', snapshots, lambda: [json.loads(line) for line in lines]),
+        ('compact', compact, lambda: CompactHistory.from_snapshots(snapshots))
+    ):
+        pickled = pickle.dumps(history)
+        results[name] = {
+            'retained_kb': retained_bytes(build) / 1024 * scale,
+            'cached_kb': len(pickled) / 1024 * scale,
+            'restore_ms': median_ms(lambda: pickle.loads(pickled), args.repeat) * scale,
+            'scan_ms': median_ms(lambda: scan(history), args.repeat) * scale
+        }
+    results['compact']['build_ms'] = median_ms(lambda: CompactHistory.from_snapshots(snapshots), args.repeat) * scale
+    results['compact']['array_kb'] = compact.nbytes() / 1024 * scale
+
+    print(f"データセット {args.dataset}: {len(snapshots)} スナップショット（値は {PER:,} 件あたり）")
+    print(f"{'':<10}{'retained':>12}{'cached':>12}{'restore':>11}{'scan':>10}{'build':>10}")
+    for name, row in results.items():
+        build_ms = f"{row['build_ms']:>8.1f}ms" if 'build_ms' in row else f"{'-':>10}"
+        print(f"{name:<10}{row['retained_kb']:>10,.0f}KB{row['cached_kb']:>10,.0f}KB"
+              f"{row['restore_ms']:>9.1f}ms{row['scan_ms']:>8.2f}ms{build_ms}")
+    ratio = results['dicts']['retained_kb'] / results['compact']['retained_kb']
+    print(f"\n保持メモリ: {ratio:.1f} 分の1")
+
+    if args.json:
+        args.json.write_text(json.dumps({'dataset': args.dataset, 'snapshots': len(snapshots), 'per': PER,
+                                         'results': results}, ensure_ascii=False, indent=2), encoding='utf-8')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+直近の履歴の共有メモリの効果の計測（複数のプロセス）
+--readers 個のプロセスが同時に直近 --hours 時間の履歴を持つとき、各プロセスのメモリの増え方を比べる。
+
+- disk: 各プロセスがディスクから読み込む（load_history_data の既存の読み方、dict のリスト）
+- shm: ローダーが1回だけ共有メモリに公開し、各プロセスは scripts/live_window.py でマップして読む
+
+各プロセスは読み込みの前後で /proc/self/smaps_rollup を読み、Private（そのプロセスだけのページ）と
+Pss（共有ページをプロセス数で割った量）の増分、読み込みの時間、全行の river.water_level の読み取り時間を返す。
+全プロセスが読み込みを終えるまで待ってから計測するため、共有ページの分け合いも Pss に反映される。
+Linux のみ。データセットは bench_suite.py と同じ合成履歴を使う。
+
+使い方:
+    python benchmarks/bench_live_window.py [--readers 4] [--hours 72] [--dataset 7d] [--json live_window.json]
+"""
+
+import argparse
+import json
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import timedelta
+from pathlib import Path
+from typing import Any, Dict, List
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from bench_suite import DATASETS, ensure_dataset
+from scripts import live_window
+from scripts.history_store import parse_jst, snapshot_key
+
+VARIANTS = ('disk', 'shm')
+
+
+def smaps_kb() -> Dict[str, int]:
+    """このプロセスの Rss / Pss / Private（KB）"""
+    values: Dict[str, int] = {}
+    for line in Path("/proc/self/smaps_rollup").read_text().splitlines()[1:]:
+        name, _, rest = line.partition(":")
+        values[name] = int(rest.split()[0])
+    return {'rss': values['Rss'], 'pss': values['Pss'],
+            'private': values.get('Private_Clean', 0) + values.get('Private_Dirty', 0)}
+
+
+def reader(variant: str, data_dir: Path, hours: int, barrier: Path, readers: int) -> None:
+    """子プロセス: 履歴を読み込み、全プロセスの読み込みを待ってからメモリを計測して JSON を出力する"""
+    import numpy  # noqa: F401  読み込み前の計測に含める
+    from scripts.history_records import CompactHistory  # noqa: F401
+    from scripts.history_store import iter_snapshots
+
+    latest = json.loads((data_dir / "latest.json").read_text(encoding='utf-8'))
+    end = parse_jst(snapshot_key(latest))
+    start = end - timedelta(hours=hours)
+    before = smaps_kb()
+    started = time.perf_counter()
+    if variant == 'shm':
+        window = live_window.current(data_dir)
+        history = window.between(start, end)
+    else:
+        history = sorted(iter_snapshots(data_dir / "history", start, end),
+                         key=lambda x: x.get('timestamp') or x.get('data_time', ''))
+    load_ms = (time.perf_counter() - started) * 1000
+    started = time.perf_counter()
+    levels = [item.get('river', {}).get('water_level') for item in history]
+    scan_ms = (time.perf_counter() - started) * 1000
+
+    # 全プロセスが読み込むまで待つ（共有ページの Pss はマップしているプロセス数で割られる）
+    (barrier / str(len(list(barrier.iterdir())))).touch()
+    while len(list(barrier.iterdir())) < readers:
+        time.sleep(0.02)
+    after = smaps_kb()
+    print(json.dumps({'rows': len(levels), 'load_ms': load_ms, 'scan_ms': scan_ms,
+                      **{f"{name}_kb": after[name] - before[name] for name in after}}), flush=True)
+    # 全員が計測を終えるまでマップを保つ
+    time.sleep(1.0)
+
+
+def run_variant(variant: str, args: argparse.Namespace, data_dir: Path, scratch: Path) -> Dict[str, Any]:
+    barrier = scratch / f"barrier-{variant}"
+    barrier.mkdir()
+    publisher = None
+    publish_ms = None
+    if variant == 'shm':
+        publisher = live_window.LiveWindowPublisher(data_dir)
+        started = time.perf_counter()
+        pointer = publisher.publish(json.loads((data_dir / "latest.json").read_text(encoding='utf-8')))
+        publish_ms = (time.perf_counter() - started) * 1000
+    try:
+        processes = [subprocess.Popen([sys.executable, __file__, "--child", variant, "--data-dir", str(data_dir),
+                                       "--hours", str(args.hours), "--barrier", str(barrier),
+                                       "--readers", str(args.readers)], stdout=subprocess.PIPE, text=True)
+                     for _ in range(args.readers)]
+        results = [json.loads(process.communicate()[0].strip().splitlines()[-1]) for process in processes]
+    finally:
+        if publisher is not None:
+            publisher.close()
+
+    def mean(name: str) -> float:
+        return sum(result[name] for result in results) / len(results)
+
+    return {
+        'variant': variant,
+        'rows': results[0]['rows'],
+        'private_kb': mean('private_kb'),
+        'pss_kb': mean('pss_kb'),
+        'rss_kb': mean('rss_kb'),
+        'load_ms': mean('load_ms'),
+        'scan_ms': mean('scan_ms'),
+        'publish_ms': publish_ms,
+        'segment_kb': pointer['bytes'] / 1024 if variant == 'shm' else None
+    }
+
+
+def print_report(rows: List[Dict[str, Any]], readers: int) -> None:
+    print(f"{'':<6}{'行数':>6}{'Private':>12}{'Pss':>12}{'Rss':>12}{'読み込み':>10}{'scan':>9}")
+    for row in rows:
+        print(f"{row['variant']:<6}{row['rows']:>8}{row['private_kb']:>10,.0f}KB{row['pss_kb']:>10,.0f}KB"
+              f"{row['rss_kb']:>10,.0f}KB{row['load_ms']:>9.1f}ms{row['scan_ms']:>7.1f}ms")
+    by_name = {row['variant']: row for row in rows}
+    if 'shm' in by_name:
+        print(f"\n共有メモリ: {by_name['shm']['segment_kb']:,.0f}KB, 公開 {by_name['shm']['publish_ms']:.0f}ms")
+    if len(by_name) == 2:
+        total = {name: row['pss_kb'] * readers for name, row in by_name.items()}
+        print(f"{readers} プロセスの合計（Pss）: disk {total['disk']:,.0f}KB → shm {total['shm']:,.0f}KB")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="直近の履歴の共有メモリの効果の計測")
+    parser.add_argument("--readers", type=int, default=4, help="読み込むプロセスの数")
+    parser.add_argument("--hours", type=int, default=72, help="読み込む期間（live_window.WINDOW_HOURS 以下）")
+    parser.add_argument("--dataset", default="7d", choices=list(DATASETS))
+    parser.add_argument("--variants", default=",".join(VARIANTS))
+    parser.add_argument("--json", type=Path, help="結果の保存先")
+    parser.add_argument("--child", choices=VARIANTS, help=argparse.SUPPRESS)
+    parser.add_argument("--data-dir", type=Path, help=argparse.SUPPRESS)
+    parser.add_argument("--barrier", type=Path, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        reader(args.child, args.data_dir, args.hours, args.barrier, args.readers)
+        return
+    if not Path("/proc/self/smaps_rollup").exists():
+        sys.exit("/proc/self/smaps_rollup がありません（Linux のみ）")
+
+    scratch = Path(tempfile.mkdtemp(prefix="kotogawa-live-window-"))
+    rows = []
+    try:
+        # ポインタを書き込むため、データセットのコピーを使う
+        data_dir = scratch / "data"
+        shutil.copytree(ensure_dataset(args.dataset), data_dir)
+        for variant in [value.strip() for value in args.variants.split(",") if value.strip() in VARIANTS]:
+            rows.append(run_variant(variant, args, data_dir, scratch))
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    print(f"データセット {args.dataset}: 直近{args.hours}時間, {args.readers} プロセス（読み込みによる増分の平均）")
+    print_report(rows, args.readers)
+    if args.json:
+        args.json.write_text(json.dumps({'dataset': args.dataset, 'hours': args.hours, 'readers': args.readers,
+                                         'results': rows}, ensure_ascii=False, indent=2), encoding='utf-8')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+"""
+同時閲覧数の負荷試験（Streamlit の WebSocket セッションを模擬）
+streamlit_app.py を合成履歴のデータセットで起動し、N 個のブラウザセッションを WebSocket（/_stcore/stream）で
+同時に開いて、閲覧者の操作を再現する。N を増やしながら、再実行（rerun）の応答時間とサーバーの CPU・メモリを計測する。
+
+各セッションの操作（思考時間は指数分布）:
+- 自動更新: st_autorefresh コンポーネントのカウントを進めて再実行（ブラウザの自動更新と同じメッセージ）
+- 表示期間の変更: 「表示期間」のスライダーを別の値にする
+- 過去の時点の表示の切り替え: 「過去の時点を表示」のチェックボックス
+タブの切り替えはブラウザ内で完結しサーバーへの通信がないため模擬しない。
+
+計測中は --publish-interval 秒ごとに新しいスナップショットを書き込み、模擬時計を10分進める（洪水時の収集と同じく
+キャッシュが更新される）。ネットワークは使わない（ローカルのサーバーと一時ディレクトリのデータのみ）。
+CPU・メモリは /proc から読むため Linux のみ。WebSocket クライアントに websockets パッケージを使う。
+
+使い方:
+    python benchmarks/bench_load.py [--sessions 1,5,10,25] [--duration 30] [--dataset 7d] [--output load.json]
+    python benchmarks/bench_load.py --url ws://127.0.0.1:8501/_stcore/stream --sessions 10  # 起動済みのサーバー
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from bench_render import PUBLISH_DELAY, next_snapshot
+from bench_suite import DATASETS, ensure_dataset, run_metadata
+from scripts import clock
+from scripts.history_store import parse_jst, snapshot_key
+
+# 操作 → 重み
+ACTIONS = {'autorefresh': 0.6, 'display_hours': 0.3, 'as_of_toggle': 0.1}
+STREAM_PATH = "/_stcore/stream"
+RESULTS_FILE = Path(__file__).resolve().parent / "results" / "load.json"
+
+
+def percentile(samples: List[float], q: float) -> Optional[float]:
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return round(ordered[min(int(q * len(ordered)), len(ordered) - 1)], 1)
+
+
+class ProcessSampler:
+    """サーバープロセスの CPU 使用率と RSS を /proc から定期的に読む"""
+
+    def __init__(self, pid: Optional[int]):
+        self.pid = pid
+        self.ticks = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+        self.samples: List[Dict[str, float]] = []
+
+    def _cpu_seconds(self) -> Optional[float]:
+        try:
+            fields = Path(f"/proc/{self.pid}/stat").read_text().rsplit(')', 1)[1].split()
+            return (int(fields[11]) + int(fields[12])) / self.ticks
+        except (OSError, IndexError, ValueError):
+            return None
+
+    def _rss_mb(self) -> Optional[float]:
+        try:
+            for line in Path(f"/proc/{self.pid}/status").read_text().splitlines():
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+        except (OSError, ValueError):
+            return None
+        return None
+
+    async def run(self, stop: asyncio.Event, interval: float = 0.5) -> None:
+        if self.pid is None:
+            return
+        previous = (time.perf_counter(), self._cpu_seconds())
+        while not stop.is_set():
+            await asyncio.sleep(interval)
+            now, cpu = time.perf_counter(), self._cpu_seconds()
+            if cpu is None or previous[1] is None:
+                continue
+            self.samples.append({'cpu_percent': (cpu - previous[1]) / (now - previous[0]) * 100, 'rss_mb': self._rss_mb() or 0.0})
+            previous = (now, cpu)
+
+    def summary(self) -> Dict[str, Optional[float]]:
+        if not self.samples:
+            return {'cpu_percent_mean': None, 'cpu_percent_max': None, 'rss_mb_max': None}
+        return {
+            'cpu_percent_mean': round(statistics.mean(s['cpu_percent'] for s in self.samples), 1),
+            'cpu_percent_max': round(max(s['cpu_percent'] for s in self.samples), 1),
+            'rss_mb_max': round(max(s['rss_mb'] for s in self.samples), 1)
+        }
+
+
+@dataclass
+class SessionStats:
+    latencies: Dict[str, List[float]] = field(default_factory=dict)
+    errors: int = 0
+
+    def record(self, action: str, elapsed_ms: float) -> None:
+        self.latencies.setdefault(action, []).append(elapsed_ms)
+
+
+class SimulatedSession:
+    """ブラウザ1つ分の WebSocket セッション"""
+
+    def __init__(self, url: str, rng: random.Random, think_time: float):
+        self.url = url
+        self.rng = rng
+        self.think_time = think_time
+        self.widget_states: Dict[str, Any] = {}
+        self.widgets: Dict[str, Any] = {}
+        self.refresh_count = 0
+        self.stats = SessionStats()
+
+    def _back_msg(self) -> bytes:
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+
+        msg = BackMsg()
+        msg.rerun_script.query_string = ""
+        msg.rerun_script.page_script_hash = ""
+        for widget_id, (value_type, value) in self.widget_states.items():
+            state = msg.rerun_script.widget_states.widgets.add()
+            state.id = widget_id
+            if value_type == 'string_array_value':
+                state.string_array_value.data.extend(value)
+            else:
+                setattr(state, value_type, value)
+        return msg.SerializeToString()
+
+    async def _rerun(self, ws, action: str) -> None:
+        """再実行を要求し、script_finished までの時間を記録する"""
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+        started = time.perf_counter()
+        await ws.send(self._back_msg())
+        while True:
+            message = ForwardMsg()
+            message.ParseFromString(await ws.recv())
+            kind = message.WhichOneof('type')
+            if kind == 'delta' and message.delta.WhichOneof('type') == 'new_element':
+                self._discover(message.delta.new_element)
+            elif kind == 'script_finished':
+                break
+        self.stats.record(action, (time.perf_counter() - started) * 1000)
+
+    def _discover(self, element) -> None:
+        """操作対象のウィジェットの ID を初回の描画から見つける"""
+        element_type = element.WhichOneof('type')
+        widget = getattr(element, element_type, None)
+        widget_id = getattr(widget, 'id', '')
+        if not widget_id:
+            return
+        if element_type == 'component_instance' and widget_id.endswith('datarefresh'):
+            self.widgets['autorefresh'] = widget_id
+        elif element_type == 'slider' and widget.label == '表示期間':
+            self.widgets['display_hours'] = (widget_id, list(widget.options))
+        elif element_type == 'checkbox' and widget.label == '過去の時点を表示':
+            self.widgets['as_of_toggle'] = widget_id
+
+    def _apply(self, action: str) -> bool:
+        """操作に応じてウィジェットの状態を変える（対象がなければ False）"""
+        if action not in self.widgets:
+            return False
+        if action == 'autorefresh':
+            self.refresh_count += 1
+            self.widget_states[self.widgets[action]] = ('json_value', json.dumps(self.refresh_count))
+        elif action == 'display_hours':
+            widget_id, options = self.widgets[action]
+            self.widget_states[widget_id] = ('string_array_value', [self.rng.choice(options)])
+        elif action == 'as_of_toggle':
+            widget_id = self.widgets[action]
+            current = self.widget_states.get(widget_id, ('bool_value', False))[1]
+            self.widget_states[widget_id] = ('bool_value', not current)
+        return True
+
+    async def run(self, deadline: float) -> SessionStats:
+        import websockets
+
+        try:
+            async with websockets.connect(self.url, subprotocols=["streamlit"], max_size=None, open_timeout=30) as ws:
+                await self._rerun(ws, 'load')
+                while time.perf_counter() < deadline:
+                    await asyncio.sleep(self.rng.expovariate(1 / self.think_time))
+                    action = self.rng.choices(list(ACTIONS), weights=list(ACTIONS.values()))[0]
+                    if self._apply(action):
+                        await self._rerun(ws, action)
+        except Exception as e:  # 接続断・タイムアウトも計測結果として数える
+            self.stats.errors += 1
+            print(f"セッションエラー: {e!r}", file=sys.stderr)
+        return self.stats
+
+
+async def publish_loop(data_dir: Path, clock_file: Path, interval: float, stop: asyncio.Event) -> int:
+    """interval 秒ごとに新しいスナップショットを書き込み、模擬時計を10分進める"""
+    from scripts.collector.runner import publish_snapshot
+
+    published = 0
+    while not stop.is_set():
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=interval)
+            break
+        except asyncio.TimeoutError:
+            pass
+        latest = next_snapshot(json.loads((data_dir / "latest.json").read_text(encoding='utf-8')))
+        publish_snapshot(data_dir, latest, "ndjson")
+        clock.write_clock_file(clock_file, parse_jst(snapshot_key(latest)) + PUBLISH_DELAY, speed=1.0)
+        published += 1
+    return published
+
+
+async def run_level(url: str, sessions: int, duration: float, think_time: float, seed: int,
+                    server_pid: Optional[int], publish: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """N セッションを同時に duration 秒動かす"""
+    stop = asyncio.Event()
+    sampler = ProcessSampler(server_pid)
+    sampler_task = asyncio.create_task(sampler.run(stop))
+    publish_task = asyncio.create_task(publish_loop(stop=stop, **publish)) if publish else None
+
+    deadline = time.perf_counter() + duration
+    clients = [SimulatedSession(url, random.Random(seed * 1000 + number), think_time) for number in range(sessions)]
+    stats = await asyncio.gather(*(client.run(deadline) for client in clients))
+    stop.set()
+    await sampler_task
+    published = await publish_task if publish_task else 0
+
+    all_latencies = [value for stat in stats for values in stat.latencies.values() for value in values]
+    reruns = [value for stat in stats for action, values in stat.latencies.items() if action != 'load' for value in values]
+    per_action = {}
+    for action in ['load'] + list(ACTIONS):
+        values = [value for stat in stats for value in stat.latencies.get(action, [])]
+        per_action[action] = {'count': len(values), 'p50_ms': percentile(values, 0.5), 'p95_ms': percentile(values, 0.95)}
+    session_p95 = [percentile([v for a, vs in stat.latencies.items() if a != 'load' for v in vs], 0.95) for stat in stats]
+    session_p95 = [value for value in session_p95 if value is not None]
+    return {
+        'sessions': sessions,
+        'reruns': len(reruns),
+        'errors': sum(stat.errors for stat in stats),
+        'published': published,
+        'rerun_p50_ms': percentile(reruns, 0.5),
+        'rerun_p95_ms': percentile(reruns, 0.95),
+        'rerun_max_ms': round(max(all_latencies), 1) if all_latencies else None,
+        'session_p95_worst_ms': max(session_p95) if session_p95 else None,
+        'actions': per_action,
+        **sampler.summary()
+    }
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(app: str, data_dir: Path, clock_file: Path, port: int) -> subprocess.Popen:
+    """データセットを指定して Streamlit を起動し、接続できるまで待つ"""
+    env = dict(os.environ, KOTOGAWA_DATA_DIR=str(data_dir), **{clock.CLOCK_FILE_ENV: str(clock_file)})
+    process = subprocess.Popen(
+        [sys.executable, "-m", "streamlit", "run", str(ROOT / app), "--server.headless", "true",
+         "--server.port", str(port), "--server.address", "127.0.0.1", "--browser.gatherUsageStats", "false"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("Streamlit サーバーが起動できませんでした")
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1):
+                return process
+        except OSError:
+            time.sleep(0.3)
+    process.terminate()
+    raise RuntimeError("Streamlit サーバーの起動がタイムアウトしました")
+
+
+def print_report(levels: List[Dict[str, Any]]) -> None:
+    print(f"{'N':>4}{'再実行':>8}{'p50':>10}{'p95':>10}{'最大':>10}{'CPU平均':>9}{'RSS最大':>10}{'エラー':>7}")
+    for level in levels:
+        def ms(value):
+            return f"{value:>8.0f}ms" if value is not None else f"{'-':>10}"
+        cpu = f"{level['cpu_percent_mean']:>8.0f}%" if level['cpu_percent_mean'] is not None else f"{'-':>9}"
+        rss = f"{level['rss_mb_max']:>8.0f}MB" if level['rss_mb_max'] is not None else f"{'-':>10}"
+        print(f"{level['sessions']:>4}{level['reruns']:>8}{ms(level['rerun_p50_ms'])}{ms(level['rerun_p95_ms'])}"
+              f"{ms(level['rerun_max_ms'])}{cpu}{rss}{level['errors']:>7}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="同時閲覧数の負荷試験")
+    parser.add_argument("--sessions", default="1,5,10,25", help="同時セッション数（カンマ区切りで段階的に増やす）")
+    parser.add_argument("--duration", type=float, default=30.0, help="各段階の秒数")
+    parser.add_argument("--think-time", type=float, default=2.0, help="操作の間隔の平均（秒）")
+    parser.add_argument("--dataset", default="7d", choices=list(DATASETS))
+    parser.add_argument("--app", default="streamlit_app.py")
+    parser.add_argument("--publish-interval", type=float, default=15.0, help="新しいスナップショットを書き込む間隔（秒、0で無効）")
+    parser.add_argument("--url", help="起動済みのサーバーの WebSocket URL（指定時はサーバーを起動せず、CPU・メモリも計測しない）")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, default=RESULTS_FILE)
+    args = parser.parse_args()
+
+    try:
+        import websockets  # noqa: F401
+    except ImportError:
+        sys.exit("websockets がインストールされていません（pip install websockets）")
+
+    levels_n = [int(value) for value in args.sessions.split(",") if value.strip()]
+    scratch = Path(tempfile.mkdtemp(prefix="kotogawa-load-"))
+    server = None
+    try:
+        publish = None
+        url = args.url
+        server_pid = None
+        if url is None:
+            data_dir = scratch / "data"
+            shutil.copytree(ensure_dataset(args.dataset), data_dir)
+            latest = json.loads((data_dir / "latest.json").read_text(encoding='utf-8'))
+            clock_file = scratch / "clock.json"
+            clock.write_clock_file(clock_file, parse_jst(snapshot_key(latest)) + PUBLISH_DELAY, speed=1.0)
+            port = free_port()
+            server = start_server(args.app, data_dir, clock_file, port)
+            url, server_pid = f"ws://127.0.0.1:{port}{STREAM_PATH}", server.pid
+            if args.publish_interval > 0:
+                publish = {'data_dir': data_dir, 'clock_file': clock_file, 'interval': args.publish_interval}
+
+        levels = []
+        for sessions in levels_n:
+            level = asyncio.run(run_level(url, sessions, args.duration, args.think_time, args.seed, server_pid, publish))
+            levels.append(level)
+            print_report([level])
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    print()
+    print_report(levels)
+    report = {'meta': {**run_metadata(0), 'app': args.app, 'dataset': args.dataset, 'duration': args.duration,
+                       'think_time': args.think_time, 'publish_interval': args.publish_interval},
+              'levels': levels}
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    args.output.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding='utf-8')
+
+
+if __name__ == "__main__":
+    main()
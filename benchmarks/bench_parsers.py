@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+観測表パーサーのベンチマーク
+scripts/collector/fixtures の観測表HTMLについて、BeautifulSoup（html.parser）・BeautifulSoup + lxml・
+lxml（コンパイル済み XPath）の解析時間を比較し、3つの結果が一致することを確認する。
+
+使い方:
+    python benchmarks/bench_parsers.py [--runs 200] [--json bench_output.json]
+"""
+
+import argparse
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from scripts.collector import parsers
+from scripts.collector.stub_server import FIXTURE_OBSERVATION_TIME, FIXTURES_DIR
+from scripts.history_store import JST
+
+# フィクスチャ → 解析関数
+FIXTURES = {
+    'dam_table.html': parsers.parse_dam_table,
+    'river_table.html': parsers.parse_river_table,
+    'dam_table_day_sjis.html': parsers.parse_dam_table,
+    'river_table_day_sjis.html': parsers.parse_river_table
+}
+
+OBSERVATION_TIME = FIXTURE_OBSERVATION_TIME.replace(tzinfo=JST)
+
+
+def bench_fixture(name: str, runs: int) -> Dict[str, Any]:
+    content = (FIXTURES_DIR / name).read_bytes()
+    parse = FIXTURES[name]
+    result = {'bytes': len(content), 'backends': {}}
+    outputs = {}
+    for backend in parsers.TABLE_BACKENDS:
+        outputs[backend] = parse(content, OBSERVATION_TIME, backend)
+        samples = []
+        for _ in range(runs):
+            started = time.perf_counter()
+            parse(content, OBSERVATION_TIME, backend)
+            samples.append((time.perf_counter() - started) * 1000)
+        result['backends'][backend] = {
+            'mean_ms': round(statistics.mean(samples), 3),
+            'p50_ms': round(statistics.median(samples), 3)
+        }
+    result['identical'] = all(output == outputs['lxml'] for output in outputs.values())
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="観測表パーサーのベンチマーク")
+    parser.add_argument("--runs", type=int, default=200)
+    parser.add_argument("--json", type=Path, help="結果をJSONで保存")
+    args = parser.parse_args()
+
+    if parsers.etree is None:
+        sys.exit("lxml がインストールされていません")
+
+    results = {name: bench_fixture(name, args.runs) for name in FIXTURES}
+    print(f"{'フィクスチャ':<28}{'bytes':>8}" + "".join(f"{backend:>12}" for backend in parsers.TABLE_BACKENDS) + "  一致")
+    for name, result in results.items():
+        cells = "".join(f"{result['backends'][backend]['mean_ms']:>10.3f}ms" for backend in parsers.TABLE_BACKENDS)
+        print(f"{name:<28}{result['bytes']:>8}{cells}  {'OK' if result['identical'] else 'NG'}")
+    if args.json:
+        args.json.write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding='utf-8')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+ページ全体の描画ベンチマーク（Streamlit AppTest）
+関数単位の計測（bench_suite.py）では見えない、再実行1回分のコスト（ウィジェットツリーの差分、
+大きな CSS の st.markdown、st.plotly_chart のシリアライズ、セッション状態）を、
+streamlit.testing.v1.AppTest でアプリを最後まで実行して計測する。
+
+アプリ × データセットごとに子プロセスを起動し、次を計測する。
+
+- cold: 新しいプロセスでの最初の描画（アプリのモジュール読み込み・キャッシュなし）
+- warm: 続けて再実行したとき（キャッシュあり）
+- refresh: 新しいスナップショットを1件書き込み、時計を10分進めて再実行したとき（自動更新1回分に相当）
+- 子プロセスのピークメモリ（ru_maxrss）
+
+データセットは bench_suite.py と同じ合成履歴を一時ディレクトリに複製して使う（refresh で書き込むため）。
+結果は bench_suite.py と同じ形式の JSON で、`bench_suite.py compare` で比較できる。
+
+使い方:
+    python benchmarks/bench_render.py [--apps streamlit_app.py,streamlit_app_old.py,streamlit_app_minimal.py]
+                                      [--datasets 1d,7d,30d] [--warm-runs 5] [--output render.json]
+    python benchmarks/bench_suite.py compare baseline_render.json render.json
+"""
+
+import argparse
+import copy
+import json
+import os
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import timedelta
+from pathlib import Path
+from typing import Any, Dict, List
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from bench_suite import DATASETS, ensure_dataset, run_metadata
+from scripts import clock
+from scripts.history_store import parse_jst, snapshot_key
+
+APPS = ['streamlit_app.py', 'streamlit_app_old.py', 'streamlit_app_minimal.py']
+DEFAULT_DATASETS = ['1d', '7d', '30d']
+RESULTS_FILE = Path(__file__).resolve().parent / "results" / "render.json"
+# 収集が公開される頃（観測時刻の13分後）を「現在」とする
+PUBLISH_DELAY = timedelta(minutes=13)
+
+
+def next_snapshot(latest: Dict[str, Any]) -> Dict[str, Any]:
+    """最新のスナップショットを10分後の観測として複製する"""
+    data = copy.deepcopy(latest)
+    for key in ('data_time', 'timestamp'):
+        data[key] = (parse_jst(data[key]) + timedelta(minutes=10)).isoformat()
+    return data
+
+
+def run_child(app: str, dataset: str, warm_runs: int, timeout: float) -> Dict[str, Any]:
+    """子プロセス側: 1つのアプリを1つのデータセットで計測する"""
+    from scripts.collector.runner import publish_snapshot
+
+    scratch = Path(tempfile.mkdtemp(prefix="kotogawa-render-"))
+    try:
+        data_dir = scratch / "data"
+        shutil.copytree(ensure_dataset(dataset), data_dir)
+        latest = json.loads((data_dir / "latest.json").read_text(encoding='utf-8'))
+        clock_file = scratch / "clock.json"
+        now = parse_jst(snapshot_key(latest)) + PUBLISH_DELAY
+        clock.write_clock_file(clock_file, now, speed=1.0)
+        os.environ["KOTOGAWA_DATA_DIR"] = str(data_dir)
+        os.environ[clock.CLOCK_FILE_ENV] = str(clock_file)
+
+        from streamlit.testing.v1 import AppTest
+
+        started = time.perf_counter()
+        at = AppTest.from_file(str(ROOT / app), default_timeout=timeout).run()
+        cold_ms = (time.perf_counter() - started) * 1000
+        errors = len(at.exception)
+
+        warm = []
+        for _ in range(warm_runs):
+            started = time.perf_counter()
+            at.run()
+            warm.append((time.perf_counter() - started) * 1000)
+
+        publish_snapshot(data_dir, next_snapshot(latest), "ndjson")
+        clock.write_clock_file(clock_file, now + timedelta(minutes=10), speed=1.0)
+        started = time.perf_counter()
+        at.run()
+        refresh_ms = (time.perf_counter() - started) * 1000
+        errors += len(at.exception)
+
+        return {
+            'cold_ms': round(cold_ms, 2),
+            'warm_ms': [round(sample, 2) for sample in warm],
+            'refresh_ms': round(refresh_ms, 2),
+            'maxrss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            'elements': len(list(at.main)) + len(list(at.sidebar)),
+            'exceptions': errors
+        }
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+def measure_app(app: str, dataset: str, warm_runs: int, timeout: float) -> Dict[str, Any]:
+    """子プロセスを起動して計測結果（標準出力の最終行の JSON）を受け取る"""
+    completed = subprocess.run(
+        [sys.executable, __file__, "--child", app, dataset, "--warm-runs", str(warm_runs), "--timeout", str(timeout)],
+        cwd=ROOT, capture_output=True, text=True, check=False
+    )
+    lines = [line for line in completed.stdout.splitlines() if line.startswith('{')]
+    if completed.returncode != 0 or not lines:
+        raise RuntimeError(f"{app} / {dataset} の計測に失敗しました:\n{completed.stderr[-2000:]}")
+    return json.loads(lines[-1])
+
+
+def to_results(dataset: str, app: str, child: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """bench_suite.py と同じ形式（項目名 → median_ms など）にする"""
+    name = Path(app).stem
+    warm = child['warm_ms']
+    return {
+        f"{dataset}/render.{name}.cold": {'median_ms': child['cold_ms'], 'runs': 1,
+                                          'maxrss_kb': child['maxrss_kb'], 'exceptions': child['exceptions']},
+        f"{dataset}/render.{name}.warm": {'median_ms': round(statistics.median(warm), 2), 'min_ms': min(warm),
+                                          'max_ms': max(warm), 'runs': len(warm), 'elements': child['elements']},
+        f"{dataset}/render.{name}.refresh": {'median_ms': child['refresh_ms'], 'runs': 1}
+    }
+
+
+def print_report(rows: List[Dict[str, Any]]) -> None:
+    print(f"{'データセット':<10}{'アプリ':<28}{'cold':>10}{'warm':>10}{'refresh':>10}{'RSS':>10}  例外")
+    for row in rows:
+        print(f"{row['dataset']:<14}{row['app']:<28}{row['cold_ms']:>8.0f}ms{statistics.median(row['warm_ms']):>8.0f}ms"
+              f"{row['refresh_ms']:>8.0f}ms{row['maxrss_kb'] / 1024:>8.0f}MB  {row['exceptions']}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="ページ全体の描画ベンチマーク（AppTest）")
+    parser.add_argument("--apps", default=",".join(APPS))
+    parser.add_argument("--datasets", default=",".join(DEFAULT_DATASETS), help=f"カンマ区切り（{','.join(DATASETS)}）")
+    parser.add_argument("--warm-runs", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=120.0, help="1回の実行のタイムアウト（秒）")
+    parser.add_argument("--output", type=Path, default=RESULTS_FILE)
+    parser.add_argument("--child", nargs=2, metavar=("APP", "DATASET"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_child(args.child[0], args.child[1], args.warm_runs, args.timeout)))
+        return
+
+    apps = [app.strip() for app in args.apps.split(",") if app.strip()]
+    datasets = [name.strip() for name in args.datasets.split(",") if name.strip()]
+    unknown = [name for name in datasets if name not in DATASETS]
+    if unknown:
+        parser.error(f"不明なデータセットです: {', '.join(unknown)}")
+
+    rows, results = [], {}
+    for dataset in datasets:
+        # データセットの生成は計測の外で済ませる
+        ensure_dataset(dataset)
+        for app in apps:
+            child = measure_app(app, dataset, args.warm_runs, args.timeout)
+            rows.append({'dataset': dataset, 'app': app, **child})
+            results.update(to_results(dataset, app, child))
+
+    print_report(rows)
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    args.output.write_text(json.dumps({'meta': run_metadata(args.warm_runs), 'results': results},
+                                      ensure_ascii=False, indent=2), encoding='utf-8')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+共有ディスクキャッシュの効果の計測（複数の Streamlit プロセス）
+ロードバランサーの後ろで動かす場合と同じく、同じデータディレクトリを使う Streamlit サーバーを --workers 個起動し、
+各サーバーに --sessions 個のセッションを開いて bench_load.py と同じ操作を --duration 秒続ける。
+計測中は --publish-interval 秒ごとに新しいスナップショットを書き込み（世代が変わる）、
+全サーバーの CPU 時間（/proc の utime + stime）の合計を、共有キャッシュなし・ありで比べる。
+
+- off: KOTOGAWA_SHARED_CACHE なし（プロセスごとに履歴の読み込み・グラフの作成を行う）
+- on: 全サーバーで1つの SQLite ファイルを共有する
+
+各条件はデータセットのコピー（ウォームスタートの成果物も含め空の状態）から始め、セッションの乱数は同じにする。
+Linux のみ。WebSocket クライアントに websockets パッケージを使う。
+
+使い方:
+    python benchmarks/bench_shared_cache.py [--workers 4] [--sessions 3] [--duration 60] [--dataset 7d]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from bench_load import STREAM_PATH, ProcessSampler, SimulatedSession, free_port, percentile, publish_loop, start_server
+from bench_render import PUBLISH_DELAY
+from bench_suite import DATASETS, ensure_dataset, run_metadata
+from scripts import clock, shared_cache
+from scripts.history_store import parse_jst, snapshot_key
+
+RESULTS_FILE = Path(__file__).resolve().parent / "results" / "shared_cache.json"
+VARIANTS = ('off', 'on')
+
+
+async def drive(urls: List[str], sessions: int, duration: float, think_time: float, seed: int,
+                publish: Dict[str, Any]) -> Dict[str, Any]:
+    """各サーバーに sessions 個のセッションを開き、duration 秒動かす"""
+    stop = asyncio.Event()
+    publish_task = asyncio.create_task(publish_loop(stop=stop, **publish))
+    deadline = time.perf_counter() + duration
+    clients = [SimulatedSession(url, random.Random(seed * 1000 + worker * 100 + number), think_time)
+               for worker, url in enumerate(urls) for number in range(sessions)]
+    stats = await asyncio.gather(*(client.run(deadline) for client in clients))
+    stop.set()
+    published = await publish_task
+    latencies = [value for stat in stats for values in stat.latencies.values() for value in values]
+    return {
+        'reruns': len(latencies),
+        'errors': sum(stat.errors for stat in stats),
+        'published': published,
+        'rerun_p50_ms': percentile(latencies, 0.5),
+        'rerun_p95_ms': percentile(latencies, 0.95)
+    }
+
+
+def run_variant(variant: str, args: argparse.Namespace, scratch: Path) -> Dict[str, Any]:
+    """データセットのコピーでサーバーを起動して計測する"""
+    variant_dir = scratch / variant
+    data_dir = variant_dir / "data"
+    shutil.copytree(ensure_dataset(args.dataset), data_dir)
+    latest = json.loads((data_dir / "latest.json").read_text(encoding='utf-8'))
+    clock_file = variant_dir / "clock.json"
+    clock.write_clock_file(clock_file, parse_jst(snapshot_key(latest)) + PUBLISH_DELAY, speed=1.0)
+
+    cache_file = variant_dir / "shared.sqlite"
+    saved = os.environ.pop(shared_cache.SHARED_CACHE_ENV, None)
+    if variant == 'on':
+        os.environ[shared_cache.SHARED_CACHE_ENV] = str(cache_file)
+    servers = []
+    try:
+        for _ in range(args.workers):
+            port = free_port()
+            servers.append((start_server(args.app, data_dir, clock_file, port), f"ws://127.0.0.1:{port}{STREAM_PATH}"))
+        samplers = [ProcessSampler(process.pid) for process, _ in servers]
+        # 起動直後の処理が落ち着いてから計測を始める
+        time.sleep(2.0)
+        cpu_before = [sampler._cpu_seconds() or 0.0 for sampler in samplers]
+        started = time.perf_counter()
+        result = asyncio.run(drive([url for _, url in servers], args.sessions, args.duration, args.think_time,
+                                   args.seed, {'data_dir': data_dir, 'clock_file': clock_file,
+                                               'interval': args.publish_interval}))
+        elapsed = time.perf_counter() - started
+        cpu = [(sampler._cpu_seconds() or 0.0) - before for sampler, before in zip(samplers, cpu_before)]
+    finally:
+        for process, _ in servers:
+            process.terminate()
+        for process, _ in servers:
+            process.wait(timeout=30)
+        os.environ.pop(shared_cache.SHARED_CACHE_ENV, None)
+        if saved is not None:
+            os.environ[shared_cache.SHARED_CACHE_ENV] = saved
+
+    total = sum(cpu)
+    entries = shared_cache.SharedCache(cache_file).stats()['entries'] if cache_file.exists() else None
+    return {
+        'variant': variant,
+        **result,
+        'cpu_seconds_total': round(total, 2),
+        'cpu_seconds_per_worker': [round(value, 2) for value in cpu],
+        'cpu_ms_per_rerun': round(total / result['reruns'] * 1000, 1) if result['reruns'] else None,
+        'cpu_percent_mean': round(total / elapsed * 100, 1),
+        'cache_entries': entries
+    }
+
+
+def print_report(rows: List[Dict[str, Any]]) -> None:
+    print(f"{'キャッシュ':<10}{'再実行':>8}{'世代':>6}{'CPU合計':>10}{'CPU/再実行':>12}{'p50':>9}{'p95':>9}{'エラー':>7}")
+    for row in rows:
+        print(f"{row['variant']:<10}{row['reruns']:>8}{row['published']:>6}{row['cpu_seconds_total']:>9.1f}s"
+              f"{row['cpu_ms_per_rerun'] or 0:>10.0f}ms{row['rerun_p50_ms'] or 0:>7.0f}ms{row['rerun_p95_ms'] or 0:>7.0f}ms"
+              f"{row['errors']:>7}")
+    if len(rows) == 2 and rows[0]['cpu_seconds_total']:
+        saved = 1 - rows[1]['cpu_seconds_total'] / rows[0]['cpu_seconds_total']
+        print(f"\nCPU 合計の削減: {saved:.0%}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="共有ディスクキャッシュの効果の計測")
+    parser.add_argument("--workers", type=int, default=4, help="Streamlit サーバーの数")
+    parser.add_argument("--sessions", type=int, default=3, help="サーバーごとのセッション数")
+    parser.add_argument("--duration", type=float, default=60.0)
+    parser.add_argument("--think-time", type=float, default=2.0, help="操作の間隔の平均（秒）")
+    parser.add_argument("--publish-interval", type=float, default=15.0, help="新しいスナップショットを書き込む間隔（秒）")
+    parser.add_argument("--dataset", default="7d", choices=list(DATASETS))
+    parser.add_argument("--app", default="streamlit_app.py")
+    parser.add_argument("--variants", default=",".join(VARIANTS))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, default=RESULTS_FILE)
+    args = parser.parse_args()
+
+    try:
+        import websockets  # noqa: F401
+    except ImportError:
+        sys.exit("websockets がインストールされていません（pip install websockets）")
+
+    scratch = Path(tempfile.mkdtemp(prefix="kotogawa-shared-cache-"))
+    rows = []
+    try:
+        for variant in [value.strip() for value in args.variants.split(",") if value.strip() in VARIANTS]:
+            rows.append(run_variant(variant, args, scratch))
+            print_report(rows[-1:])
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    print()
+    print_report(rows)
+    report = {'meta': {**run_metadata(0), 'app': args.app, 'dataset': args.dataset, 'workers': args.workers,
+                       'sessions': args.sessions, 'duration': args.duration, 'think_time': args.think_time,
+                       'publish_interval': args.publish_interval},
+              'variants': rows}
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    args.output.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding='utf-8')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+コールドスタートの計測（Streamlit サーバーの起動から最初の描画まで）
+スリープ後の Streamlit Cloud と同じく、新しいサーバープロセスを起動して最初のセッションを1つ開き、
+再実行を要求してから各要素が WebSocket で届くまでの時間を計測する。
+
+- server_ready: プロセスの起動から、ポートが接続を受け付けるまで
+- first_element: 最初の要素（ページ設定・CSS など）
+- first_paint: 警戒バナーまたはメトリクス（利用者が最初に見る情報）
+- chart: 最初のグラフ
+- finished: 再実行の完了（script_finished）
+
+サーバーは `python -X importtime` で起動し、最初の再実行の間に行われた import（スクリプトから直接の import）を
+累積時間の大きい順に表示する。データセットは bench_suite.py と同じ合成履歴を使う（書き込みはしない）。
+ウォームスタートの成果物は一時ディレクトリに置き、既定では毎回消して成果物のない起動を計測する。
+--warm-start を指定すると、先に scripts/warm_start.py で成果物を作ってから計測する。
+--budget-ms を指定すると、first_paint の中央値がそれを超えたときに終了コード 1 を返す。
+
+使い方:
+    python benchmarks/bench_startup.py [--apps streamlit_app.py,streamlit_app_old.py] [--dataset 7d]
+                                       [--warm-start] [--repeat 3] [--budget-ms 2000] [--output startup.json]
+    python benchmarks/bench_suite.py compare baseline_startup.json startup.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from bench_load import STREAM_PATH, SimulatedSession, free_port
+from bench_render import PUBLISH_DELAY
+from bench_suite import DATASETS, ensure_dataset, run_metadata
+from scripts import clock, warm_start
+from scripts.history_store import parse_jst, snapshot_key
+
+APPS = ['streamlit_app.py', 'streamlit_app_old.py']
+MILESTONES = ['server_ready', 'first_element', 'first_paint', 'chart', 'finished']
+RESULTS_FILE = Path(__file__).resolve().parent / "results" / "startup.json"
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def launch(app: str, data_dir: Path, clock_file: Path, port: int) -> Tuple[subprocess.Popen, List[Tuple[float, str]]]:
+    """-X importtime でサーバーを起動し、標準エラーの各行を受信時刻とともに集める"""
+    env = dict(os.environ, KOTOGAWA_DATA_DIR=str(data_dir), **{clock.CLOCK_FILE_ENV: str(clock_file)})
+    process = subprocess.Popen(
+        [sys.executable, "-X", "importtime", "-m", "streamlit", "run", str(ROOT / app), "--server.headless", "true",
+         "--server.port", str(port), "--server.address", "127.0.0.1", "--browser.gatherUsageStats", "false"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, errors='replace'
+    )
+    lines: List[Tuple[float, str]] = []
+
+    def read_stderr() -> None:
+        for line in process.stderr:
+            lines.append((time.perf_counter(), line.rstrip("\n")))
+
+    threading.Thread(target=read_stderr, daemon=True).start()
+    return process, lines
+
+
+def wait_for_port(process: subprocess.Popen, port: int, timeout: float = 60.0) -> None:
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("Streamlit サーバーが起動できませんでした")
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError("Streamlit サーバーの起動がタイムアウトしました")
+
+
+def classify(element) -> Optional[str]:
+    """要素が first_paint・chart のどれに当たるか"""
+    element_type = element.WhichOneof('type')
+    if element_type == 'plotly_chart':
+        return 'chart'
+    if element_type == 'metric':
+        return 'first_paint'
+    if element_type == 'markdown' and any(marker in element.markdown.body for marker in ('alert-card', 'metric-card')):
+        return 'first_paint'
+    return None
+
+
+async def first_session(url: str, timeout: float) -> Tuple[float, Dict[str, float]]:
+    """最初のセッションで再実行を要求し、(要求した時刻, 各要素までの ms) を返す"""
+    import websockets
+    from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+    session = SimulatedSession(url, random.Random(0), think_time=0.0)
+    async with websockets.connect(url, subprotocols=["streamlit"], max_size=None, open_timeout=timeout) as ws:
+        started = time.perf_counter()
+        await ws.send(session._back_msg())
+        marks: Dict[str, float] = {}
+        while True:
+            message = ForwardMsg()
+            message.ParseFromString(await asyncio.wait_for(ws.recv(), timeout=timeout))
+            elapsed = (time.perf_counter() - started) * 1000
+            kind = message.WhichOneof('type')
+            if kind == 'delta' and message.delta.WhichOneof('type') == 'new_element':
+                marks.setdefault('first_element', elapsed)
+                milestone = classify(message.delta.new_element)
+                if milestone:
+                    marks.setdefault(milestone, elapsed)
+            elif kind == 'script_finished':
+                marks['finished'] = elapsed
+                return started, marks
+
+
+def script_imports(lines: List[Tuple[float, str]], since: float, until: float) -> List[Dict[str, Any]]:
+    """[since, until] に出力された importtime の行のうち、最も浅い階層の import（累積時間の大きい順）"""
+    entries = []
+    for received, line in lines:
+        match = IMPORTTIME_LINE.match(line)
+        if match and since <= received <= until:
+            entries.append((len(match.group(3)), match.group(4), int(match.group(2))))
+    if not entries:
+        return []
+    depth = min(entry[0] for entry in entries)
+    totals: Dict[str, int] = {}
+    for level, name, cumulative_us in entries:
+        if level == depth:
+            totals[name] = totals.get(name, 0) + cumulative_us
+    return [{'module': name, 'cumulative_ms': round(us / 1000, 1)}
+            for name, us in sorted(totals.items(), key=lambda item: item[1], reverse=True)]
+
+
+def measure_cold_start(app: str, data_dir: Path, clock_file: Path, timeout: float) -> Dict[str, Any]:
+    """新しいサーバーを1つ起動して計測する"""
+    port = free_port()
+    launched = time.perf_counter()
+    process, lines = launch(app, data_dir, clock_file, port)
+    try:
+        wait_for_port(process, port, timeout)
+        marks = {'server_ready': (time.perf_counter() - launched) * 1000}
+        started, run_marks = asyncio.run(first_session(f"ws://127.0.0.1:{port}{STREAM_PATH}", timeout))
+        marks.update(run_marks)
+        finished = started + run_marks['finished'] / 1000
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+    # 標準エラーの読み取りが追いつくまで待つ
+    time.sleep(0.2)
+    return {'marks': {key: round(value, 1) for key, value in marks.items()},
+            'imports': script_imports(lines, started, finished + 0.05)}
+
+
+def to_results(dataset: str, app: str, runs: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """bench_suite.py と同じ形式（項目名 → median_ms など）にする"""
+    results = {}
+    for milestone in MILESTONES:
+        samples = [run['marks'][milestone] for run in runs if milestone in run['marks']]
+        if samples:
+            results[f"{dataset}/startup.{Path(app).stem}.{milestone}"] = {
+                'median_ms': round(statistics.median(samples), 1), 'min_ms': min(samples),
+                'max_ms': max(samples), 'runs': len(samples)
+            }
+    return results
+
+
+def print_report(dataset: str, rows: Dict[str, Dict[str, Any]], imports: Dict[str, List[Dict[str, Any]]], top: int) -> None:
+    print(f"{'アプリ':<26}" + "".join(f"{name:>15}" for name in MILESTONES))
+    for app, results in rows.items():
+        cells = []
+        for milestone in MILESTONES:
+            result = results.get(f"{dataset}/startup.{Path(app).stem}.{milestone}")
+            cells.append(f"{result['median_ms']:>13.0f}ms" if result else f"{'-':>15}")
+        print(f"{app:<26}" + "".join(cells))
+    for app, modules in imports.items():
+        print(f"\n{app}: 最初の再実行中の import（累積, 中央値）")
+        for module in modules[:top]:
+            print(f"  {module['cumulative_ms']:>9.1f}ms  {module['module']}")
+
+
+def median_imports(runs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """各回の import 時間の中央値（出現しなかった回は 0 とする）"""
+    names = {module['module'] for run in runs for module in run['imports']}
+    rows = []
+    for name in names:
+        samples = [next((m['cumulative_ms'] for m in run['imports'] if m['module'] == name), 0.0) for run in runs]
+        rows.append({'module': name, 'cumulative_ms': round(statistics.median(samples), 1)})
+    return sorted(rows, key=lambda row: row['cumulative_ms'], reverse=True)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="コールドスタートの計測")
+    parser.add_argument("--apps", default=",".join(APPS))
+    parser.add_argument("--dataset", default="7d", choices=list(DATASETS))
+    parser.add_argument("--repeat", type=int, default=3, help="アプリごとにサーバーを起動する回数")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--top", type=int, default=12, help="表示する import の数")
+    parser.add_argument("--warm-start", action="store_true", help="ウォームスタートの成果物を作ってから計測する")
+    parser.add_argument("--budget-ms", type=float, help="first_paint の中央値の上限（超えたら終了コード 1）")
+    parser.add_argument("--output", type=Path, default=RESULTS_FILE)
+    args = parser.parse_args()
+
+    data_dir = ensure_dataset(args.dataset)
+    latest = json.loads((data_dir / "latest.json").read_text(encoding='utf-8'))
+    apps = [app.strip() for app in args.apps.split(",") if app.strip()]
+
+    rows, imports, results, over_budget = {}, {}, {}, []
+    with tempfile.TemporaryDirectory(prefix="kotogawa-startup-") as scratch:
+        clock_file = Path(scratch) / "clock.json"
+        clock.write_clock_file(clock_file, parse_jst(snapshot_key(latest)) + PUBLISH_DELAY, speed=1.0)
+        warm_dir = Path(scratch) / warm_start.WARM_DIR_NAME
+        os.environ[warm_start.WARM_DIR_ENV] = str(warm_dir)
+
+        def prepare() -> None:
+            """成果物を用意する（--warm-start なし: 前回の起動が作った成果物を消す）"""
+            if not args.warm_start:
+                shutil.rmtree(warm_dir, ignore_errors=True)
+            elif not (warm_dir / warm_start.MANIFEST_FILE).exists():
+                subprocess.run([sys.executable, str(ROOT / "scripts" / "warm_start.py"), "--data-dir", str(data_dir)],
+                               cwd=ROOT, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+        for app in apps:
+            runs = []
+            for _ in range(args.repeat):
+                prepare()
+                runs.append(measure_cold_start(app, data_dir, clock_file, args.timeout))
+            rows[app] = to_results(args.dataset, app, runs)
+            imports[app] = median_imports(runs)
+            results.update(rows[app])
+            first_paint = rows[app].get(f"{args.dataset}/startup.{Path(app).stem}.first_paint")
+            if args.budget_ms is not None and (first_paint is None or first_paint['median_ms'] > args.budget_ms):
+                over_budget.append(app)
+
+    print_report(args.dataset, rows, imports, args.top)
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    args.output.write_text(json.dumps({'meta': run_metadata(args.repeat), 'results': results, 'imports': imports},
+                                      ensure_ascii=False, indent=2), encoding='utf-8')
+    if over_budget:
+        print(f"\nfirst_paint が {args.budget_ms:.0f}ms を超えました: {', '.join(over_budget)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+データ処理・描画のホットパスのベンチマークスイート
+合成履歴（scripts/generate_history.py）の固定データセット（1日〜1年）に対して、次の処理を計測する。
+
+- 履歴の読み込み（表示期間の選択肢ごと。streamlit_app_old.py / streamlit_app.py）
+- 履歴の DataFrame 化
+- グラフ作成（すべてのグラフ）と、グラフの JSON 化の時間・サイズ（st.plotly_chart が送る量）
+- 警戒判定（check_alert_status を全スナップショットに適用）
+- データテーブルの作成
+
+「現在時刻」はデータセットの最新時刻に固定する（scripts/clock.py の時計ファイル）。
+結果は JSON に保存し、compare で基準の結果と比べて遅くなった項目を検出する（遅くなった項目があれば終了コード 1）。
+
+使い方:
+    python benchmarks/bench_suite.py run [--datasets 1d,7d,30d,365d] [--filter graph] [--repeat 5] [--output results.json]
+    python benchmarks/bench_suite.py run --save-baseline
+    python benchmarks/bench_suite.py compare [baseline.json] [results.json] [--threshold 0.25]
+"""
+
+import argparse
+import fnmatch
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from scripts import clock
+from scripts.generate_history import generate
+from scripts.history_store import iter_snapshots, parse_jst, snapshot_key
+
+# データセット名 → 日数（開始日・シードは固定）
+DATASETS = {'1d': 1, '7d': 7, '30d': 30, '365d': 365}
+DATASET_START = date(2024, 6, 1)
+DATASET_SEED = 2024
+DATASET_INTENSITY_MINUTES = 10
+DATASETS_DIR = Path(__file__).resolve().parent / ".datasets"
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+BASELINE_FILE = RESULTS_DIR / "baseline.json"
+LATEST_FILE = RESULTS_DIR / "latest.json"
+
+# アプリの表示期間の選択肢
+OLD_DISPLAY_HOURS = [6, 12, 24, 48, 72, 96, 120]
+APP_DISPLAY_HOURS = [6, 12, 24, 48, 72]
+GRAPH_DISPLAY_HOURS = 24
+
+OLD_FIGURES = ['river_water_level', 'dam_discharge_rainfall', 'dam_water_level', 'dam_flow', 'precipitation_intensity']
+APP_FIGURES = ['river_water_level', 'dam_water_level']
+
+DEFAULT_THRESHOLD = 0.25
+# 計測誤差で判定しないよう、差がこれ未満の項目は比に関係なく同等とみなす
+DEFAULT_MIN_DELTA_MS = 0.5
+
+
+def ensure_dataset(name: str) -> Path:
+    """データセットを用意する（同じ条件で生成済みなら再利用）"""
+    days = DATASETS[name]
+    data_dir = DATASETS_DIR / name
+    manifest_file = data_dir / "synthetic.json"
+    if manifest_file.exists():
+        manifest = json.loads(manifest_file.read_text(encoding='utf-8'))
+        if (manifest.get('seed'), manifest.get('start'), manifest.get('days'), manifest.get('intensity_minutes')) == \
+                (DATASET_SEED, DATASET_START.isoformat(), days, DATASET_INTENSITY_MINUTES):
+            return data_dir
+    shutil.rmtree(data_dir, ignore_errors=True)
+    print(f"データセット {name} を生成中...", file=sys.stderr)
+    generate(data_dir, DATASET_START, days, seed=DATASET_SEED, intensity_minutes=DATASET_INTENSITY_MINUTES)
+    return data_dir
+
+
+def measure(func: Callable[[], Any], repeat: int, warmup: int = 1) -> Dict[str, Any]:
+    """warmup 回実行した後 repeat 回計測する"""
+    for _ in range(warmup):
+        func()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - started) * 1000)
+    return {
+        'median_ms': round(statistics.median(samples), 3),
+        'min_ms': round(min(samples), 3),
+        'max_ms': round(max(samples), 3),
+        'runs': repeat
+    }
+
+
+def load_apps(data_dir: Path):
+    """アプリのモジュールをデータセットに向けて読み込む（トップレベルの st 呼び出しは実行時なしで無害）"""
+    os.environ["KOTOGAWA_DATA_DIR"] = str(data_dir)
+    import streamlit_app
+    import streamlit_app_old
+    streamlit_app.DATA_DIR = data_dir
+    return streamlit_app, streamlit_app_old
+
+
+def figure_json_case(build: Callable[[], Any]) -> Callable[[], str]:
+    """グラフの JSON 化だけを計測する処理（グラフは最初の呼び出し時に1回だけ作る）"""
+    built = []
+
+    def to_json() -> str:
+        if not built:
+            built.append(build())
+        return built[0].to_json()
+    return to_json
+
+
+def dataset_cases(data_dir: Path) -> Dict[str, Callable[[], Any]]:
+    """データセットに対する計測項目（名前 → 処理）"""
+    latest = json.loads((data_dir / "latest.json").read_text(encoding='utf-8'))
+    end = parse_jst(snapshot_key(latest))
+    # 「現在」は最新の観測時刻の13分後（収集が公開される頃）に固定する
+    clock_file = DATASETS_DIR / "bench_clock.json"
+    clock.write_clock_file(clock_file, end + timedelta(minutes=13), speed=1.0)
+    os.environ[clock.CLOCK_FILE_ENV] = str(clock_file)
+
+    app, old = load_apps(data_dir)
+    monitor = old.KotogawaMonitor()
+    history = list(iter_snapshots(data_dir / "history", datetime.min.replace(tzinfo=end.tzinfo), end))
+    precipitation = latest.get('precipitation_intensity')
+    load_old = old.KotogawaMonitor.load_history_data.__wrapped__  # st.cache_data を通さずに計測
+
+    cases: Dict[str, Callable[[], Any]] = {}
+    for hours in OLD_DISPLAY_HOURS:
+        cases[f"load_history.old[{hours}h]"] = lambda hours=hours: load_old(monitor, hours)
+    for hours in APP_DISPLAY_HOURS:
+        cases[f"load_history.app[{hours}h]"] = lambda hours=hours: app.load_history_data(hours)
+    cases["frame.json_normalize"] = lambda: pd.json_normalize(history)
+
+    figures: Dict[str, Callable[[], Any]] = {}
+    for kind in OLD_FIGURES:
+        figures[f"old.{kind}"] = lambda kind=kind: monitor.build_figure(
+            kind, history, False, GRAPH_DISPLAY_HOURS, False, precipitation)
+    for kind in APP_FIGURES:
+        figures[f"app.{kind}"] = lambda kind=kind: getattr(app, f"create_{kind}_graph")(history, GRAPH_DISPLAY_HOURS)
+    for name, build in figures.items():
+        cases[f"figure.{name}"] = build
+        cases[f"figure_json.{name}"] = figure_json_case(build)
+
+    cases["alert.check_alert_status"] = lambda: [monitor.check_alert_status(data, monitor.default_thresholds) for data in history]
+    cases["table.create_data_table"] = lambda: monitor.create_data_table(history)
+    return cases
+
+
+def run_suite(datasets: List[str], pattern: Optional[str], repeat: int) -> Dict[str, Any]:
+    results: Dict[str, Any] = {}
+    for name in datasets:
+        data_dir = ensure_dataset(name)
+        for case, func in dataset_cases(data_dir).items():
+            key = f"{name}/{case}"
+            if pattern and not fnmatch.fnmatch(key, f"*{pattern}*"):
+                continue
+            result = measure(func, repeat)
+            if case.startswith("figure_json."):
+                result['bytes'] = len(func())
+            results[key] = result
+            print(f"{key:<52}{result['median_ms']:>12.3f}ms" + (f"{result['bytes']:>12,}B" if 'bytes' in result else ""))
+    return {'meta': run_metadata(repeat), 'results': results}
+
+
+def run_metadata(repeat: int) -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'repeat': repeat
+    }
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float,
+            min_delta_ms: float = DEFAULT_MIN_DELTA_MS) -> List[Dict[str, Any]]:
+    """共通の項目について中央値の比を求め、threshold を超えて遅く（速く）なった項目に印を付ける"""
+    rows = []
+    for key in sorted(set(baseline['results']) & set(current['results'])):
+        before, after = baseline['results'][key], current['results'][key]
+        ratio = after['median_ms'] / before['median_ms'] if before['median_ms'] > 0 else 1.0
+        if abs(after['median_ms'] - before['median_ms']) < min_delta_ms:
+            verdict = 'same'
+        elif ratio > 1 + threshold:
+            verdict = 'regression'
+        elif ratio < 1 / (1 + threshold):
+            verdict = 'improved'
+        else:
+            verdict = 'same'
+        rows.append({'key': key, 'before_ms': before['median_ms'], 'after_ms': after['median_ms'],
+                     'ratio': round(ratio, 3), 'verdict': verdict,
+                     'bytes_before': before.get('bytes'), 'bytes_after': after.get('bytes')})
+    return rows
+
+
+def print_comparison(rows: List[Dict[str, Any]]) -> None:
+    marks = {'regression': '遅くなった', 'improved': '速くなった', 'same': ''}
+    print(f"{'項目':<52}{'基準':>12}{'今回':>12}{'比':>8}")
+    for row in rows:
+        size = ""
+        if row['bytes_before'] is not None and row['bytes_after'] != row['bytes_before']:
+            size = f"  {row['bytes_before']:,}B → {row['bytes_after']:,}B"
+        print(f"{row['key']:<52}{row['before_ms']:>10.3f}ms{row['after_ms']:>10.3f}ms{row['ratio']:>8.2f}  "
+              f"{marks[row['verdict']]}{size}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="データ処理・描画のベンチマークスイート")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="計測して結果をJSONに保存")
+    run_parser.add_argument("--datasets", default=",".join(DATASETS), help="カンマ区切り（1d,7d,30d,365d）")
+    run_parser.add_argument("--filter", help="項目名に含まれる文字列（例: figure, load_history）")
+    run_parser.add_argument("--repeat", type=int, default=5)
+    run_parser.add_argument("--output", type=Path, default=LATEST_FILE)
+    run_parser.add_argument("--save-baseline", action="store_true", help="結果を基準（baseline.json）としても保存")
+
+    compare_parser = subparsers.add_parser("compare", help="基準の結果と比較")
+    compare_parser.add_argument("baseline", nargs="?", type=Path, default=BASELINE_FILE)
+    compare_parser.add_argument("current", nargs="?", type=Path, default=LATEST_FILE)
+    compare_parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                                help="中央値がこの割合を超えて遅くなったら検出（0.25 = 25%%）")
+    compare_parser.add_argument("--min-delta-ms", type=float, default=DEFAULT_MIN_DELTA_MS,
+                                help="差がこれ未満の項目は検出しない")
+    args = parser.parse_args()
+
+    if args.command == "run":
+        datasets = [name.strip() for name in args.datasets.split(",") if name.strip()]
+        unknown = [name for name in datasets if name not in DATASETS]
+        if unknown:
+            parser.error(f"不明なデータセットです: {', '.join(unknown)}")
+        report = run_suite(datasets, args.filter, args.repeat)
+        payload = json.dumps(report, ensure_ascii=False, indent=2)
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(payload, encoding='utf-8')
+        if args.save_baseline:
+            BASELINE_FILE.parent.mkdir(parents=True, exist_ok=True)
+            BASELINE_FILE.write_text(payload, encoding='utf-8')
+        return
+
+    baseline = json.loads(args.baseline.read_text(encoding='utf-8'))
+    current = json.loads(args.current.read_text(encoding='utf-8'))
+    rows = compare(baseline, current, args.threshold, args.min_delta_ms)
+    print_comparison(rows)
+    regressions = [row for row in rows if row['verdict'] == 'regression']
+    if regressions:
+        print(f"\n{len(regressions)} 項目が {args.threshold:.0%} を超えて遅くなりました")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
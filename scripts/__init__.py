@@ -0,0 +1,3 @@
+"""
+厚東川監視システム - データ収集・管理スクリプト群
+"""
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+古い履歴データのクリーンアップ
+保持期間を過ぎた日ディレクトリだけをディレクトリ名から特定し、集計に縮約（archive）または削除（delete）する。
+ツリー全体の stat は行わず、対象の日のファイルのみを数える。
+
+実行結果は data/logs/cleanup.ndjson に1行追記する（一定サイズでローテーション）。
+
+使い方:
+    python scripts/cleanup_data.py [--days 7] [--mode archive|delete] [--dry-run]
+"""
+
+import argparse
+import json
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from scripts.history_retention import apply_retention
+from scripts.history_store import JST
+from scripts.ndjson_log import append_log
+
+CLEANUP_MODES = ("archive", "delete")
+
+
+def cleanup(history_dir: Path, archive_dir: Path, days_kept: int = 7, mode: str = "archive",
+            hourly_days: int = 365, dry_run: bool = False) -> Dict[str, Any]:
+    """保持期間を過ぎた日を縮約または削除する（処理は history_retention.apply_retention）"""
+    if mode not in CLEANUP_MODES:
+        raise ValueError(f"不明なクリーンアップモードです: {mode}")
+
+    started = time.perf_counter()
+    timestamp = datetime.now(JST).isoformat()
+    stats = apply_retention(history_dir, archive_dir, days_kept, hourly_days, dry_run=dry_run,
+                            archive=mode == "archive")
+    return {
+        'timestamp': timestamp,
+        'days_kept': days_kept,
+        'mode': mode,
+        'dry_run': dry_run,
+        'days': stats['expired_days'],
+        'deleted_files': stats['deleted_files'],
+        'freed_bytes': stats['freed_bytes'],
+        'archived_snapshots': stats['snapshots'],
+        'removed_hourly_files': len(stats['removed_hourly_files']),
+        'elapsed_ms': round((time.perf_counter() - started) * 1000, 2)
+    }
+
+
+def main() -> int:
+    data_dir = Path(__file__).resolve().parent.parent / "data"
+    parser = argparse.ArgumentParser(description="古い履歴データをクリーンアップする")
+    parser.add_argument("--history-dir", type=Path, default=data_dir / "history")
+    parser.add_argument("--archive-dir", type=Path, default=data_dir / "archive")
+    parser.add_argument("--log-file", type=Path, default=data_dir / "logs" / "cleanup.ndjson")
+    parser.add_argument("--days", type=int, default=7, help="生データの保持日数")
+    parser.add_argument("--hourly-days", type=int, default=365, help="時間集計の保持日数（archive モード）")
+    parser.add_argument("--mode", choices=CLEANUP_MODES, default="archive",
+                        help="archive: 集計に縮約してから削除 / delete: そのまま削除")
+    parser.add_argument("--dry-run", action="store_true", help="削除対象のファイル数・バイト数を表示するだけで変更しない")
+    args = parser.parse_args()
+
+    result = cleanup(args.history_dir, args.archive_dir, args.days, args.mode, args.hourly_days, args.dry_run)
+    if not args.dry_run:
+        append_log(args.log_file, result)
+
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+差し替え可能な時計
+通常は日本時間の現在時刻を返す。環境変数 KOTOGAWA_CLOCK_FILE にリプレイ用の時計ファイルが指定されていれば、
+そのファイルの「開始時の模擬時刻・実時刻・倍速」から模擬時刻を計算して返す。
+
+時計ファイルは scripts/replay.py が書き込む。アプリ側は datetime.now(JST) の代わりに clock.now() を使う。
+"""
+
+import json
+import os
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Optional, Tuple
+
+from scripts.history_store import JST, parse_jst
+
+CLOCK_FILE_ENV = "KOTOGAWA_CLOCK_FILE"
+
+
+@dataclass(frozen=True)
+class ReplayClock:
+    """real_start（UNIX時刻）に sim_start だった時計が speed 倍速で進む"""
+    sim_start: datetime
+    real_start: float
+    speed: float
+
+    def now(self, real: Optional[float] = None) -> datetime:
+        elapsed = (time.time() if real is None else real) - self.real_start
+        return self.sim_start + timedelta(seconds=elapsed * self.speed)
+
+    def real_time_of(self, sim_time: datetime) -> float:
+        """模擬時刻 sim_time になる実時刻（UNIX時刻）"""
+        return self.real_start + (sim_time - self.sim_start).total_seconds() / self.speed
+
+
+# ((時計ファイルのパス, 更新時刻), 読み込んだ時計)
+_cached: Tuple[Optional[Tuple[str, float]], Optional[ReplayClock]] = (None, None)
+
+
+def read_clock_file(path: Path) -> Optional[ReplayClock]:
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        sim_start = parse_jst(data['sim_start'])
+        if sim_start is None:
+            return None
+        return ReplayClock(sim_start, float(data['real_start']), float(data.get('speed', 1.0)))
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def write_clock_file(path: Path, sim_start: datetime, speed: float, real_start: Optional[float] = None) -> ReplayClock:
+    """時計ファイルを書き込む（アトミックに置き換え）"""
+    clock = ReplayClock(sim_start.astimezone(JST), time.time() if real_start is None else real_start, speed)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    tmp_path.write_text(json.dumps({
+        'sim_start': clock.sim_start.isoformat(),
+        'real_start': clock.real_start,
+        'speed': clock.speed
+    }), encoding='utf-8')
+    os.replace(tmp_path, path)
+    return clock
+
+
+def active_clock() -> Optional[ReplayClock]:
+    """KOTOGAWA_CLOCK_FILE で指定された時計（未指定・読めない場合は None）"""
+    global _cached
+    path = os.environ.get(CLOCK_FILE_ENV)
+    if not path:
+        return None
+    try:
+        signature = (path, os.stat(path).st_mtime)
+    except OSError:
+        return None
+    if _cached[0] != signature:
+        _cached = (signature, read_clock_file(Path(path)))
+    return _cached[1]
+
+
+def now() -> datetime:
+    """現在時刻（JST）。リプレイ中は模擬時刻"""
+    clock = active_clock()
+    return clock.now() if clock is not None else datetime.now(JST)
+
+
+def speed() -> float:
+    """時計の倍速（リプレイ中でなければ 1.0）"""
+    clock = active_clock()
+    return clock.speed if clock is not None else 1.0
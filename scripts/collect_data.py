@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+厚東川監視データの収集
+ダム・河川・降水強度・天気予報を同時に取得し、data/latest.json と履歴に書き込む。
+
+ダムと河川の両方が取得できなかった場合は何も書き込まずに終了コード1で終了する。
+
+使い方:
+    python scripts/collect_data.py [--bousai-base URL] [--record DIR]
+
+環境変数:
+    YAHOO_APPID         Yahoo! 気象情報API のアプリケーションID（未設定なら降水強度は取得しない）
+    HISTORY_WRITE_MODE  履歴の書き込み形式（files / ndjson、既定は files）
+"""
+
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+from typing import Any, Dict
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from scripts.collector import CollectorConfig, collect, load_previous, publish_snapshot
+from scripts.history_store import HISTORY_WRITE_MODES
+
+
+def record_responses(results: Dict[str, Any], record_dir: Path) -> None:
+    """取得したレスポンスをそのまま保存（スタブサーバーのフィクスチャ差し替え用）"""
+    record_dir.mkdir(parents=True, exist_ok=True)
+    names = {
+        'dam': "dam_table.html",
+        'river': "river_table.html",
+        'precipitation': "yahoo_place.json",
+        'forecast': "jma_forecast_350000.json"
+    }
+    for name, result in results.items():
+        if result.content is not None:
+            (record_dir / names.get(name, name)).write_bytes(result.content)
+
+
+def main() -> int:
+    data_dir = Path(__file__).resolve().parent.parent / "data"
+    defaults = CollectorConfig()
+    parser = argparse.ArgumentParser(description="厚東川監視データを収集する")
+    parser.add_argument("--data-dir", type=Path, default=data_dir)
+    parser.add_argument("--bousai-base", default=defaults.bousai_base)
+    parser.add_argument("--yahoo-base", default=defaults.yahoo_base)
+    parser.add_argument("--jma-base", default=defaults.jma_base)
+    parser.add_argument("--total-budget", type=float, default=defaults.total_budget, help="全体の時間予算（秒）")
+    parser.add_argument("--history-mode", choices=HISTORY_WRITE_MODES,
+                        default=os.environ.get("HISTORY_WRITE_MODE", "files"))
+    parser.add_argument("--record", type=Path, help="取得したレスポンスを保存するディレクトリ")
+    parser.add_argument("--browser-fallback", action="store_true",
+                        help="観測表が解析できないときだけヘッドレスブラウザ（selenium）で再取得する")
+    args = parser.parse_args()
+
+    config = CollectorConfig(
+        bousai_base=args.bousai_base,
+        yahoo_base=args.yahoo_base,
+        jma_base=args.jma_base,
+        yahoo_appid=os.environ.get("YAHOO_APPID") or None,
+        total_budget=args.total_budget,
+        browser_fallback=args.browser_fallback
+    )
+    latest_file = args.data_dir / "latest.json"
+    outcome = collect(config, previous=load_previous(latest_file))
+
+    if args.record:
+        record_responses(outcome['results'], args.record)
+
+    for name, error in outcome['errors'].items():
+        print(f"取得失敗 {name}: {error}")
+    print(json.dumps(outcome['timings'], ensure_ascii=False))
+
+    if 'dam' in outcome['errors'] and 'river' in outcome['errors']:
+        print("ダム・河川のどちらも取得できなかったため書き込みを中止しました")
+        return 1
+
+    path = publish_snapshot(args.data_dir, outcome['snapshot'], args.history_mode)
+    print(f"保存しました: {latest_file} / {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
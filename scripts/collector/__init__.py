@@ -0,0 +1,10 @@
+"""
+データ収集パッケージ
+山口県土木防災情報システム（ダム・河川）、Yahoo! 気象情報API、気象庁予報を同時に取得する
+"""
+
+from scripts.collector.runner import (
+    CollectorConfig, collect, collect_async, create_session, load_previous, publish_snapshot
+)
+
+__all__ = ["CollectorConfig", "collect", "collect_async", "create_session", "load_previous", "publish_snapshot"]
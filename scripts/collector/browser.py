@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+"""
+ヘッドレスブラウザによる観測表の取得（フォールバック専用）
+通常は HTTP で取得した表を lxml で解析する。表がスクリプトで描画されるなどして HTTP の応答から
+有効な行が取れなかった場合に限り、Selenium（ヘッドレス Chrome）でページを描画して HTML を得る。
+
+ブラウザの起動は収集全体で最も遅くメモリも使うため、CollectorConfig.browser_fallback が有効なときだけ使う。
+"""
+
+from typing import Dict
+from urllib.parse import urlencode
+
+
+def fetch_rendered_html(url: str, params: Dict[str, str], timeout: float = 30.0) -> bytes:
+    """ページを描画した後の HTML を UTF-8 で返す"""
+    # selenium はフォールバック時だけ読み込む
+    from selenium import webdriver
+
+    options = webdriver.ChromeOptions()
+    for argument in ("--headless=new", "--no-sandbox", "--disable-dev-shm-usage", "--disable-gpu"):
+        options.add_argument(argument)
+    driver = webdriver.Chrome(options=options)
+    try:
+        driver.set_page_load_timeout(timeout)
+        driver.get(f"{url}?{urlencode(params)}" if params else url)
+        html = driver.page_source
+    finally:
+        driver.quit()
+    # page_source は文字列のため、<meta> の Shift_JIS 指定に引きずられないよう宣言を付け直す
+    return ('<meta charset="utf-8">' + html).encode('utf-8')
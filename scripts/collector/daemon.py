@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""
+常駐型のデータ収集デーモン
+GitHub Actions のように毎回チェックアウト・依存インストール・push を挟まず、
+接続を保持したまま10分ごとの観測時刻に合わせて収集し、ローカルの data/ に直接書き込む。
+
+上流の公開に合わせて各10分区切りの publish_delay 秒後に収集し、ダム・河川のどちらも取れなければ
+retry_interval 秒ごとに再試行する。直近のサイクルの所要時間は /status で確認できる。
+
+収集間隔は schedule.AdaptiveScheduler が直近の状況から決め（大雨・増水時は短く、平常時は長く）、
+ソースごとの最小取得間隔を過ぎていないソースは取得せず前回の値を引き継ぐ。
+
+--warm-start を指定すると、保存のたびに別プロセスで scripts/warm_start.py を実行し、
+アプリの再起動直後に使うウォームスタートの成果物を更新する（グラフの作成はアプリの関数を使うため）。
+
+--live-window を指定すると、起動時と保存のたびに直近の履歴を共有メモリに公開する（scripts/live_window.py）。
+同じマシンの Streamlit プロセスはディスクから読み込まずにその領域を読む。終了時に領域を unlink する。
+
+使い方:
+    python -m scripts.collector.daemon [--data-dir data] [--status-port 8770] [--schedule adaptive|fixed]
+                                       [--warm-start] [--live-window]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Deque, Dict, Optional
+
+from scripts.collector.http_cache import ResponseCache
+from scripts.collector.runner import (
+    CollectorConfig, collect_async, create_session, load_previous, publish_snapshot, source_names
+)
+from scripts.collector.schedule import CADENCES, AdaptiveScheduler, next_boundary
+from scripts.history_store import HISTORY_WRITE_MODES, JST
+from scripts.live_window import LiveWindowPublisher
+
+# /status に保持するサイクル数
+STATUS_HISTORY = 50
+WARM_START_SCRIPT = Path(__file__).resolve().parent.parent / "warm_start.py"
+
+
+class CollectorStatus:
+    """サイクルごとの結果（スレッド間で共有）"""
+
+    def __init__(self, cache: Optional[ResponseCache] = None, history: int = STATUS_HISTORY):
+        self._lock = threading.Lock()
+        self.cache = cache
+        self.started_at = datetime.now(JST).isoformat()
+        self.cycles = 0
+        self.failures = 0
+        self.next_run: Optional[str] = None
+        self.recent: Deque[Dict[str, Any]] = deque(maxlen=history)
+
+    def record(self, cycle: Dict[str, Any]) -> None:
+        with self._lock:
+            self.cycles += 1
+            if not cycle.get('published'):
+                self.failures += 1
+            self.recent.append(cycle)
+
+    def set_next_run(self, when: datetime) -> None:
+        with self._lock:
+            self.next_run = when.isoformat()
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'started_at': self.started_at,
+                'cycles': self.cycles,
+                'failures': self.failures,
+                'next_run': self.next_run,
+                'last_cycle': self.recent[-1] if self.recent else None,
+                'cache': self.cache.metrics_dict() if self.cache is not None else {},
+                'recent_cycles': list(self.recent)
+            }
+
+
+def start_status_server(status: CollectorStatus, port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """GET /status で CollectorStatus を JSON で返すサーバーを起動"""
+
+    class StatusHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] not in ("/", "/status"):
+                self.send_error(404)
+                return
+            body = json.dumps(status.to_dict(), ensure_ascii=False).encode('utf-8')
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), StatusHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class CollectorDaemon:
+    """10分ごとの観測に合わせて収集・保存を繰り返す"""
+
+    def __init__(self, config: CollectorConfig, data_dir: Path, history_mode: str = "files",
+                 interval_minutes: int = 10, publish_delay: float = 180.0, retry_interval: float = 30.0,
+                 scheduler: Optional[AdaptiveScheduler] = None, warm_start: bool = False,
+                 live_window: bool = False):
+        self.config = config
+        self.data_dir = data_dir
+        self.history_mode = history_mode
+        self.interval_minutes = interval_minutes
+        self.publish_delay = publish_delay
+        self.retry_interval = retry_interval
+        self.scheduler = scheduler or AdaptiveScheduler()
+        self.cache = ResponseCache()
+        self.status = CollectorStatus(self.cache)
+        self.previous = load_previous(data_dir / "latest.json")
+        self.warm_start = warm_start
+        self._warm_start_process: Optional[subprocess.Popen] = None
+        self.live_window = LiveWindowPublisher(data_dir) if live_window else None
+        self._stop: Optional[asyncio.Event] = None
+
+    def stop(self) -> None:
+        if self._stop is not None:
+            self._stop.set()
+
+    async def _sleep_until(self, when: datetime) -> bool:
+        """when まで待つ（停止要求があれば False）"""
+        self.status.set_next_run(when)
+        delay = (when - datetime.now(JST)).total_seconds()
+        try:
+            await asyncio.wait_for(self._stop.wait(), timeout=max(delay, 0))
+        except asyncio.TimeoutError:
+            return True
+        return False
+
+    async def run_cycle(self, session) -> Dict[str, Any]:
+        """1回分の収集と保存"""
+        started = time.perf_counter()
+        now = datetime.now(JST)
+        sources = self.scheduler.due_sources(now, source_names(self.config))
+        self.scheduler.mark_fetched(now, sources)
+        outcome = await collect_async(self.config, session=session, now=now, previous=self.previous,
+                                      sources=sources, cache=self.cache)
+        snapshot = outcome['snapshot']
+        fetched = set(outcome['results']) - set(outcome['errors'])
+        cycle = {
+            'started_at': snapshot['timestamp'],
+            'data_time': snapshot['data_time'],
+            'sources': sources,
+            'errors': outcome['errors'],
+            'timings': outcome['timings'],
+            'published': False
+        }
+        if fetched & {'dam', 'river'}:
+            write_started = time.perf_counter()
+            publish_snapshot(self.data_dir, snapshot, self.history_mode)
+            self.previous = snapshot
+            cycle['published'] = True
+            cycle['timings']['write_ms'] = round((time.perf_counter() - write_started) * 1000, 2)
+            if self.warm_start:
+                cycle['warm_start'] = self.refresh_warm_start()
+            if self.live_window is not None:
+                cycle['live_window'] = self.publish_live_window(snapshot)
+        cycle['timings']['cycle_ms'] = round((time.perf_counter() - started) * 1000, 2)
+        self.status.record(cycle)
+        return cycle
+
+    def refresh_warm_start(self) -> bool:
+        """ウォームスタートの成果物の作成を別プロセスで始める（前回の作成中なら何もしない）
+
+        Returns: 作成を始めたら True
+        """
+        if self._warm_start_process is not None and self._warm_start_process.poll() is None:
+            return False
+        self._warm_start_process = subprocess.Popen(
+            [sys.executable, str(WARM_START_SCRIPT), "--data-dir", str(self.data_dir)],
+            cwd=WARM_START_SCRIPT.parent.parent, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        return True
+
+    def publish_live_window(self, snapshot: Dict[str, Any]) -> Optional[str]:
+        """直近の履歴を共有メモリに公開する（失敗しても収集は続ける）
+
+        Returns: 公開した領域の名前（失敗したら None）
+        """
+        try:
+            return self.live_window.publish(snapshot)['segment']
+        except Exception as e:
+            print(f"共有メモリへの公開に失敗しました: {e}", file=sys.stderr, flush=True)
+            return None
+
+    async def run(self) -> None:
+        # イベントは実行中のループで作る（Python 3.9 ではループに束縛されるため）
+        self._stop = asyncio.Event()
+        session = create_session(self.config.pool_size)
+        if self.live_window is not None and self.previous:
+            # 最初の収集までの間も、保存済みの最新までを読めるようにする
+            self.publish_live_window(self.previous)
+        try:
+            when = next_boundary(datetime.now(JST), self.interval_minutes, self.publish_delay)
+            while await self._sleep_until(when):
+                cycle = await self.run_cycle(session)
+                now = datetime.now(JST)
+                if cycle['published']:
+                    decision = self.scheduler.plan(now, self.previous)
+                    cycle['schedule'] = {'level': decision['level'], 'interval': decision['interval']}
+                    when = self.scheduler.next_run(now, decision, self.publish_delay)
+                else:
+                    # 次の区切りまでは短い間隔で再試行（ソースの最小取得間隔は守る）
+                    retry = now + timedelta(seconds=self.retry_interval)
+                    due = self.scheduler.next_due(['dam', 'river'])
+                    boundary = next_boundary(now, self.interval_minutes, self.publish_delay)
+                    when = min(max(retry, due or retry), boundary)
+                print(json.dumps(cycle, ensure_ascii=False), flush=True)
+        finally:
+            session.close()
+            if self.live_window is not None:
+                self.live_window.close()
+
+
+def main() -> None:
+    data_dir = Path(__file__).resolve().parent.parent.parent / "data"
+    parser = argparse.ArgumentParser(description="常駐型のデータ収集デーモン")
+    parser.add_argument("--data-dir", type=Path, default=data_dir)
+    parser.add_argument("--history-mode", choices=HISTORY_WRITE_MODES,
+                        default=os.environ.get("HISTORY_WRITE_MODE", "ndjson"))
+    parser.add_argument("--publish-delay", type=float, default=180.0, help="10分区切りから収集までの秒数")
+    parser.add_argument("--retry-interval", type=float, default=30.0, help="取得失敗時の再試行間隔（秒）")
+    parser.add_argument("--status-port", type=int, default=8770, help="/status のポート（0 で無効）")
+    parser.add_argument("--schedule", choices=("adaptive", "fixed"), default="adaptive",
+                        help="adaptive: 状況に応じて間隔を変える / fixed: 常に10分間隔")
+    parser.add_argument("--schedule-log", type=Path, default=None,
+                        help="収集間隔の判断ログ（既定: <data-dir>/logs/schedule.ndjson）")
+    parser.add_argument("--warm-start", action="store_true", help="保存のたびにウォームスタートの成果物を更新する")
+    parser.add_argument("--live-window", action="store_true", help="保存のたびに直近の履歴を共有メモリに公開する")
+    parser.add_argument("--bousai-base", default=CollectorConfig.bousai_base)
+    parser.add_argument("--yahoo-base", default=CollectorConfig.yahoo_base)
+    parser.add_argument("--jma-base", default=CollectorConfig.jma_base)
+    args = parser.parse_args()
+
+    config = CollectorConfig(
+        bousai_base=args.bousai_base,
+        yahoo_base=args.yahoo_base,
+        jma_base=args.jma_base,
+        yahoo_appid=os.environ.get("YAHOO_APPID") or None
+    )
+    cadences = dict(CADENCES) if args.schedule == "adaptive" else {level: 600 for level in CADENCES}
+    schedule_log = args.schedule_log or args.data_dir / "logs" / "schedule.ndjson"
+    scheduler = AdaptiveScheduler(cadences=cadences, log_file=schedule_log)
+    daemon = CollectorDaemon(config, args.data_dir, args.history_mode,
+                             publish_delay=args.publish_delay, retry_interval=args.retry_interval,
+                             scheduler=scheduler, warm_start=args.warm_start, live_window=args.live_window)
+    if args.status_port:
+        start_status_server(daemon.status, args.status_port)
+        print(f"ステータス: http://127.0.0.1:{args.status_port}/status", flush=True)
+
+    async def run() -> None:
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, daemon.stop)
+        await daemon.run()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+収集用のHTTPレスポンスキャッシュ
+前回の ETag / Last-Modified を条件付きリクエストで送り、304 が返った場合や本体のハッシュが
+前回と同じ場合は解析をやめて前回の解析結果を使う。
+
+キーは params を含めたURLのため、観測時刻（obsdt）が変わるダム・河川の表は別エントリになる。
+ソースごとに通信量・解析時間の削減量を集計する。
+"""
+
+import copy
+import hashlib
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Optional
+
+
+@dataclass
+class CacheEntry:
+    """1URL分のキャッシュ"""
+    etag: Optional[str]
+    last_modified: Optional[str]
+    content_hash: str
+    size: int
+    parsed: Any
+    parse_ms: float
+
+
+@dataclass
+class SourceCacheMetrics:
+    """ソースごとの集計"""
+    requests: int = 0
+    not_modified: int = 0
+    unchanged: int = 0
+    bytes_downloaded: int = 0
+    bytes_saved: int = 0
+    parse_ms_saved: float = 0.0
+
+
+def content_hash(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+
+class ResponseCache:
+    """URL → CacheEntry（古いものから max_entries を超えた分を捨てる）"""
+
+    def __init__(self, max_entries: int = 32):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self.metrics: Dict[str, SourceCacheMetrics] = {}
+
+    def lookup(self, key: str) -> Optional[CacheEntry]:
+        return self._entries.get(key)
+
+    def conditional_headers(self, key: str) -> Dict[str, str]:
+        """If-None-Match / If-Modified-Since ヘッダー"""
+        entry = self._entries.get(key)
+        headers = {}
+        if entry is not None:
+            if entry.etag:
+                headers['If-None-Match'] = entry.etag
+            if entry.last_modified:
+                headers['If-Modified-Since'] = entry.last_modified
+        return headers
+
+    def store(self, key: str, entry: CacheEntry) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def reuse(self, name: str, key: str, cached: str, downloaded: int) -> Any:
+        """前回の解析結果を返し、削減量を記録する（cached は 'not_modified' / 'unchanged'）"""
+        entry = self._entries[key]
+        self._entries.move_to_end(key)
+        metrics = self.metrics.setdefault(name, SourceCacheMetrics())
+        metrics.requests += 1
+        metrics.bytes_downloaded += downloaded
+        metrics.parse_ms_saved = round(metrics.parse_ms_saved + entry.parse_ms, 2)
+        if cached == 'not_modified':
+            metrics.not_modified += 1
+            metrics.bytes_saved += entry.size
+        else:
+            metrics.unchanged += 1
+        return copy.deepcopy(entry.parsed)
+
+    def record_miss(self, name: str, downloaded: int) -> None:
+        metrics = self.metrics.setdefault(name, SourceCacheMetrics())
+        metrics.requests += 1
+        metrics.bytes_downloaded += downloaded
+
+    def metrics_dict(self) -> Dict[str, Dict[str, Any]]:
+        return {name: asdict(metrics) for name, metrics in self.metrics.items()}
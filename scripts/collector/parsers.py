@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+データソースごとのレスポンス解析
+各関数は取得したレスポンス本体（bytes）を受け取り、latest.json の該当部分を返す。
+
+観測表（ダム・河川）はコンパイル済みの lxml XPath で行とセルを取り出す。
+BeautifulSoup 版は lxml が使えない環境向けと、ベンチマークでの比較用に残している。
+"""
+
+import json
+import re
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from bs4 import BeautifulSoup
+
+try:
+    from lxml import etree
+except ImportError:  # lxml がない環境では BeautifulSoup（html.parser）で解析する
+    etree = None
+
+# 表の時刻セル（'2025/08/10 06:10'、'06:10' など。全角スペースを含む場合あり）
+TIME_CELL_PATTERN = re.compile(r'(?:(\d{4})/(\d{1,2})/(\d{1,2}))?\s*(\d{1,2}):(\d{2})')
+
+# 観測表の解析方法
+TABLE_BACKENDS = ("lxml", "bs4-lxml", "bs4")
+DEFAULT_TABLE_BACKEND = "lxml" if etree is not None else "bs4"
+
+# <meta> の文字コード指定（山口県のページは Shift_JIS）
+META_CHARSET_PATTERN = re.compile(rb'<meta[^>]+charset=["\']?([A-Za-z0-9_-]+)', re.IGNORECASE)
+
+if etree is not None:
+    ROW_XPATH = etree.XPath('//tr')
+    CELL_XPATH = etree.XPath('./td | ./th')
+    TEXT_XPATH = etree.XPath('string(.)')
+    _HTML_PARSERS: Dict[str, Any] = {}
+
+# 河川水位の警戒基準（持世寺）
+RIVER_STATUS_LEVELS = [
+    (5.50, '氾濫危険'),
+    (5.10, '避難判断'),
+    (5.00, '氾濫注意'),
+    (3.80, '水防団待機')
+]
+
+# 気象庁の天気コード（週間予報の表示用）
+WEATHER_CODE_TEXT = {
+    '100': '晴れ', '101': '晴れ時々くもり', '102': '晴れ一時雨', '103': '晴れ時々雨',
+    '110': '晴れ後時々くもり', '111': '晴れ後くもり', '112': '晴れ後一時雨', '114': '晴れ後雨',
+    '200': 'くもり', '201': 'くもり時々晴れ', '202': 'くもり一時雨', '203': 'くもり時々雨',
+    '210': 'くもり後時々晴れ', '211': 'くもり後晴れ', '212': 'くもり後一時雨', '214': 'くもり後雨',
+    '300': '雨', '301': '雨時々晴れ', '302': '雨時々くもり', '311': '雨後晴れ', '313': '雨後くもり',
+    '400': '雪'
+}
+
+# 週間予報の曜日表記
+WEEKDAYS = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+
+
+def to_float(text: str) -> Optional[float]:
+    """表のセル文字列を数値に変換（'-'、'欠測'、空欄は None）"""
+    text = (text or '').replace('　', '').replace(',', '').strip()
+    try:
+        return float(text)
+    except ValueError:
+        return None
+
+
+def _is_time_row(cells: List[str]) -> bool:
+    return bool(cells) and TIME_CELL_PATTERN.fullmatch(cells[0].replace('　', ' ').strip()) is not None
+
+
+def html_encoding(content: bytes) -> str:
+    """<meta> で指定された文字コード（なければ utf-8）"""
+    match = META_CHARSET_PATTERN.search(content[:2048])
+    return match.group(1).decode('ascii').lower() if match else 'utf-8'
+
+
+def _html_parser(encoding: str):
+    if encoding not in _HTML_PARSERS:
+        _HTML_PARSERS[encoding] = etree.HTMLParser(encoding=encoding, remove_comments=True)
+    return _HTML_PARSERS[encoding]
+
+
+def _lxml_table_rows(content: bytes) -> List[List[str]]:
+    root = etree.fromstring(content, _html_parser(html_encoding(content)))
+    if root is None:
+        return []
+    rows = []
+    for tr in ROW_XPATH(root):
+        # 入れ子の表（レイアウト用）では外側の行が内側の文字をまとめて持つため、td/th 直下の文字だけを見る
+        cells = [TEXT_XPATH(cell).strip() for cell in CELL_XPATH(tr)]
+        if _is_time_row(cells):
+            rows.append(cells)
+    return rows
+
+
+def _bs4_table_rows(content: bytes, features: str) -> List[List[str]]:
+    soup = BeautifulSoup(content, features)
+    rows = []
+    for tr in soup.find_all('tr'):
+        cells = [cell.get_text(strip=True) for cell in tr.find_all(['td', 'th'], recursive=False)]
+        if _is_time_row(cells):
+            rows.append(cells)
+    return rows
+
+
+def parse_table_rows(content: bytes, backend: str = DEFAULT_TABLE_BACKEND) -> List[List[str]]:
+    """観測表のうち、先頭セルが時刻の行だけを取り出す"""
+    if backend == "lxml" and etree is not None:
+        return _lxml_table_rows(content)
+    if backend == "bs4-lxml" and etree is not None:
+        return _bs4_table_rows(content, 'lxml')
+    return _bs4_table_rows(content, 'html.parser')
+
+
+def row_time(cell: str, observation_time: datetime) -> Optional[datetime]:
+    """表の時刻セルを日時にする（日付のないセルは観測時刻の日付、'24:00' は翌日の 0:00）"""
+    match = TIME_CELL_PATTERN.fullmatch(cell.replace('　', ' ').strip())
+    if match is None:
+        return None
+    year, month, day, hour, minute = match.groups()
+    try:
+        base = observation_time.replace(hour=0, minute=0, second=0, microsecond=0)
+        if year is not None:
+            base = base.replace(year=int(year), month=int(month), day=int(day))
+        return base + timedelta(hours=int(hour), minutes=int(minute))
+    except ValueError:
+        return None
+
+
+def select_observation_row(rows: List[List[str]], observation_time: datetime) -> Optional[List[str]]:
+    """観測時刻（日付を含む）に一致し、値が入っている行を選ぶ（なければ None）
+
+    最後の行などで代用すると、古い時刻・前日の行の値が観測時刻の値として保存されるため、代用はしない。
+    """
+    for cells in rows:
+        if row_time(cells[0], observation_time) == observation_time and to_float(cells[1]) is not None:
+            return cells
+    return None
+
+
+def parse_dam_table(content: bytes, observation_time: datetime, backend: str = DEFAULT_TABLE_BACKEND) -> Dict[str, Any]:
+    """ダム観測表（時刻, 60分雨量, 累加雨量, 貯水位, 貯水率, 流入量, 全放流量, ...）"""
+    return build_dam_section(select_observation_row(parse_table_rows(content, backend), observation_time))
+
+
+def build_dam_section(cells: Optional[List[str]]) -> Dict[str, Any]:
+    """ダム観測表の1行から dam / rainfall 部分を作る"""
+    if cells is None:
+        raise ValueError("ダム観測表に観測時刻の有効な行がありません")
+    cells = cells + [''] * (8 - len(cells))
+    hourly = to_float(cells[1])
+    cumulative = to_float(cells[2])
+    return {
+        'dam': {
+            'water_level': to_float(cells[3]),
+            'storage_rate': to_float(cells[4]),
+            'inflow': to_float(cells[5]),
+            'outflow': to_float(cells[6]),
+            'storage_change': to_float(cells[7])
+        },
+        'rainfall': {
+            'hourly': int(hourly) if hourly is not None else None,
+            'cumulative': int(cumulative) if cumulative is not None else None
+        }
+    }
+
+
+def river_status(level: Optional[float]) -> str:
+    """河川水位から警戒レベル名を判定"""
+    if level is None:
+        return '正常'
+    for threshold, name in RIVER_STATUS_LEVELS:
+        if level >= threshold:
+            return name
+    return '正常'
+
+
+def parse_river_table(content: bytes, observation_time: datetime, backend: str = DEFAULT_TABLE_BACKEND) -> Dict[str, Any]:
+    """河川水位観測表（時刻, 水位, 水位変化）"""
+    return build_river_section(select_observation_row(parse_table_rows(content, backend), observation_time))
+
+
+def build_river_section(cells: Optional[List[str]]) -> Dict[str, Any]:
+    """河川水位観測表の1行から river 部分を作る"""
+    if cells is None:
+        raise ValueError("河川水位観測表に観測時刻の有効な行がありません")
+    cells = cells + [''] * (3 - len(cells))
+    level = to_float(cells[1])
+    return {
+        'river': {
+            'water_level': level,
+            'level_change': to_float(cells[2]),
+            'status': river_status(level)
+        }
+    }
+
+
+def parse_yahoo_precipitation(content: bytes) -> Dict[str, Any]:
+    """Yahoo! 気象情報API（weather/V1/place）の降水強度"""
+    payload = json.loads(content)
+    weather_list = payload['Feature'][0]['Property']['WeatherList']['Weather']
+    observation = []
+    forecast = []
+    for item in weather_list:
+        dt = datetime.strptime(item['Date'], '%Y%m%d%H%M')
+        entry = {
+            'datetime': dt.strftime('%Y-%m-%dT%H:%M:00+09:00'),
+            'intensity': float(item.get('Rainfall') or 0.0)
+        }
+        if item.get('Type') == 'observation':
+            observation.append(entry)
+        else:
+            forecast.append(entry)
+    return {'observation': observation, 'forecast': forecast}
+
+
+def _day_entry(codes: List[str], texts: List[str], index: int) -> Dict[str, Any]:
+    return {
+        'weather_code': codes[index] if index < len(codes) else None,
+        'weather_text': texts[index] if index < len(texts) else None,
+        'temp_max': None,
+        'temp_min': None,
+        'precipitation_probability': [],
+        'precipitation_times': []
+    }
+
+
+def _find_area(areas: List[Dict[str, Any]], code: str) -> Optional[Dict[str, Any]]:
+    for area in areas:
+        if area.get('area', {}).get('code') == code:
+            return area
+    return areas[0] if areas else None
+
+
+def parse_jma_forecast(content: bytes, area_code: str, temp_area_code: str) -> Dict[str, Any]:
+    """気象庁の府県天気予報・週間天気予報（forecast/{office}.json）"""
+    payload = json.loads(content)
+    short_term, weekly = payload[0], payload[1] if len(payload) > 1 else None
+    series = short_term['timeSeries']
+
+    area = _find_area(series[0]['areas'], area_code) or {}
+    codes = area.get('weatherCodes', [])
+    texts = area.get('weathers', [])
+    day_keys = ['today', 'tomorrow', 'day_after_tomorrow']
+    days = [datetime.fromisoformat(t).date() for t in series[0]['timeDefines']]
+    weather = {key: _day_entry(codes, texts, i) for i, key in enumerate(day_keys) if i < len(days)}
+
+    # 降水確率（6時間ごと）
+    if len(series) > 1:
+        pop_area = _find_area(series[1]['areas'], area_code) or {}
+        for time_str, pop in zip(series[1]['timeDefines'], pop_area.get('pops', [])):
+            dt = datetime.fromisoformat(time_str)
+            if dt.date() in days and pop != '':
+                entry = weather[day_keys[days.index(dt.date())]]
+                entry['precipitation_probability'].append(int(pop))
+                entry['precipitation_times'].append(dt.strftime('%H時'))
+
+    # 気温（地点）
+    if len(series) > 2:
+        temp_area = _find_area(series[2]['areas'], temp_area_code) or {}
+        temps = {}
+        for time_str, temp in zip(series[2]['timeDefines'], temp_area.get('temps', [])):
+            if temp != '':
+                temps.setdefault(datetime.fromisoformat(time_str).date(), []).append(int(temp))
+        for i, day in enumerate(days[:len(day_keys)]):
+            if day in temps:
+                weather[day_keys[i]]['temp_min'] = min(temps[day])
+                weather[day_keys[i]]['temp_max'] = max(temps[day])
+
+    weather['update_time'] = short_term.get('reportDatetime')
+    weather['weekly_forecast'] = parse_jma_weekly(weekly, temp_area_code) if weekly else []
+    return weather
+
+
+def parse_jma_weekly(weekly: Dict[str, Any], temp_area_code: str) -> List[Dict[str, Any]]:
+    """週間天気予報"""
+    series = weekly['timeSeries']
+    area = series[0]['areas'][0]
+    temp_area = _find_area(series[1]['areas'], temp_area_code) if len(series) > 1 else None
+    forecast = []
+    for i, time_str in enumerate(series[0]['timeDefines']):
+        dt = datetime.fromisoformat(time_str)
+        code = area.get('weatherCodes', [None] * (i + 1))[i]
+        pop = area.get('pops', [''] * (i + 1))[i]
+        temp_max = temp_area.get('tempsMax', [''] * (i + 1))[i] if temp_area else ''
+        temp_min = temp_area.get('tempsMin', [''] * (i + 1))[i] if temp_area else ''
+        forecast.append({
+            'date': dt.strftime('%Y-%m-%d'),
+            'day_of_week': WEEKDAYS[dt.weekday()],
+            'weather_code': code,
+            'weather_text': WEATHER_CODE_TEXT.get(code, '不明'),
+            'precipitation_probability': int(pop) if pop not in ('', None) else None,
+            'temp_max': int(temp_max) if temp_max not in ('', None) else None,
+            'temp_min': int(temp_min) if temp_min not in ('', None) else None
+        })
+    return forecast
@@ -0,0 +1,406 @@
+#!/usr/bin/env python3
+"""
+データ収集の実行
+4つのデータソースを asyncio で同時に取得し、latest.json / 履歴と同じ形式のスナップショットを作る。
+
+HTTP は接続プール付きの requests.Session を共有し、各取得はワーカースレッドで実行する。
+ソースごとのタイムアウトと全体の時間予算を持ち、間に合わなかったソースは None として扱う。
+ResponseCache を渡すと条件付きリクエストを送り、変化のないレスポンスは解析しない。
+"""
+
+import asyncio
+import json
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from scripts.collector import parsers
+from scripts.collector.http_cache import CacheEntry, ResponseCache, content_hash
+from scripts.history_store import JST, _write_atomic, write_snapshot
+
+
+@dataclass
+class CollectorConfig:
+    """収集設定（ベースURLはスタブサーバーに差し替え可能）"""
+    bousai_base: str = "https://y-bousai.pref.yamaguchi.lg.jp"
+    yahoo_base: str = "https://map.yahooapis.jp"
+    jma_base: str = "https://www.jma.go.jp"
+    yahoo_appid: Optional[str] = None
+    dam_code: str = "015"
+    river_code: str = "05067"
+    coordinates: str = "131.289496,34.079891"
+    jma_office: str = "350000"
+    jma_area: str = "350010"
+    jma_temp_area: str = "81428"
+    timeouts: Dict[str, float] = field(default_factory=lambda: {
+        'dam': 20.0,
+        'river': 20.0,
+        'precipitation': 15.0,
+        'forecast': 15.0
+    })
+    total_budget: float = 60.0
+    pool_size: int = 8
+    table_backend: str = parsers.DEFAULT_TABLE_BACKEND
+    browser_fallback: bool = False          # 観測表が解析できないときだけヘッドレスブラウザで再取得
+
+
+# ソース名 → スナップショット内の担当キー（取得しなかったソースは前回の値を引き継ぐ）
+SOURCE_SECTIONS = {
+    'dam': ('dam', 'rainfall'),
+    'river': ('river',),
+    'precipitation': ('precipitation_intensity',),
+    'forecast': ('weather',)
+}
+
+
+@dataclass
+class FetchResult:
+    """1ソース分の取得結果"""
+    name: str
+    url: str
+    status: Optional[int] = None
+    content: Optional[bytes] = None
+    elapsed_ms: float = 0.0
+    error: Optional[str] = None
+    key: Optional[str] = None                # キャッシュのキー（params を含むURL）
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    content_hash: Optional[str] = None
+    cached: Optional[str] = None             # 'not_modified'（304）/ 'unchanged'（同じ本体）
+
+
+def observation_time(now: datetime) -> datetime:
+    """10分単位に丸めて、さらに10分前を観測時刻とする（データ公開遅延への対応）"""
+    now = now.astimezone(JST)
+    minutes = (now.minute // 10) * 10
+    return now.replace(minute=minutes, second=0, microsecond=0) - timedelta(minutes=10)
+
+
+def create_session(pool_size: int = 8) -> requests.Session:
+    """接続プール付きのセッション"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers['User-Agent'] = "kotogawa-monitor/2.5 (+https://github.com/dobocreate/kotogawa-monitor-streamlit)"
+    return session
+
+
+def source_names(config: CollectorConfig) -> List[str]:
+    """設定で有効なソース名"""
+    names = ['dam', 'river', 'forecast']
+    if config.yahoo_appid:
+        names.append('precipitation')
+    return names
+
+
+def build_requests(config: CollectorConfig, obs_time: datetime,
+                   sources: Optional[Iterable[str]] = None) -> Dict[str, Dict[str, Any]]:
+    """ソース名 → (url, params)（sources を指定するとそのソースのみ）"""
+    obsdt = obs_time.strftime('%Y%m%d%H%M')
+    source_requests = {
+        'dam': {
+            'url': f"{config.bousai_base}/citizen/dam/kdm_table.aspx",
+            'params': {'check': config.dam_code, 'obsdt': obsdt, 'pop': '1'}
+        },
+        'river': {
+            'url': f"{config.bousai_base}/citizen/water/kwl_table.aspx",
+            'params': {'check': config.river_code, 'obsdt': obsdt, 'pop': '1'}
+        },
+        'forecast': {
+            'url': f"{config.jma_base}/bosai/forecast/data/forecast/{config.jma_office}.json",
+            'params': {}
+        }
+    }
+    if config.yahoo_appid:
+        source_requests['precipitation'] = {
+            'url': f"{config.yahoo_base}/weather/V1/place",
+            'params': {
+                'coordinates': config.coordinates,
+                'appid': config.yahoo_appid,
+                'output': 'json',
+                'interval': '10',
+                'past': '2'
+            }
+        }
+    if sources is not None:
+        wanted = set(sources)
+        source_requests = {name: request for name, request in source_requests.items() if name in wanted}
+    return source_requests
+
+
+# 本文を読む単位（読むたびに期限を確認する）
+READ_CHUNK_SIZE = 64 * 1024
+
+
+def _read_body(response: requests.Response, deadline: float) -> bytes:
+    """本文を期限まで読む（requests の timeout は1回の読み込みごとのため、合計の時間はここで打ち切る）
+
+    urllib3 2 系では届いた分ずつ読み（read1）、そのたびに期限を確認する。
+    """
+    raw = response.raw
+    if not hasattr(raw, 'read1'):
+        # urllib3 1 系: READ_CHUNK_SIZE ずつ読む（チャンクの途中では期限を確認できない）
+        read = lambda: next(response.iter_content(READ_CHUNK_SIZE), b'')
+    else:
+        read = lambda: raw.read1(READ_CHUNK_SIZE, decode_content=True)
+    chunks = []
+    size = 0
+    while True:
+        chunk = read()
+        if not chunk:
+            return b''.join(chunks)
+        chunks.append(chunk)
+        size += len(chunk)
+        if time.perf_counter() > deadline:
+            raise requests.Timeout(f"本文の読み込みが時間予算を超えました ({size} bytes)")
+
+
+def _fetch(session: requests.Session, name: str, url: str, params: Dict[str, str], timeout: float,
+           cache: Optional[ResponseCache] = None) -> FetchResult:
+    """1ソースを取得する（接続・読み込みとも timeout 以内、本文の読み込みは開始から timeout で打ち切る）"""
+    started = time.perf_counter()
+    deadline = started + timeout
+    result = FetchResult(name=name, url=url)
+    result.key = requests.Request('GET', url, params=params).prepare().url
+    entry = cache.lookup(result.key) if cache is not None else None
+    headers = cache.conditional_headers(result.key) if entry is not None else None
+    try:
+        with session.get(url, params=params, timeout=(timeout, timeout), headers=headers, stream=True) as response:
+            result.status = response.status_code
+            if response.status_code == 304 and entry is not None:
+                result.cached = 'not_modified'
+            else:
+                response.raise_for_status()
+                result.content = _read_body(response, deadline)
+                result.etag = response.headers.get('ETag')
+                result.last_modified = response.headers.get('Last-Modified')
+                if cache is not None:
+                    result.content_hash = content_hash(result.content)
+                    if entry is not None and entry.content_hash == result.content_hash:
+                        result.cached = 'unchanged'
+    except requests.RequestException as e:
+        result.error = str(e)
+    result.elapsed_ms = round((time.perf_counter() - started) * 1000, 2)
+    return result
+
+
+async def fetch_all(session: requests.Session, config: CollectorConfig, obs_time: datetime,
+                    sources: Optional[Iterable[str]] = None,
+                    cache: Optional[ResponseCache] = None) -> Dict[str, FetchResult]:
+    """ソースを同時に取得（全体の時間予算を超えたソースはタイムアウト扱い）
+
+    時間予算は各リクエストの接続・読み込みのタイムアウトとして渡し、ワーカースレッド自体が期限内に終わるようにする。
+    wait_for は万一スレッドが戻らない場合の打ち切りにだけ使う（キャンセルしてもスレッドは止まらないため）。
+    """
+    deadline = time.perf_counter() + config.total_budget
+    source_requests = build_requests(config, obs_time, sources)
+
+    async def fetch_one(name: str, request: Dict[str, Any]) -> FetchResult:
+        timeout = min(config.timeouts.get(name, 15.0), max(deadline - time.perf_counter(), 0.1))
+        try:
+            return await asyncio.wait_for(
+                asyncio.to_thread(_fetch, session, name, request['url'], request['params'], timeout, cache),
+                timeout=timeout + 1.0
+            )
+        except asyncio.TimeoutError:
+            return FetchResult(name=name, url=request['url'], elapsed_ms=timeout * 1000, error="timeout")
+
+    results = await asyncio.gather(*(fetch_one(name, request) for name, request in source_requests.items()))
+    return {result.name: result for result in results}
+
+
+def source_parsers(config: CollectorConfig, obs_time: datetime) -> Dict[str, Callable[[bytes], Dict[str, Any]]]:
+    """ソース名 → 解析関数"""
+    return {
+        'dam': lambda content: parsers.parse_dam_table(content, obs_time, config.table_backend),
+        'river': lambda content: parsers.parse_river_table(content, obs_time, config.table_backend),
+        'precipitation': parsers.parse_yahoo_precipitation,
+        'forecast': lambda content: parsers.parse_jma_forecast(content, config.jma_area, config.jma_temp_area)
+    }
+
+
+def parse_results(results: Dict[str, FetchResult], config: CollectorConfig, obs_time: datetime,
+                  cache: Optional[ResponseCache] = None) -> Dict[str, Any]:
+    """取得結果を解析（失敗したソースは errors に記録、変化のないレスポンスはキャッシュの解析結果を使う）"""
+    parsed = {}
+    errors = {}
+    parse_ms = {}
+    for name, parse in source_parsers(config, obs_time).items():
+        result = results.get(name)
+        if result is None:
+            continue
+        downloaded = len(result.content) if result.content is not None else 0
+        if result.cached and cache is not None:
+            parsed[name] = cache.reuse(name, result.key, result.cached, downloaded)
+            parse_ms[name] = 0.0
+            continue
+        if result.content is None:
+            errors[name] = result.error
+            continue
+        started = time.perf_counter()
+        try:
+            parsed[name] = parse(result.content)
+        except (ValueError, KeyError, IndexError, TypeError) as e:
+            errors[name] = f"parse error: {e}"
+        parse_ms[name] = round((time.perf_counter() - started) * 1000, 2)
+        if cache is not None:
+            cache.record_miss(name, downloaded)
+            if name in parsed:
+                cache.store(result.key, CacheEntry(
+                    etag=result.etag,
+                    last_modified=result.last_modified,
+                    content_hash=result.content_hash,
+                    size=downloaded,
+                    parsed=parsed[name],
+                    parse_ms=parse_ms[name]
+                ))
+    return {'parsed': parsed, 'errors': errors, 'parse_ms': parse_ms}
+
+
+def unparsed_tables(errors: Dict[str, str]) -> List[str]:
+    """解析に失敗した観測表のソース名（接続エラーは含めない）"""
+    return [name for name in ('dam', 'river') if str(errors.get(name, '')).startswith("parse error")]
+
+
+async def browser_fallback(config: CollectorConfig, obs_time: datetime, parsed: Dict[str, Any]) -> Dict[str, float]:
+    """観測表（ダム・河川）が取得できたのに解析できなかった場合に限り、ブラウザで描画した HTML を解析する
+
+    parsed の errors / parsed を更新し、ソースごとの所要時間を返す。
+    """
+    from scripts.collector.browser import fetch_rendered_html
+
+    elapsed = {}
+    table_requests = build_requests(config, obs_time, unparsed_tables(parsed['errors']))
+    table_parsers = source_parsers(config, obs_time)
+    for name, request in table_requests.items():
+        started = time.perf_counter()
+        try:
+            content = await asyncio.to_thread(fetch_rendered_html, request['url'], request['params'],
+                                              config.timeouts.get(name, 30.0))
+            parsed['parsed'][name] = table_parsers[name](content)
+            del parsed['errors'][name]
+        except Exception as e:  # ブラウザ側の失敗は元のエラーに併記するだけにする
+            parsed['errors'][name] = f"{parsed['errors'][name]} / browser: {e}"
+        elapsed[name] = round((time.perf_counter() - started) * 1000, 2)
+    return elapsed
+
+
+def build_snapshot(parsed: Dict[str, Any], now: datetime, obs_time: datetime,
+                   previous: Optional[Dict[str, Any]] = None, carried: Iterable[str] = ()) -> Dict[str, Any]:
+    """解析結果から latest.json / 履歴と同じ形式のスナップショットを組み立てる
+
+    carried のソース（今回取得しなかったもの）は前回のスナップショットの値を引き継ぐ。
+    """
+    dam_part = parsed.get('dam') or {}
+    dam = dam_part.get('dam') or {
+        'water_level': None, 'storage_rate': None, 'inflow': None, 'outflow': None, 'storage_change': None
+    }
+    rainfall = dict(dam_part.get('rainfall') or {'hourly': None, 'cumulative': None})
+    previous_hourly = ((previous or {}).get('rainfall') or {}).get('hourly')
+    if rainfall.get('hourly') is not None and previous_hourly is not None:
+        rainfall['change'] = rainfall['hourly'] - previous_hourly
+    else:
+        rainfall['change'] = 0 if rainfall.get('hourly') is not None else None
+
+    river = (parsed.get('river') or {}).get('river') or {
+        'water_level': None, 'level_change': None, 'status': '正常'
+    }
+
+    weather = parsed.get('forecast')
+    if weather is None and previous:
+        # 予報が取れなかった場合は前回の予報を引き継ぐ
+        weather = previous.get('weather')
+
+    precipitation = dict(parsed.get('precipitation') or {'observation': [], 'forecast': []})
+    precipitation['update_time'] = now.isoformat()
+
+    snapshot = {
+        'timestamp': now.isoformat(),
+        'data_time': obs_time.isoformat(),
+        'dam': dam,
+        'river': river,
+        'rainfall': rainfall,
+        'weather': weather or {},
+        'precipitation_intensity': precipitation
+    }
+    for name in carried:
+        for key in SOURCE_SECTIONS.get(name, ()):
+            if previous and key in previous:
+                snapshot[key] = previous[key]
+    return snapshot
+
+
+async def collect_async(config: CollectorConfig, session: Optional[requests.Session] = None,
+                        now: Optional[datetime] = None, previous: Optional[Dict[str, Any]] = None,
+                        sources: Optional[Iterable[str]] = None,
+                        cache: Optional[ResponseCache] = None) -> Dict[str, Any]:
+    """1回分の収集を行う（sources を指定するとそのソースのみ取得し、残りは前回の値を引き継ぐ）
+
+    Returns: {'snapshot': ..., 'results': {name: FetchResult}, 'errors': ..., 'timings': ...}
+    """
+    started = time.perf_counter()
+    now = (now or datetime.now(JST)).astimezone(JST)
+    obs_time = observation_time(now)
+    own_session = session is None
+    if own_session:
+        session = create_session(config.pool_size)
+    try:
+        results = await fetch_all(session, config, obs_time, sources, cache)
+    finally:
+        if own_session:
+            session.close()
+    fetched = time.perf_counter()
+
+    parsed = parse_results(results, config, obs_time, cache)
+    browser_ms = {}
+    if config.browser_fallback and unparsed_tables(parsed['errors']):
+        browser_ms = await browser_fallback(config, obs_time, parsed)
+    carried = [name for name in source_names(config) if name not in results]
+    snapshot = build_snapshot(parsed['parsed'], now, obs_time, previous, carried)
+    finished = time.perf_counter()
+
+    return {
+        'snapshot': snapshot,
+        'results': results,
+        'errors': parsed['errors'],
+        'timings': {
+            'fetch_ms': {name: result.elapsed_ms for name, result in results.items()},
+            'cached': {name: result.cached for name, result in results.items() if result.cached},
+            'parse_ms': parsed['parse_ms'],
+            'browser_ms': browser_ms,
+            'fetch_total_ms': round((fetched - started) * 1000, 2),
+            'total_ms': round((finished - started) * 1000, 2)
+        }
+    }
+
+
+def collect(config: CollectorConfig, session: Optional[requests.Session] = None,
+            now: Optional[datetime] = None, previous: Optional[Dict[str, Any]] = None,
+            sources: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+    """collect_async の同期版"""
+    return asyncio.run(collect_async(config, session, now, previous, sources))
+
+
+def load_previous(latest_file: Path) -> Optional[Dict[str, Any]]:
+    """前回の latest.json（なければ None）"""
+    try:
+        with open(latest_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+
+def publish_snapshot(data_dir: Path, snapshot: Dict[str, Any], history_mode: str = "files") -> Path:
+    """latest.json をアトミックに置き換え、履歴に追加する
+
+    Returns: 履歴に書き込んだファイルのパス
+    """
+    payload = json.dumps(snapshot, ensure_ascii=False, indent=2).encode('utf-8')
+    _write_atomic(data_dir / "latest.json", payload)
+    return write_snapshot(data_dir / "history", snapshot, mode=history_mode)
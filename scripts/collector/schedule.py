@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+状況に応じた収集間隔の決定
+直近のスナップショット（時間雨量・降水強度予測・河川水位変化・河川の警戒状態）から収集間隔を選び、
+ソースごとの最小取得間隔で上流サイトへのアクセスを制限する。
+
+判断はすべて data/logs/schedule.ndjson に入力値とともに記録し、しきい値を変えて再評価できる。
+
+使い方:
+    python -m scripts.collector.schedule --replay data/logs/schedule.ndjson
+    python -m scripts.collector.schedule --history-dir data/history    # 履歴に対して判断を再現
+"""
+
+import argparse
+import json
+from collections import Counter
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from scripts.history_store import iter_day_dirs, load_day_snapshots
+from scripts.ndjson_log import append_log
+
+# 収集レベル → 収集間隔（秒）
+CADENCES = {
+    'alert': 120,
+    'active': 300,
+    'normal': 600,
+    'calm': 1800
+}
+
+# ソースごとの最小取得間隔（秒）。気象庁の府県予報は1日3回更新のため長めにする
+SOURCE_MIN_INTERVALS = {
+    'dam': 120,
+    'river': 120,
+    'precipitation': 300,
+    'forecast': 1800
+}
+
+
+def next_boundary(now: datetime, interval_minutes: int = 10, delay_seconds: float = 0.0) -> datetime:
+    """now より後で最初の「interval 区切り + delay」の時刻"""
+    base = now.replace(minute=(now.minute // interval_minutes) * interval_minutes, second=0, microsecond=0)
+    candidate = base + timedelta(seconds=delay_seconds)
+    while candidate <= now:
+        candidate += timedelta(minutes=interval_minutes)
+    return candidate
+
+
+@dataclass
+class ScheduleThresholds:
+    """収集間隔を短くするしきい値"""
+    rainfall_hourly: float = 10.0       # 時間雨量（mm）: やや強い雨
+    forecast_intensity: float = 10.0    # 降水強度予測の最大値（mm/h）
+    level_change: float = 0.10          # 河川水位の10分変化（m）
+
+
+def extract_inputs(snapshot: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """判断に使う値をスナップショットから取り出す"""
+    snapshot = snapshot or {}
+    forecast = (snapshot.get('precipitation_intensity') or {}).get('forecast') or []
+    intensities = [item.get('intensity') or 0.0 for item in forecast]
+    river = snapshot.get('river') or {}
+    return {
+        'data_time': snapshot.get('data_time'),
+        'rainfall_hourly': (snapshot.get('rainfall') or {}).get('hourly'),
+        'forecast_intensity': max(intensities) if intensities else None,
+        'level_change': river.get('level_change'),
+        'river_status': river.get('status')
+    }
+
+
+def decide(inputs: Dict[str, Any], thresholds: ScheduleThresholds) -> Tuple[str, List[str]]:
+    """入力値から収集レベルと理由を決める"""
+    reasons = []
+    if inputs.get('river_status') not in (None, '正常'):
+        reasons.append(f"river_status={inputs['river_status']}")
+    if (inputs.get('level_change') or 0) >= thresholds.level_change:
+        reasons.append(f"level_change={inputs['level_change']}")
+    if reasons:
+        return 'alert', reasons
+
+    if (inputs.get('rainfall_hourly') or 0) >= thresholds.rainfall_hourly:
+        reasons.append(f"rainfall_hourly={inputs['rainfall_hourly']}")
+    if (inputs.get('forecast_intensity') or 0) >= thresholds.forecast_intensity:
+        reasons.append(f"forecast_intensity={inputs['forecast_intensity']}")
+    if reasons:
+        return 'active', reasons
+
+    # 雨が降っている・降る予報がある間は通常間隔、それ以外は間隔を延ばす
+    if (inputs.get('rainfall_hourly') or 0) > 0 or (inputs.get('forecast_intensity') or 0) > 0:
+        return 'normal', ['rain']
+    return 'calm', ['all_normal']
+
+
+@dataclass
+class AdaptiveScheduler:
+    """収集レベルの決定とソースごとのアクセス制限"""
+    thresholds: ScheduleThresholds = field(default_factory=ScheduleThresholds)
+    cadences: Dict[str, int] = field(default_factory=lambda: dict(CADENCES))
+    source_intervals: Dict[str, int] = field(default_factory=lambda: dict(SOURCE_MIN_INTERVALS))
+    log_file: Optional[Path] = None
+    last_fetch: Dict[str, datetime] = field(default_factory=dict)
+
+    def plan(self, now: datetime, snapshot: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """次回の収集レベル・間隔を決めて記録する"""
+        inputs = extract_inputs(snapshot)
+        level, reasons = decide(inputs, self.thresholds)
+        decision = {
+            'time': now.isoformat(),
+            'level': level,
+            'interval': self.cadences[level],
+            'reasons': reasons,
+            'inputs': inputs,
+            'thresholds': asdict(self.thresholds)
+        }
+        if self.log_file is not None:
+            append_log(self.log_file, decision)
+        return decision
+
+    def next_run(self, now: datetime, decision: Dict[str, Any], publish_delay: float = 0.0) -> datetime:
+        """次回の収集時刻（10分以上の間隔は観測の区切りにそろえる）"""
+        interval = decision['interval']
+        if interval >= 600:
+            return next_boundary(now, interval // 60, publish_delay)
+        return now + timedelta(seconds=interval)
+
+    def due_sources(self, now: datetime, sources: Iterable[str]) -> List[str]:
+        """最小取得間隔を過ぎたソース"""
+        due = []
+        for name in sources:
+            last = self.last_fetch.get(name)
+            if last is None or (now - last).total_seconds() >= self.source_intervals.get(name, 0):
+                due.append(name)
+        return due
+
+    def next_due(self, sources: Iterable[str]) -> Optional[datetime]:
+        """sources のうち最も早く取得可能になる時刻"""
+        times = [
+            self.last_fetch[name] + timedelta(seconds=self.source_intervals.get(name, 0))
+            for name in sources if name in self.last_fetch
+        ]
+        return min(times) if times else None
+
+    def mark_fetched(self, now: datetime, sources: Iterable[str]) -> None:
+        for name in sources:
+            self.last_fetch[name] = now
+
+
+def replay_log(log_file: Path, thresholds: ScheduleThresholds) -> Dict[str, Any]:
+    """記録した判断を現在のしきい値で再評価し、結果が変わる判断を数える"""
+    recorded = Counter()
+    replayed = Counter()
+    changed = []
+    with open(log_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            decision = json.loads(line)
+            level, reasons = decide(decision['inputs'], thresholds)
+            recorded[decision['level']] += 1
+            replayed[level] += 1
+            if level != decision['level']:
+                changed.append({'time': decision['time'], 'recorded': decision['level'],
+                                'replayed': level, 'reasons': reasons})
+    return {'recorded': dict(recorded), 'replayed': dict(replayed), 'changed': changed}
+
+
+def replay_history(history_dir: Path, thresholds: ScheduleThresholds,
+                   cadences: Optional[Dict[str, int]] = None) -> Dict[str, Any]:
+    """履歴の各スナップショットで判断を再現し、固定10分間隔との取得回数を比較する"""
+    cadences = cadences or CADENCES
+    levels = Counter()
+    requests = 0.0
+    snapshots = 0
+    for day_dir in iter_day_dirs(history_dir):
+        day_snapshots, _ = load_day_snapshots(day_dir)
+        for snapshot in day_snapshots:
+            level, _ = decide(extract_inputs(snapshot), thresholds)
+            levels[level] += 1
+            # 各スナップショットが次の10分間の間隔を決めるとみなす
+            requests += 600 / cadences[level]
+            snapshots += 1
+    return {
+        'snapshots': snapshots,
+        'levels': dict(levels),
+        'adaptive_cycles': round(requests, 1),
+        'fixed_cycles': snapshots
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="収集間隔の判断を再評価する")
+    parser.add_argument("--replay", type=Path, help="schedule.ndjson を再評価")
+    parser.add_argument("--history-dir", type=Path, help="履歴に対して判断を再現")
+    parser.add_argument("--rainfall-hourly", type=float, default=ScheduleThresholds.rainfall_hourly)
+    parser.add_argument("--forecast-intensity", type=float, default=ScheduleThresholds.forecast_intensity)
+    parser.add_argument("--level-change", type=float, default=ScheduleThresholds.level_change)
+    args = parser.parse_args()
+
+    thresholds = ScheduleThresholds(args.rainfall_hourly, args.forecast_intensity, args.level_change)
+    if args.replay:
+        print(json.dumps(replay_log(args.replay, thresholds), ensure_ascii=False, indent=2))
+    if args.history_dir:
+        print(json.dumps(replay_history(args.history_dir, thresholds), ensure_ascii=False, indent=2))
+    if not args.replay and not args.history_dir:
+        parser.error("--replay または --history-dir を指定してください")
+
+
+if __name__ == "__main__":
+    main()
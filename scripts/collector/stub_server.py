@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+収集元のスタブサーバー
+fixtures/ のレスポンスを上流と同じパスで返し、ネットワークなしで収集処理を実行・計測できるようにする。
+ETag / Last-Modified を付け、If-None-Match が一致すれば 304 を返す。
+観測表は、フィクスチャの観測時刻（FIXTURE_OBSERVATION_TIME）の行が要求された観測時刻（obsdt）になるように
+表の時刻をずらして返す（収集側は観測時刻と日付・時刻が一致する行だけを使うため）。
+
+fixtures/ のファイルは各上流の公開形式（観測表HTML、weather/V1/place、forecast/{office}.json）に
+合わせて作成したもの。実際のレスポンスは collect_data.py --record DIR で保存して差し替えられる。
+
+使い方:
+    python -m scripts.collector.stub_server [--port 8765] [--delay-ms 50]
+"""
+
+import argparse
+import hashlib
+import re
+import threading
+import time
+from datetime import datetime
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+FIXTURES_DIR = Path(__file__).resolve().parent / "fixtures"
+
+# パス → (フィクスチャファイル名, Content-Type)
+ROUTES = {
+    "/citizen/dam/kdm_table.aspx": ("dam_table.html", "text/html; charset=utf-8"),
+    "/citizen/water/kwl_table.aspx": ("river_table.html", "text/html; charset=utf-8"),
+    "/weather/V1/place": ("yahoo_place.json", "application/json; charset=utf-8"),
+    "/bosai/forecast/data/forecast/350000.json": ("jma_forecast_350000.json", "application/json; charset=utf-8")
+}
+
+# 観測表の時刻セル（'2025/08/10　06:30'。数字と '/'・':' は Shift_JIS でも同じバイトのため、バイト列のまま置き換える）
+# 観測表のフィクスチャの観測時刻（この時刻までの行に値が入っている）
+FIXTURE_OBSERVATION_TIME = datetime(2025, 8, 10, 6, 10)
+TABLE_TIME_PATTERN = re.compile(rb'(\d{4}/\d{1,2}/\d{1,2})([^\d<]{1,3}?)(\d{1,2}:\d{2})')
+
+
+def shift_table_times(body: bytes, obsdt: str) -> bytes:
+    """観測表の時刻を、FIXTURE_OBSERVATION_TIME の行が obsdt（'%Y%m%d%H%M'）になるようにずらす"""
+    try:
+        offset = datetime.strptime(obsdt, '%Y%m%d%H%M') - FIXTURE_OBSERVATION_TIME
+    except ValueError:
+        return body
+
+    def shift(match: re.Match) -> bytes:
+        shifted = datetime.strptime(f"{match.group(1).decode()} {match.group(3).decode()}", '%Y/%m/%d %H:%M') + offset
+        return shifted.strftime('%Y/%m/%d').encode() + match.group(2) + shifted.strftime('%H:%M').encode()
+
+    return TABLE_TIME_PATTERN.sub(shift, body)
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """フィクスチャを返すハンドラー（server.delay_ms だけ応答を遅らせる）"""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        route = ROUTES.get(urlparse(self.path).path)
+        if route is None:
+            self.send_error(404)
+            return
+        if self.server.delay_ms:
+            time.sleep(self.server.delay_ms / 1000)
+        body = self.server.load(route[0])
+        obsdt = parse_qs(urlparse(self.path).query).get('obsdt')
+        if obsdt and route[0].endswith(".html"):
+            body = self.server.shifted(route[0], body, obsdt[0])
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", route[1])
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", self.server.last_modified)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # 計測の邪魔になるためアクセスログは出さない
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], fixtures_dir: Path = FIXTURES_DIR, delay_ms: float = 0.0):
+        super().__init__(address, StubHandler)
+        self.fixtures_dir = fixtures_dir
+        self.delay_ms = delay_ms
+        self._cache: Dict[str, bytes] = {}
+        # フィクスチャ名 → (obsdt, 時刻をずらした観測表)（同じ観測時刻の間は同じ内容・ETag を返す）
+        self._shifted: Dict[str, Tuple[str, bytes]] = {}
+        self.last_modified = formatdate(usegmt=True)
+
+    def load(self, name: str) -> bytes:
+        if name not in self._cache:
+            self._cache[name] = (self.fixtures_dir / name).read_bytes()
+        return self._cache[name]
+
+    def shifted(self, name: str, body: bytes, obsdt: str) -> bytes:
+        cached = self._shifted.get(name)
+        if cached is None or cached[0] != obsdt:
+            cached = (obsdt, shift_table_times(body, obsdt))
+            self._shifted[name] = cached
+        return cached[1]
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+def start_stub_server(port: int = 0, delay_ms: float = 0.0, fixtures_dir: Optional[Path] = None) -> StubServer:
+    """バックグラウンドスレッドでスタブサーバーを起動（port=0 で空きポート）"""
+    server = StubServer(("127.0.0.1", port), fixtures_dir or FIXTURES_DIR, delay_ms)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="収集元のスタブサーバー")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--delay-ms", type=float, default=0.0, help="各レスポンスの遅延（ミリ秒）")
+    parser.add_argument("--fixtures-dir", type=Path, default=FIXTURES_DIR)
+    args = parser.parse_args()
+
+    server = StubServer(("127.0.0.1", args.port), args.fixtures_dir, args.delay_ms)
+    print(f"スタブサーバー起動: {server.base_url}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
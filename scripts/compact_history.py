@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+履歴データの日次コンパクション
+JSTで日付が確定した日の HHMM.json を day.ndjson + day.idx にまとめる
+
+使い方:
+    python scripts/compact_history.py [--dry-run]
+    python scripts/compact_history.py --codec zstd --train-dictionary
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from scripts.history_codec import CODEC_SUFFIXES, build_dictionary, save_dictionary
+from scripts.history_store import compact_history, iter_day_dirs, load_day_snapshots
+
+
+def collect_samples(history_dir: Path, max_samples: int = 1000) -> list:
+    """辞書学習用に新しい順でスナップショットを集める（古い順に並べて返す）"""
+    samples = []
+    for day_dir in reversed(iter_day_dirs(history_dir)):
+        day_snapshots, _ = load_day_snapshots(day_dir)
+        for data in reversed(day_snapshots):
+            samples.append(json.dumps(data, ensure_ascii=False, indent=2).encode('utf-8'))
+            if len(samples) >= max_samples:
+                return samples[::-1]
+    return samples[::-1]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="確定済みの日の履歴データを日次ファイルにまとめる")
+    parser.add_argument(
+        "--history-dir",
+        type=Path,
+        default=Path(__file__).resolve().parent.parent / "data" / "history",
+        help="履歴データディレクトリ（デフォルト: data/history）"
+    )
+    parser.add_argument("--dry-run", action="store_true", help="対象の日を表示するだけで変更しない")
+    parser.add_argument("--codec", choices=sorted(CODEC_SUFFIXES), help="日次ログの圧縮形式（省略時は新しくまとめる日は非圧縮、圧縮済みの日は今の形式のまま）")
+    parser.add_argument(
+        "--train-dictionary",
+        action="store_true",
+        help="既存のスナップショットから圧縮辞書を作成して登録する（zlib / zstd）"
+    )
+    args = parser.parse_args()
+
+    if args.train_dictionary and args.codec in ('zlib', 'zstd') and not args.dry_run:
+        dictionary = build_dictionary(collect_samples(args.history_dir), args.codec)
+        dict_id = save_dictionary(args.history_dir, dictionary, args.codec)
+        print(f"辞書を登録しました: {args.codec}-{dict_id} ({len(dictionary)} bytes)")
+
+    stats = compact_history(args.history_dir, dry_run=args.dry_run, codec=args.codec)
+    print(json.dumps(stats, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+"""
+合成履歴データの生成（負荷試験・ベンチマーク用）
+latest.json と同じ形式のスナップショットを10分間隔で生成し、データディレクトリ（history/ と latest.json）に書き込む。
+
+- 雨: 季節で頻度の変わる降雨イベント（梅雨・台風期に多い）をハイエトグラフとして重ね合わせる
+- ダム: 雨量を単位図で流入量に変換し、貯水率に応じた放流ルールで貯水位を積分する。流入量は実データと同じく時々欠測（null）
+- 河川: 平常水位 + 潮位の日周変動 + 放流量・流出による上昇。警戒レベルは収集時と同じ判定
+- 天気予報: 05/11/17時の発表ごとに、生成した雨量から3日分と週間予報を作る
+- 降水強度: 観測時刻から1分刻みの予報（--intensity-minutes 分）
+
+同じ --seed・期間・地点数なら同じ内容になる（観測点ごと・日ごとに乱数を分けているため、期間を延ばしても既存の日は変わらない）。
+地点数が2以上の場合は <output>/station-01/ のように観測点ごとのデータディレクトリを作る。
+
+使い方:
+    python scripts/generate_history.py /tmp/synthetic --days 30 [--years 10] [--stations 3] [--seed 42]
+    KOTOGAWA_DATA_DIR=/tmp/synthetic streamlit run streamlit_app.py
+"""
+
+import argparse
+import json
+import sys
+import time
+from dataclasses import asdict, dataclass
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, Iterator, List
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from scripts.collector.parsers import river_status
+from scripts.history_store import HISTORY_WRITE_MODES, JST, _write_atomic, write_snapshots
+
+STEPS_PER_HOUR = 6
+STEPS_PER_DAY = 24 * STEPS_PER_HOUR
+STEP = timedelta(minutes=10)
+
+# 月ごとの1日あたりの降雨イベント数（1月〜12月）
+STORM_RATES = [0.05, 0.06, 0.08, 0.10, 0.10, 0.22, 0.22, 0.12, 0.16, 0.08, 0.06, 0.05]
+
+# 日雨量（mm）→ 天気コード・天気（上限未満で該当）
+WEATHER_BY_RAIN = [
+    (0.5, '100', '晴れ'),
+    (2.0, '200', 'くもり'),
+    (10.0, '202', 'くもり一時雨'),
+    (30.0, '302', '雨時々くもり'),
+    (float('inf'), '300', '雨')
+]
+# 天気予報の発表時刻
+FORECAST_HOURS = (5, 11, 17)
+DAY_NAMES = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+# 収集が公開されるまでの遅れ（観測時刻からの秒数の範囲）
+PUBLISH_DELAY_SECONDS = (720, 840)
+DEFAULT_INTENSITY_MINUTES = 60
+
+
+@dataclass(frozen=True)
+class StationProfile:
+    """観測点ごとの特性"""
+    name: str
+    river_base: float       # 平常時の河川水位 (m)
+    tide_amplitude: float   # 潮位による水位変動の振幅 (m)
+    river_gain: float       # 流量 1m³/s あたりの水位上昇 (m)
+    catchment: float        # 10分雨量 1mm あたりの流入量の増加 (m³/s)
+    base_inflow: float      # 平常時の流入量 (m³/s)
+    capacity: float         # 有効貯水容量 (m³)
+    initial_rate: float     # 初期の貯水率 (%)
+
+
+def station_profiles(count: int, seed: int) -> List[StationProfile]:
+    """観測点の特性（1地点目は厚東川の実データに近い値）"""
+    profiles = [StationProfile('station-01', 2.8, 0.12, 0.012, 9.0, 3.0, 2.1e7, 82.0)]
+    rng = np.random.default_rng([seed, 0xFFFF])
+    for number in range(2, count + 1):
+        profiles.append(StationProfile(
+            name=f'station-{number:02d}',
+            river_base=round(float(rng.uniform(1.5, 3.5)), 2),
+            tide_amplitude=round(float(rng.uniform(0.0, 0.2)), 3),
+            river_gain=round(float(rng.uniform(0.006, 0.02)), 4),
+            catchment=round(float(rng.uniform(4.0, 15.0)), 2),
+            base_inflow=round(float(rng.uniform(1.0, 6.0)), 2),
+            capacity=float(rng.uniform(1.0e7, 4.0e7)),
+            initial_rate=round(float(rng.uniform(60.0, 90.0)), 1)
+        ))
+    return profiles[:count]
+
+
+def generate_rain(start: date, days: int, seed: int, station: int) -> np.ndarray:
+    """10分雨量（mm）。降雨イベントは開始日の乱数で決めるため、日ごとに再現できる"""
+    rain = np.zeros(days * STEPS_PER_DAY + STEPS_PER_DAY * 2)
+    for offset in range(days):
+        day = start + timedelta(days=offset)
+        rng = np.random.default_rng([seed, station, day.toordinal()])
+        for _ in range(rng.poisson(STORM_RATES[day.month - 1])):
+            begin = offset * STEPS_PER_DAY + int(rng.integers(0, STEPS_PER_DAY))
+            duration = int(rng.integers(3 * STEPS_PER_HOUR, 48 * STEPS_PER_HOUR))
+            peak = float(rng.lognormal(np.log(12.0), 0.7))  # ピーク時の時間雨量 (mm/h)
+            t = np.linspace(0.01, 0.99, duration)
+            a, b = rng.uniform(1.5, 3.0), rng.uniform(2.0, 4.5)
+            shape = t ** (a - 1) * (1 - t) ** (b - 1)
+            noise = np.clip(1 + 0.35 * rng.standard_normal(duration), 0, None)
+            amounts = peak / STEPS_PER_HOUR * shape / shape.max() * noise
+            end = min(begin + duration, len(rain))
+            rain[begin:end] += amounts[:end - begin]
+        # 弱い雨（降雨イベントのない日のにわか雨など）
+        if rng.random() < 0.08:
+            begin = offset * STEPS_PER_DAY + int(rng.integers(0, STEPS_PER_DAY - 12))
+            rain[begin:begin + 12] += rng.uniform(0.0, 0.4, 12)
+    # 雨量計の分解能（0.5mm）
+    return np.round(rain * 2) / 2
+
+
+def rolling_sum(values: np.ndarray, window: int) -> np.ndarray:
+    csum = np.concatenate(([0.0], np.cumsum(values)))
+    return csum[window:] - csum[:-window] if len(values) >= window else csum[1:]
+
+
+def hourly_rainfall(rain: np.ndarray) -> np.ndarray:
+    padded = np.concatenate((np.zeros(STEPS_PER_HOUR - 1), rain))
+    return rolling_sum(padded, STEPS_PER_HOUR)
+
+
+def cumulative_rainfall(rain: np.ndarray) -> np.ndarray:
+    """連続雨量（24時間雨が降らなければリセット）"""
+    csum = np.cumsum(rain)
+    padded = np.concatenate((np.zeros(STEPS_PER_DAY - 1), rain))
+    dry = rolling_sum(padded, STEPS_PER_DAY) == 0
+    return csum - np.maximum.accumulate(np.where(dry, csum, 0.0))
+
+
+def unit_hydrograph(length: int = STEPS_PER_DAY, shape: float = 3.0, scale: float = 4.0) -> np.ndarray:
+    """ガンマ分布形の単位図（10分刻み、合計1）"""
+    t = np.arange(length, dtype=float) + 0.5
+    kernel = t ** (shape - 1) * np.exp(-t / scale)
+    return kernel / kernel.sum()
+
+
+def simulate(profile: StationProfile, start_dt: datetime, rain: np.ndarray) -> Dict[str, np.ndarray]:
+    """雨量からダム・河川の時系列を作る"""
+    steps = len(rain)
+    day_of_year = np.array([(start_dt + STEP * i).timetuple().tm_yday for i in range(0, steps, STEPS_PER_DAY)])
+    seasonal = np.repeat(1 + 0.4 * np.sin(2 * np.pi * (day_of_year - 100) / 365.0), STEPS_PER_DAY)[:steps]
+    runoff = np.convolve(rain, unit_hydrograph())[:steps] * profile.catchment * STEPS_PER_HOUR
+    inflow = profile.base_inflow * seasonal + runoff
+
+    # 貯水率に応じた放流（利水の取水は常に続け、満水に近づくと流入量以上を放流）
+    supply = profile.base_inflow * 0.9
+    storage = profile.capacity * profile.initial_rate / 100
+    outflow = np.empty(steps)
+    rate = np.empty(steps)
+    for i in range(steps):
+        current = storage / profile.capacity * 100
+        if current >= 85.0:
+            release = inflow[i] + (current - 85.0) * 8.0
+        elif current >= 75.0:
+            release = 0.6 * inflow[i] + supply
+        else:
+            release = 0.3 * inflow[i] + supply
+        storage = min(max(storage + (inflow[i] - release) * 600, 0.0), profile.capacity)
+        outflow[i] = release
+        rate[i] = storage / profile.capacity * 100
+
+    hours = np.arange(steps) / STEPS_PER_HOUR
+    tide = profile.tide_amplitude * np.sin(2 * np.pi * hours / 12.42)
+    local = np.convolve(rain, unit_hydrograph(shape=2.0, scale=3.0))[:steps] * profile.catchment * STEPS_PER_HOUR
+    river = profile.river_base + tide + profile.river_gain * (outflow + 0.5 * local) ** 0.85
+
+    river = np.round(river, 2)
+    return {
+        'rain': rain,
+        'hourly': np.round(hourly_rainfall(rain)),
+        'cumulative': np.round(cumulative_rainfall(rain)),
+        'inflow': np.round(inflow, 2),
+        'outflow': np.round(outflow, 2),
+        'rate': np.round(rate, 1),
+        'dam_level': np.round(28.0 + 10.1 * rate / 100, 2),
+        'river': river,
+        'river_change': np.round(np.diff(river, prepend=river[0]), 2)
+    }
+
+
+def weather_code(daily_rain: float) -> Dict[str, str]:
+    for limit, code, text in WEATHER_BY_RAIN:
+        if daily_rain < limit:
+            return {'weather_code': code, 'weather_text': text}
+    return {'weather_code': '300', 'weather_text': '雨'}
+
+
+def build_weather(issued: datetime, series: Dict[str, np.ndarray], start_dt: datetime, rng: np.random.Generator) -> Dict[str, Any]:
+    """発表時刻 issued の天気予報（生成した雨量を「予報」として使う）"""
+    rain = series['rain']
+
+    def day_rain(day: date, hour_from: int = 0, hour_to: int = 24) -> float:
+        begin = int((datetime.combine(day, datetime.min.time(), tzinfo=JST) - start_dt) / STEP) + hour_from * STEPS_PER_HOUR
+        end = begin + (hour_to - hour_from) * STEPS_PER_HOUR
+        return float(rain[max(begin, 0):max(end, 0)].sum())
+
+    def probability(amount: float) -> int:
+        return int(min(100, round((10 + 12 * amount) / 10) * 10)) if amount > 0 else int(rng.choice([0, 10, 20]))
+
+    def temperatures(day: date) -> Dict[str, int]:
+        mean = 16.0 - 9.0 * np.cos(2 * np.pi * (day.timetuple().tm_yday - 20) / 365.0)
+        cooling = min(day_rain(day) / 20.0, 3.0)
+        return {'temp_max': int(round(mean + 4.5 - cooling + rng.normal(0, 1))),
+                'temp_min': int(round(mean - 4.0 + rng.normal(0, 1)))}
+
+    weather: Dict[str, Any] = {}
+    for offset, name in enumerate(['today', 'tomorrow', 'day_after_tomorrow']):
+        day = issued.date() + timedelta(days=offset)
+        entry = {**weather_code(day_rain(day)), **temperatures(day)}
+        if offset == 2:
+            entry['precipitation_probability'] = [probability(day_rain(day, 6, 18))]
+            entry['precipitation_times'] = ['日中']
+        else:
+            first_block = (issued.hour + 1) // 6 if offset == 0 else 0
+            blocks = range(first_block, 4)
+            entry['precipitation_probability'] = [probability(day_rain(day, 6 * b, 6 * b + 6)) for b in blocks]
+            entry['precipitation_times'] = [f"{6 * b:02d}時" for b in blocks]
+        weather[name] = entry
+    weather['update_time'] = issued.isoformat()
+
+    weekly = []
+    for offset in range(7):
+        day = issued.date() + timedelta(days=offset)
+        entry = {'date': day.isoformat(), 'day_of_week': DAY_NAMES[day.weekday()], **weather_code(day_rain(day))}
+        if offset == 0:
+            entry.update({'precipitation_probability': None, 'temp_max': None, 'temp_min': None})
+        else:
+            entry.update({'precipitation_probability': probability(day_rain(day)), **temperatures(day)})
+        weekly.append(entry)
+    weather['weekly_forecast'] = weekly
+    return weather
+
+
+def iter_day_snapshots(profile: StationProfile, station: int, start: date, days: int, seed: int,
+                       intensity_minutes: int = DEFAULT_INTENSITY_MINUTES) -> Iterator[List[Dict[str, Any]]]:
+    """観測点の1日分ずつのスナップショットを返すジェネレーター"""
+    start_dt = datetime.combine(start, datetime.min.time(), tzinfo=JST)
+    # 週間予報の先読み分も雨量を作る
+    series = simulate(profile, start_dt, generate_rain(start, days + 7, seed, station))
+    rain = series['rain']
+
+    for offset in range(days):
+        day = start + timedelta(days=offset)
+        rng = np.random.default_rng([seed, station, day.toordinal(), 1])
+        base = offset * STEPS_PER_DAY
+
+        # 流入量の欠測（実データと同じく数ステップ続くことがある）
+        missing = np.zeros(STEPS_PER_DAY, dtype=bool)
+        for begin in np.flatnonzero(rng.random(STEPS_PER_DAY) < 0.004):
+            missing[begin:begin + int(rng.integers(1, 7))] = True
+        delays = rng.integers(*PUBLISH_DELAY_SECONDS, STEPS_PER_DAY) + rng.random(STEPS_PER_DAY)
+        noise = np.clip(1 + 0.25 * rng.standard_normal((STEPS_PER_DAY, intensity_minutes + 1)), 0, None)
+
+        forecasts = {hour: build_weather(datetime.combine(day, datetime.min.time(), tzinfo=JST) + timedelta(hours=hour),
+                                         series, start_dt, rng)
+                     for hour in FORECAST_HOURS}
+        # 05時の発表前は前日17時の発表
+        forecasts[-7] = build_weather(datetime.combine(day, datetime.min.time(), tzinfo=JST) - timedelta(hours=7),
+                                      series, start_dt, rng)
+
+        snapshots = []
+        for step in range(STEPS_PER_DAY):
+            i = base + step
+            data_dt = start_dt + STEP * i
+            published = data_dt + timedelta(seconds=float(delays[step]))
+            issued = max(hour for hour in (-7,) + FORECAST_HOURS if hour <= data_dt.hour)
+            minutes = np.arange(intensity_minutes + 1)
+            intensity = np.round(rain[i + minutes // 10] * STEPS_PER_HOUR * noise[step], 2)
+            level = float(series['river'][i])
+            snapshots.append({
+                'timestamp': published.isoformat(),
+                'data_time': data_dt.isoformat(),
+                'dam': {
+                    'water_level': float(series['dam_level'][i]),
+                    'storage_rate': float(series['rate'][i]),
+                    'inflow': None if missing[step] else float(series['inflow'][i]),
+                    'outflow': float(series['outflow'][i]),
+                    'storage_change': None
+                },
+                'river': {
+                    'water_level': level,
+                    'level_change': float(series['river_change'][i]),
+                    'status': river_status(level)
+                },
+                'rainfall': {
+                    'hourly': int(series['hourly'][i]),
+                    'cumulative': int(series['cumulative'][i]),
+                    'change': int(series['hourly'][i] - (series['hourly'][i - 1] if i else 0))
+                },
+                'weather': forecasts[issued],
+                'precipitation_intensity': {
+                    'observation': [{'datetime': data_dt.isoformat(), 'intensity': float(intensity[0])}],
+                    'forecast': [
+                        {'datetime': (data_dt + timedelta(minutes=int(m))).isoformat(), 'intensity': float(intensity[m])}
+                        for m in minutes[1:]
+                    ],
+                    'update_time': published.isoformat()
+                }
+            })
+        yield snapshots
+
+
+def generate(output: Path, start: date, days: int, stations: int = 1, seed: int = 0, mode: str = "ndjson",
+             intensity_minutes: int = DEFAULT_INTENSITY_MINUTES) -> Dict[str, Any]:
+    """合成履歴を書き込み、件数と所要時間を返す（地点ごとに history/ と latest.json を持つデータディレクトリ）"""
+    started = time.perf_counter()
+    results = {}
+    for station, profile in enumerate(station_profiles(stations, seed), start=1):
+        data_dir = output if stations == 1 else output / profile.name
+        written = 0
+        last = None
+        for snapshots in iter_day_snapshots(profile, station, start, days, seed, intensity_minutes):
+            written += write_snapshots(data_dir / "history", snapshots, mode)['written']
+            last = snapshots[-1]
+        if last is not None:
+            _write_atomic(data_dir / "latest.json", json.dumps(last, ensure_ascii=False, indent=2).encode('utf-8'))
+        results[profile.name] = {'data_dir': str(data_dir), 'written': written, 'profile': asdict(profile)}
+
+    manifest = {
+        'seed': seed, 'start': start.isoformat(), 'days': days, 'stations': results,
+        'mode': mode, 'intensity_minutes': intensity_minutes,
+        'elapsed_sec': round(time.perf_counter() - started, 2)
+    }
+    _write_atomic(output / "synthetic.json", json.dumps(manifest, ensure_ascii=False, indent=2).encode('utf-8'))
+    return manifest
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="合成履歴データを生成する")
+    parser.add_argument("output", type=Path, help="出力先のデータディレクトリ（本番の data/ 以外）")
+    parser.add_argument("--start", default="2024-01-01", help="開始日（YYYY-MM-DD）")
+    parser.add_argument("--days", type=int, default=7)
+    parser.add_argument("--years", type=float, help="期間を年で指定（--days より優先）")
+    parser.add_argument("--stations", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--mode", choices=HISTORY_WRITE_MODES, default="ndjson")
+    parser.add_argument("--intensity-minutes", type=int, default=DEFAULT_INTENSITY_MINUTES,
+                        help="降水強度の予報の長さ（分、1分刻み）")
+    args = parser.parse_args()
+
+    production_dir = (Path(__file__).resolve().parent.parent / "data").resolve()
+    if args.output.resolve() == production_dir:
+        parser.error("本番の data/ には書き込めません。別のディレクトリを指定してください")
+
+    days = int(round(args.years * 365)) if args.years else args.days
+    manifest = generate(args.output, date.fromisoformat(args.start), days, args.stations, args.seed,
+                        args.mode, args.intensity_minutes)
+    print(json.dumps({name: info['written'] for name, info in manifest['stations'].items()}, ensure_ascii=False))
+    print(f"{manifest['elapsed_sec']}秒")
+
+
+if __name__ == "__main__":
+    main()
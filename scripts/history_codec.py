@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+履歴データの圧縮コーデック
+スナップショットは同じキー・同じ天気文が繰り返されるため、辞書付き圧縮がよく効く。
+
+- gzip: 標準ライブラリのみ。日次ログ（day.ndjson）全体の圧縮向け
+- zlib: 標準ライブラリのみ。共有プリセット辞書で小さな HHMM.json も圧縮できる
+- zstd: zstandard パッケージ（任意）。学習済み辞書を使用
+
+辞書は data/history/dicts/ に辞書IDをファイル名として保存する。
+圧縮データのヘッダーに辞書IDが含まれるため、辞書を作り直しても古いファイルを展開できる。
+"""
+
+import gzip
+import io
+import zlib
+from pathlib import Path
+from typing import BinaryIO, Dict, List, Optional
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# コーデック名 → ファイル拡張子
+CODEC_SUFFIXES = {
+    'gzip': '.gz',
+    'zlib': '.zz',
+    'zstd': '.zst'
+}
+SUFFIX_CODECS = {suffix: codec for codec, suffix in CODEC_SUFFIXES.items()}
+
+# 辞書の保存先（履歴ディレクトリ直下）
+DICT_DIR_NAME = "dicts"
+
+# zlibのプリセット辞書はウィンドウサイズ（32KB）以内のみ有効
+ZLIB_MAX_DICT_SIZE = 32 * 1024
+
+# プロセス内に保持する辞書の数
+DICT_CACHE_SIZE = 16
+
+
+def available_codecs() -> List[str]:
+    """利用可能なコーデックを返す（zstd は zstandard インストール時のみ）"""
+    codecs = ['gzip', 'zlib']
+    if zstandard is not None:
+        codecs.append('zstd')
+    return codecs
+
+
+def _require_codec(codec: str) -> None:
+    if codec not in CODEC_SUFFIXES:
+        raise ValueError(f"不明な圧縮形式です: {codec}")
+    if codec == 'zstd' and zstandard is None:
+        raise RuntimeError("zstd 圧縮には zstandard パッケージが必要です (pip install zstandard)")
+
+
+def codec_of(path: Path) -> Optional[str]:
+    """ファイル拡張子から圧縮形式を判定（非圧縮は None）"""
+    return SUFFIX_CODECS.get(path.suffix)
+
+
+def build_dictionary(samples: List[bytes], codec: str, size: int = 16 * 1024) -> bytes:
+    """サンプルのスナップショットから圧縮辞書を作成"""
+    _require_codec(codec)
+    if codec == 'zstd':
+        return zstandard.train_dictionary(size, samples).as_bytes()
+    if codec == 'zlib':
+        # 新しいサンプルほど一致しやすいため辞書の末尾（参照距離が短い位置）に置く
+        size = min(size, ZLIB_MAX_DICT_SIZE)
+        return b''.join(samples)[-size:]
+    raise ValueError(f"{codec} は辞書に対応していません")
+
+
+def dictionary_id(dictionary: bytes, codec: str) -> str:
+    """辞書IDを求める（圧縮データのヘッダーに記録される値と同じ）"""
+    _require_codec(codec)
+    if codec == 'zstd':
+        return str(zstandard.ZstdCompressionDict(dictionary).dict_id())
+    return f"{zlib.adler32(dictionary):08x}"
+
+
+def save_dictionary(history_dir: Path, dictionary: bytes, codec: str) -> str:
+    """辞書を保存し、以後の圧縮で使う辞書として登録する
+
+    Returns: 辞書ID
+    """
+    dict_dir = history_dir / DICT_DIR_NAME
+    dict_dir.mkdir(parents=True, exist_ok=True)
+    dict_id = dictionary_id(dictionary, codec)
+    (dict_dir / f"{codec}-{dict_id}.dict").write_bytes(dictionary)
+    (dict_dir / f"{codec}.active").write_text(dict_id, encoding='utf-8')
+    return dict_id
+
+
+# 辞書のパス → 内容（辞書IDは内容から決まるため、読めた辞書は変わらない）
+_dictionaries: Dict[str, bytes] = {}
+
+
+def _read_dictionary(dict_path: str) -> Optional[bytes]:
+    """辞書を読み込む（読めたものだけキャッシュし、起動後に作られた辞書も次の呼び出しで読む）"""
+    dictionary = _dictionaries.get(dict_path)
+    if dictionary is not None:
+        return dictionary
+    path = Path(dict_path)
+    if not path.exists():
+        return None
+    dictionary = path.read_bytes()
+    if len(_dictionaries) >= DICT_CACHE_SIZE:
+        _dictionaries.pop(next(iter(_dictionaries)))
+    _dictionaries[dict_path] = dictionary
+    return dictionary
+
+
+def clear_dictionary_cache() -> None:
+    """プロセス内の辞書のキャッシュを空にする（計測用）"""
+    _dictionaries.clear()
+
+
+def load_dictionary(history_dir: Path, codec: str, dict_id: str) -> Optional[bytes]:
+    """辞書IDから辞書を読み込む（プロセス内でキャッシュ）"""
+    return _read_dictionary(str(history_dir / DICT_DIR_NAME / f"{codec}-{dict_id}.dict"))
+
+
+def load_active_dictionary(history_dir: Path, codec: str) -> Optional[bytes]:
+    """現在登録されている辞書を読み込む（未登録なら None）"""
+    active_file = history_dir / DICT_DIR_NAME / f"{codec}.active"
+    if not active_file.exists():
+        return None
+    return load_dictionary(history_dir, codec, active_file.read_text(encoding='utf-8').strip())
+
+
+def compress(payload: bytes, codec: str, dictionary: Optional[bytes] = None, level: int = 9) -> bytes:
+    """指定形式で圧縮"""
+    _require_codec(codec)
+    if codec == 'gzip':
+        return gzip.compress(payload, compresslevel=level, mtime=0)
+    if codec == 'zlib':
+        if dictionary:
+            compressor = zlib.compressobj(level, zdict=dictionary)
+        else:
+            compressor = zlib.compressobj(level)
+        return compressor.compress(payload) + compressor.flush()
+    dict_data = zstandard.ZstdCompressionDict(dictionary) if dictionary else None
+    return zstandard.ZstdCompressor(level=min(level, 19), dict_data=dict_data).compress(payload)
+
+
+def _zlib_dict_id(payload: bytes) -> Optional[str]:
+    """zlibヘッダーの FDICT ビットから辞書IDを取り出す"""
+    if len(payload) < 6 or not payload[1] & 0x20:
+        return None
+    return payload[2:6].hex()
+
+
+def decompress(payload: bytes, codec: str, history_dir: Path) -> bytes:
+    """圧縮データを展開（辞書はヘッダーの辞書IDから解決）"""
+    _require_codec(codec)
+    if codec == 'gzip':
+        return gzip.decompress(payload)
+    if codec == 'zlib':
+        dict_id = _zlib_dict_id(payload)
+        if dict_id is None:
+            return zlib.decompress(payload)
+        dictionary = load_dictionary(history_dir, codec, dict_id)
+        if dictionary is None:
+            raise ValueError(f"zlib 辞書が見つかりません: {dict_id}")
+        decompressor = zlib.decompressobj(zdict=dictionary)
+        return decompressor.decompress(payload) + decompressor.flush()
+    dict_id = zstandard.get_frame_parameters(payload).dict_id
+    dict_data = None
+    if dict_id:
+        dictionary = load_dictionary(history_dir, codec, str(dict_id))
+        if dictionary is None:
+            raise ValueError(f"zstd 辞書が見つかりません: {dict_id}")
+        dict_data = zstandard.ZstdCompressionDict(dictionary)
+    return zstandard.ZstdDecompressor(dict_data=dict_data).decompress(payload)
+
+
+def open_binary(path: Path, history_dir: Path) -> BinaryIO:
+    """圧縮の有無にかかわらず読み込み用のバイナリストリームを開く
+
+    gzip はストリーム展開（前方 seek 可）、それ以外は展開済みのメモリバッファを返す。
+    """
+    codec = codec_of(path)
+    if codec is None:
+        return open(path, 'rb')
+    if codec == 'gzip':
+        return gzip.open(path, 'rb')
+    return io.BytesIO(decompress(path.read_bytes(), codec, history_dir))
+
+
+def read_bytes(path: Path, history_dir: Path) -> bytes:
+    """ファイルを展開して読み込む"""
+    codec = codec_of(path)
+    payload = path.read_bytes()
+    if codec is None:
+        return payload
+    return decompress(payload, codec, history_dir)
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+履歴の時刻インデックス
+履歴全体のスナップショットの観測時刻と格納位置（日次ログのオフセット、または HHMM.json のパス）を
+時刻順の配列に持ち、「時刻 T 以前で最新のスナップショット」を二分探索（O(log n)）で求める。
+
+構築時は日ごとに day.idx とバラのファイルだけを読み、日次ログ本体は読まない（インデックスのない日次ログは除く）。
+refresh() は各日のディレクトリ・インデックス・日次ログの stat だけで変更を確かめ、変わった日（収集中の追記、
+コンパクション・クリーンアップで書き換えられた過去の日）だけを索引し直し、なくなった日は除く。
+"""
+
+import bisect
+import json
+import os
+import threading
+from datetime import date, datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from scripts.history_codec import open_binary
+from scripts.history_store import (
+    DAY_INDEX_NAME, DAY_LOG_NAME, day_dir_for, day_log_path, day_of_dir, history_dir_of, iter_day_dirs,
+    loose_snapshot_files, parse_jst, read_day_index, read_snapshot_file, snapshot_key
+)
+
+# 格納位置: (日次ログまたは HHMM.json のパス, 日次ログ内のオフセット。HHMM.json は None)
+Location = Tuple[Path, Optional[int]]
+
+
+def _day_signature(day_dir: Path) -> Tuple[int, int, int]:
+    """日付ディレクトリの変更検出用（ファイルの追加・置き換え、ログとインデックスへの追記）
+
+    ディレクトリの更新時刻とインデックス・日次ログの大きさ（なければ -1）。refresh() が全日に対して呼ぶため、
+    ディレクトリの stat と1回の scandir だけで求める。
+    """
+    index_size = log_size = -1
+    with os.scandir(day_dir) as entries:
+        for entry in entries:
+            if entry.name == DAY_INDEX_NAME:
+                index_size = entry.stat().st_size
+            elif entry.name.startswith(DAY_LOG_NAME) and not entry.name.endswith(".tmp"):
+                log_size = entry.stat().st_size
+    return (day_dir.stat().st_mtime_ns, index_size, log_size)
+
+
+def _scan_day_log(log_file: Path) -> List[Tuple[str, int]]:
+    """インデックスのない日次ログを前方に走査して (data_time, オフセット) を作る"""
+    entries = []
+    offset = 0
+    with open_binary(log_file, history_dir_of(log_file.parent)) as f:
+        for line in f:
+            if line.strip():
+                try:
+                    entries.append((snapshot_key(json.loads(line)), offset))
+                except json.JSONDecodeError:
+                    pass
+            offset += len(line)
+    return entries
+
+
+def index_day(day_dir: Path) -> List[Tuple[datetime, Location]]:
+    """1日分の (観測時刻, 格納位置) を時刻順に返す（日次ログとバラのファイルで重複する時刻はログを優先）"""
+    entries: Dict[str, Location] = {}
+    log_file = day_log_path(day_dir)
+    if log_file is not None:
+        day_index = read_day_index(day_dir) or _scan_day_log(log_file)
+        for key, offset in day_index:
+            entries.setdefault(key, (log_file, offset))
+
+    for file_path in loose_snapshot_files(day_dir):
+        try:
+            data = read_snapshot_file(file_path)
+        except (ValueError, OSError):
+            continue
+        if isinstance(data, dict):
+            entries.setdefault(snapshot_key(data), (file_path, None))
+
+    located = []
+    for key, location in entries.items():
+        data_dt = parse_jst(key)
+        if data_dt is not None:
+            located.append((data_dt, location))
+    located.sort(key=lambda item: item[0])
+    return located
+
+
+class HistoryIndex:
+    """履歴全体の時刻 → 格納位置（スレッドセーフ。Streamlit のセッション間で共有する）"""
+
+    def __init__(self, history_dir: Path):
+        self.history_dir = Path(history_dir)
+        self._lock = threading.Lock()
+        self._days: Dict[date, List[Tuple[datetime, Location]]] = {}
+        self._signatures: Dict[date, Tuple[int, int, int]] = {}
+        # (UNIX時刻, 観測時刻, 格納位置) の並列リスト。読み込み側が途中の状態を見ないよう一括で置き換える
+        self._entries: Tuple[List[float], List[datetime], List[Location]] = ([], [], [])
+        self.build()
+
+    def __len__(self) -> int:
+        return len(self._entries[0])
+
+    def build(self) -> None:
+        """履歴全体を索引し直す"""
+        with self._lock:
+            self._days.clear()
+            self._signatures.clear()
+            for day_dir in iter_day_dirs(self.history_dir):
+                self._index_day(day_dir)
+            self._rebuild()
+
+    def refresh(self) -> bool:
+        """変更された日を索引し直し、なくなった日を除く（変更の有無は日ごとの signature で判定）
+
+        Returns: 索引が変わったかどうか
+        """
+        with self._lock:
+            day_dirs = iter_day_dirs(self.history_dir)
+            changed = False
+            for day_dir in day_dirs:
+                changed = self._index_day(day_dir) or changed
+            existing = {day_of_dir(day_dir) for day_dir in day_dirs}
+            for day in [day for day in self._days if day not in existing]:
+                self._forget(day)
+                changed = True
+            if changed:
+                self._rebuild()
+            return changed
+
+    def _index_day(self, day_dir: Path) -> bool:
+        day = day_of_dir(day_dir)
+        if day is None or not day_dir.exists():
+            return False
+        signature = _day_signature(day_dir)
+        if self._signatures.get(day) == signature:
+            return False
+        self._signatures[day] = signature
+        self._days[day] = index_day(day_dir)
+        return True
+
+    def _forget(self, day: date) -> None:
+        self._days.pop(day, None)
+        self._signatures.pop(day, None)
+
+    def _reindex(self, day: date) -> None:
+        """格納位置が読めなくなった日を索引し直す（なくなっていれば除く）"""
+        with self._lock:
+            self._forget(day)
+            self._index_day(day_dir_for(self.history_dir, day))
+            self._rebuild()
+
+    def _rebuild(self) -> None:
+        keys, locations = [], []
+        for day in sorted(self._days):
+            for data_dt, location in self._days[day]:
+                keys.append(data_dt)
+                locations.append(location)
+        self._entries = ([data_dt.timestamp() for data_dt in keys], keys, locations)
+
+    @property
+    def first(self) -> Optional[datetime]:
+        keys = self._entries[1]
+        return keys[0] if keys else None
+
+    @property
+    def last(self) -> Optional[datetime]:
+        keys = self._entries[1]
+        return keys[-1] if keys else None
+
+    def key_as_of(self, as_of: datetime) -> Optional[datetime]:
+        """as_of 以前で最新のスナップショットの観測時刻（なければ None）"""
+        times, keys, _ = self._entries
+        position = bisect.bisect_right(times, as_of.timestamp()) - 1
+        return keys[position] if position >= 0 else None
+
+    def snapshot_as_of(self, as_of: datetime) -> Optional[Dict[str, Any]]:
+        """as_of 以前で最新のスナップショット（なければ None）
+
+        格納位置が読めない（refresh の前にコンパクション・削除された）場合は、その日を索引し直して1回だけ読み直す。
+        """
+        for attempt in range(2):
+            times, keys, locations = self._entries
+            position = bisect.bisect_right(times, as_of.timestamp()) - 1
+            if position < 0:
+                return None
+            try:
+                return read_location(locations[position])
+            except (OSError, ValueError):
+                if attempt:
+                    return None
+                self._reindex(keys[position].date())
+        return None
+
+
+def read_location(location: Location) -> Dict[str, Any]:
+    """格納位置のスナップショットを読み込む（日次ログは該当行だけ seek して読む）"""
+    path, offset = location
+    if offset is None:
+        return read_snapshot_file(path)
+    with open_binary(path, history_dir_of(path.parent)) as f:
+        f.seek(offset)
+        return json.loads(f.readline())
+
@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+"""
+履歴のコンパクトな表現（メモリ上で列として保持する）
+load_history_data の結果は st.cache_data に保持され、再実行のたびにセッションごとに復元される。
+スナップショットごとの入れ子の dict（天気・降水強度を含む）はオブジェクトの数が多く、
+値そのものより dict・str・float の1つずつのオーバーヘッドがメモリの大半を占める。
+
+CompactHistory はスナップショットのリストを次のように保持する。
+
+- スカラーの項目（data_time、dam.water_level など）: 項目ごとに NumPy の配列
+  （数値は int64 / float64、文字列は UTF-8 のバイト列、欠損・None は状態の配列で区別）
+- 入れ子の項目（weather、precipitation_intensity など）: JSON を zlib で圧縮し、同じ内容は1つにまとめて
+  行からは番号で参照する（天気は1時間ごとの更新のため、10分間隔の履歴では同じ内容が続く）
+
+互換のため、各行は dict と同じように読める SnapshotView（読み取り専用の Mapping）として取り出せる
+（item.get('river', {}).get('water_level') などの既存のグラフ関数はそのまま動く）。
+入れ子の項目は読むたびに復元した新しいオブジェクトを返す。列で読む場合は column() を使う。
+"""
+
+import json
+import zlib
+from collections.abc import Mapping, Sequence
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+# 状態の配列の値（欠損・None を持つ列だけ持つ）
+ABSENT, NULL, PRESENT = 0, 1, 2
+# この長さ以上の入れ子の JSON は zlib で圧縮する
+COMPRESS_MIN_BYTES = 128
+
+# 列の種類
+BOOL, INT, FLOAT, NUMBER, TEXT, BLOB = "bool", "int", "float", "number", "text", "blob"
+
+Path_ = Tuple[str, ...]
+
+
+def _scalar_kind(values: List[Any]) -> str:
+    """None 以外の値から列の種類を決める（混在する・入れ子なら BLOB）"""
+    kinds = set()
+    for value in values:
+        if value is None:
+            continue
+        if isinstance(value, bool):
+            kinds.add(BOOL)
+        elif isinstance(value, int):
+            kinds.add(INT if -2 ** 63 <= value < 2 ** 63 else BLOB)
+        elif isinstance(value, float):
+            kinds.add(FLOAT)
+        elif isinstance(value, str):
+            kinds.add(TEXT)
+        else:
+            kinds.add(BLOB)
+    if not kinds:
+        return FLOAT
+    if len(kinds) == 1:
+        return kinds.pop()
+    if kinds == {INT, FLOAT}:
+        return NUMBER
+    return BLOB
+
+
+class _Column:
+    """1項目分の値（状態の配列は欠損・None があるときだけ持つ）"""
+    __slots__ = ('kind', 'values', 'state', 'is_int', 'blobs')
+
+    def __init__(self, kind: str, values: np.ndarray, state: Optional[np.ndarray] = None,
+                 is_int: Optional[np.ndarray] = None, blobs: Optional[List[bytes]] = None):
+        self.kind = kind
+        self.values = values
+        self.state = state
+        self.is_int = is_int
+        self.blobs = blobs
+
+    @classmethod
+    def build(cls, raw: List[Any], present: List[bool], kind: str,
+              blob_table: Dict[bytes, int], blobs: List[bytes]) -> "_Column":
+        state = None
+        if not all(present) or any(value is None for value in raw):
+            state = np.array([PRESENT if value is not None else (NULL if has else ABSENT)
+                              for value, has in zip(raw, present)], dtype=np.int8)
+        if kind == BLOB:
+            refs = []
+            for value in raw:
+                encoded = json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+                ref = blob_table.get(encoded)
+                if ref is None:
+                    # 圧縮は初めて出てきた内容だけ
+                    ref = blob_table[encoded] = len(blobs)
+                    blobs.append(b'z' + zlib.compress(encoded, 1) if len(encoded) >= COMPRESS_MIN_BYTES
+                                 else b'j' + encoded)
+                refs.append(ref)
+            return cls(kind, np.array(refs, dtype=np.int32), state, blobs=blobs)
+        if kind == TEXT:
+            return cls(kind, np.array([(value or '').encode('utf-8') for value in raw], dtype=np.bytes_), state)
+        if kind == BOOL:
+            return cls(kind, np.array([bool(value) for value in raw], dtype=np.bool_), state)
+        if kind == INT:
+            return cls(kind, np.array([value or 0 for value in raw], dtype=np.int64), state)
+        values = np.array([value if value is not None else np.nan for value in raw], dtype=np.float64)
+        is_int = np.array([isinstance(value, int) for value in raw], dtype=np.bool_) if kind == NUMBER else None
+        return cls(kind, values, state, is_int)
+
+    def has(self, row: int) -> bool:
+        return self.state is None or self.state[row] != ABSENT
+
+    def get(self, row: int) -> Any:
+        """row 行目の値（Python の値に戻す）"""
+        if self.state is not None and self.state[row] != PRESENT:
+            return None
+        if self.kind == BLOB:
+            encoded = self.blobs[self.values[row]]
+            return json.loads(zlib.decompress(encoded[1:]) if encoded[:1] == b'z' else encoded[1:])
+        if self.kind == TEXT:
+            return self.values[row].decode('utf-8')
+        value = self.values[row].item()
+        if self.is_int is not None and self.is_int[row]:
+            return int(value)
+        return value
+
+    def take(self, index) -> "_Column":
+        return _Column(self.kind, self.values[index], None if self.state is None else self.state[index],
+                       None if self.is_int is None else self.is_int[index], self.blobs)
+
+    def nbytes(self) -> int:
+        return sum(array.nbytes for array in (self.values, self.state, self.is_int) if array is not None)
+
+
+class CompactHistory(Sequence):
+    """スナップショットのリストを列で保持する（各行は SnapshotView として読める）"""
+    __slots__ = ('_rows', '_schema', '_sections', '_columns', '_blobs')
+
+    def __init__(self, rows: int, schema: Dict[str, Optional[List[str]]],
+                 sections: Dict[str, Optional[np.ndarray]], columns: Dict[Path_, _Column], blobs: List[bytes]):
+        self._rows = rows
+        # 最上位のキー → 節のキーの並び（節でない項目は None）
+        self._schema = schema
+        # 節 → 行ごとに節があるか（全行にあれば None）
+        self._sections = sections
+        self._columns = columns
+        self._blobs = blobs
+
+    @classmethod
+    def from_snapshots(cls, snapshots: Iterable[Dict[str, Any]]) -> "CompactHistory":
+        """スナップショットのリストから作る（順序はそのまま）"""
+        snapshots = list(snapshots)
+        # 最上位のキーと、値がいつも dict のキーの中のキーを出現順に集める
+        # （値が dict でない行が1つでもあれば、節にせずそのキー全体を1列にする）
+        top_keys: Dict[str, Optional[Dict[str, None]]] = {}
+        for snapshot in snapshots:
+            for key, value in snapshot.items():
+                if not isinstance(value, dict):
+                    top_keys[key] = None
+                elif top_keys.setdefault(key, {}) is not None:
+                    top_keys[key].update(dict.fromkeys(value))
+
+        blob_table: Dict[bytes, int] = {}
+        blobs: List[bytes] = []
+        schema: Dict[str, Optional[List[str]]] = {}
+        sections: Dict[str, Optional[np.ndarray]] = {}
+        columns: Dict[Path_, _Column] = {}
+
+        def add_column(path: Path_, raw: List[Any], present: List[bool]) -> None:
+            columns[path] = _Column.build(raw, present, _scalar_kind(raw), blob_table, blobs)
+
+        for key, inner in top_keys.items():
+            if inner is None:
+                schema[key] = None
+                add_column((key,), [snapshot.get(key) for snapshot in snapshots],
+                           [key in snapshot for snapshot in snapshots])
+                continue
+            schema[key] = list(inner)
+            section_present = [key in snapshot for snapshot in snapshots]
+            sections[key] = None if all(section_present) else np.array(section_present, dtype=np.bool_)
+            section_values = [snapshot.get(key) or {} for snapshot in snapshots]
+            for inner_key in inner:
+                add_column((key, inner_key), [values.get(inner_key) for values in section_values],
+                           [inner_key in values for values in section_values])
+        return cls(len(snapshots), schema, sections, columns, blobs)
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[Path_, Tuple[np.ndarray, Optional[np.ndarray]]]) -> "CompactHistory":
+        """既存の配列から作る（コピーしない。共有メモリ上の配列をそのまま読む場合など）
+
+        arrays: 項目のパス（('data_time',) / ('dam', 'water_level') など）→ (値, 状態の配列または None)。
+        値の dtype で列の種類を決める（バイト列は UTF-8 の文字列、float は数値、int は整数、bool は真偽値）。
+        節（パスの長さが2の項目）は全行にあるものとして扱う。
+        """
+        schema: Dict[str, Optional[List[str]]] = {}
+        columns: Dict[Path_, _Column] = {}
+        rows = 0
+        for path, (values, state) in arrays.items():
+            if values.dtype.kind == 'S':
+                kind = TEXT
+            elif values.dtype.kind == 'f':
+                kind = FLOAT
+            elif values.dtype.kind == 'b':
+                kind = BOOL
+            else:
+                kind = INT
+            columns[path] = _Column(kind, values, state)
+            if len(path) == 1:
+                schema[path[0]] = None
+            else:
+                schema.setdefault(path[0], []).append(path[1])
+            rows = len(values)
+        sections: Dict[str, Optional[np.ndarray]] = {key: None for key, inner in schema.items() if inner is not None}
+        return cls(rows, schema, sections, columns, [])
+
+    def __len__(self) -> int:
+        return self._rows
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            # スライスは配列のビュー（コピーしない）
+            return self._take(index)
+        if index < 0:
+            index += self._rows
+        if not 0 <= index < self._rows:
+            raise IndexError("CompactHistory index out of range")
+        return SnapshotView(self, index)
+
+    def __iter__(self) -> Iterator["SnapshotView"]:
+        for row in range(self._rows):
+            yield SnapshotView(self, row)
+
+    def __reduce__(self):
+        # 共有している入れ子の JSON はそのまま1つにして保存する（st.cache_data は pickle で保持する）
+        return (CompactHistory, (self._rows, self._schema, self._sections, self._columns, self._blobs))
+
+    def _take(self, index) -> "CompactHistory":
+        rows = len(range(self._rows)[index]) if isinstance(index, slice) else len(index)
+        sections = {key: None if present is None else present[index] for key, present in self._sections.items()}
+        columns = {path: column.take(index) for path, column in self._columns.items()}
+        return CompactHistory(rows, self._schema, sections, columns, self._blobs)
+
+    def filter(self, mask: np.ndarray) -> "CompactHistory":
+        """mask が True の行だけにする"""
+        return self._take(np.flatnonzero(mask))
+
+    def column(self, *path: str) -> np.ndarray:
+        """スカラーの項目を配列で返す（数値は float64 で欠損・None は NaN、文字列は str の object 配列）"""
+        column = self._columns.get(path)
+        if column is None:
+            return np.full(self._rows, np.nan)
+        if column.kind == TEXT:
+            values = np.array([value.decode('utf-8') for value in column.values], dtype=object)
+            if column.state is not None:
+                values[column.state != PRESENT] = None
+            return values
+        if column.kind == BLOB:
+            return np.array([column.get(row) for row in range(self._rows)], dtype=object)
+        values = column.values.astype(np.float64)
+        if column.state is not None:
+            values[column.state != PRESENT] = np.nan
+        return values
+
+    def to_dicts(self) -> List[Dict[str, Any]]:
+        """元の入れ子の dict のリストに戻す"""
+        return [view.to_dict() for view in self]
+
+    def nbytes(self) -> int:
+        """配列と入れ子の JSON のバイト数（Python オブジェクトのオーバーヘッドは含まない）"""
+        arrays = sum(column.nbytes() for column in self._columns.values())
+        arrays += sum(present.nbytes for present in self._sections.values() if present is not None)
+        return arrays + sum(len(blob) for blob in self._blobs)
+
+    def _section(self, key: str, inner: List[str], row: int) -> Dict[str, Any]:
+        section = {}
+        for inner_key in inner:
+            column = self._columns[(key, inner_key)]
+            if column.has(row):
+                section[inner_key] = column.get(row)
+        return section
+
+
+class SnapshotView(Mapping):
+    """CompactHistory の1行（dict と同じように読める、読み取り専用）"""
+    __slots__ = ('_history', '_row')
+
+    def __init__(self, history: CompactHistory, row: int):
+        self._history = history
+        self._row = row
+
+    def __getitem__(self, key: str) -> Any:
+        history, row = self._history, self._row
+        inner = history._schema[key]
+        if inner is None:
+            column = history._columns[(key,)]
+            if not column.has(row):
+                raise KeyError(key)
+            return column.get(row)
+        present = history._sections[key]
+        if present is not None and not present[row]:
+            raise KeyError(key)
+        return history._section(key, inner, row)
+
+    def __contains__(self, key: object) -> bool:
+        try:
+            self[key]
+        except KeyError:
+            return False
+        return True
+
+    def __iter__(self) -> Iterator[str]:
+        history, row = self._history, self._row
+        for key, inner in history._schema.items():
+            if inner is None:
+                if history._columns[(key,)].has(row):
+                    yield key
+            elif history._sections[key] is None or history._sections[key][row]:
+                yield key
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __repr__(self) -> str:
+        return f"SnapshotView({self.to_dict()!r})"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {key: self[key] for key in self}
@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+"""
+履歴データの段階的保持（ティアードリテンション）
+生データを削除する代わりに、期限切れの日を集計値に縮約して保存する
+
+- 生データ（10分間隔）: 直近 raw_days 日（data/history）
+- 時間集計（min/max/mean）: hourly_days 日まで（data/archive/hourly/YYYY/MM.ndjson）
+- 日集計（min/max/mean）: 無期限（data/archive/daily/YYYY.ndjson）
+
+集計は iter_hourly / iter_daily で期間を指定して読む（該当する月・年のファイルだけを読むため、長期間でも軽い）。
+
+期限切れの日ディレクトリだけをディレクトリ名から特定し、1日ずつストリームで読みながら
+時間集計と日集計を同時に作るため、ツリー全体の走査や全データの保持は行わない。
+
+使い方:
+    python scripts/history_retention.py [--raw-days 7] [--hourly-days 365] [--dry-run]
+"""
+
+import argparse
+import json
+import shutil
+import sys
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+if __name__ == "__main__":
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from scripts.history_store import (
+    JST, day_of_dir, iter_day_dirs, load_day_snapshots, parse_jst, snapshot_key
+)
+
+# 集計対象の項目（名前 → スナップショット内のパス）
+METRICS = {
+    'dam_water_level': ('dam', 'water_level'),
+    'dam_storage_rate': ('dam', 'storage_rate'),
+    'dam_inflow': ('dam', 'inflow'),
+    'dam_outflow': ('dam', 'outflow'),
+    'river_water_level': ('river', 'water_level'),
+    'rainfall_hourly': ('rainfall', 'hourly'),
+    'rainfall_cumulative': ('rainfall', 'cumulative')
+}
+
+HOURLY_DIR_NAME = "hourly"
+DAILY_DIR_NAME = "daily"
+
+
+class MetricStats:
+    """1項目分の min/max/mean 集計（結合可能）"""
+
+    __slots__ = ('count', 'min', 'max', 'sum')
+
+    def __init__(self):
+        self.count = 0
+        self.min = None
+        self.max = None
+        self.sum = 0.0
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'min': self.min,
+            'max': self.max,
+            'mean': round(self.sum / self.count, 4),
+            'count': self.count
+        }
+
+
+class BucketAggregate:
+    """1区間（1時間または1日）分の全項目の集計"""
+
+    def __init__(self, key: str):
+        self.key = key
+        self.snapshots = 0
+        self.metrics = {name: MetricStats() for name in METRICS}
+
+    def add_snapshot(self, data: Dict[str, Any]) -> None:
+        self.snapshots += 1
+        for name, (section, field) in METRICS.items():
+            value = (data.get(section) or {}).get(field)
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                self.metrics[name].add(float(value))
+
+    def to_record(self) -> Dict[str, Any]:
+        return {
+            'time': self.key,
+            'snapshots': self.snapshots,
+            'metrics': {name: stats.to_dict() for name, stats in self.metrics.items() if stats.count}
+        }
+
+
+def aggregate_day(day_snapshots: List[Dict[str, Any]], day: date) -> Dict[str, Any]:
+    """1日分のスナップショットから時間集計と日集計を同時に作る
+
+    Returns: {'hourly': [record, ...], 'daily': record}
+    """
+    hourly = {}
+    daily = BucketAggregate(datetime(day.year, day.month, day.day, tzinfo=JST).isoformat())
+    for data in day_snapshots:
+        data_dt = parse_jst(snapshot_key(data))
+        if data_dt is None:
+            continue
+        hour_key = data_dt.replace(minute=0, second=0, microsecond=0).isoformat()
+        if hour_key not in hourly:
+            hourly[hour_key] = BucketAggregate(hour_key)
+        hourly[hour_key].add_snapshot(data)
+        daily.add_snapshot(data)
+    return {
+        'hourly': [hourly[key].to_record() for key in sorted(hourly)],
+        'daily': daily.to_record()
+    }
+
+
+def hourly_file(archive_dir: Path, day: date) -> Path:
+    return archive_dir / HOURLY_DIR_NAME / day.strftime("%Y") / f"{day.strftime('%m')}.ndjson"
+
+
+def daily_file(archive_dir: Path, day: date) -> Path:
+    return archive_dir / DAILY_DIR_NAME / f"{day.strftime('%Y')}.ndjson"
+
+
+def _existing_keys(path: Path) -> set:
+    """アーカイブに記録済みの区間キー（再実行時の重複追記を防ぐ）"""
+    keys = set()
+    if not path.exists():
+        return keys
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                keys.add(json.loads(line)['time'])
+            except (json.JSONDecodeError, KeyError):
+                continue
+    return keys
+
+
+def _append_records(path: Path, records: List[Dict[str, Any]]) -> int:
+    """未記録の区間のみ追記"""
+    existing = _existing_keys(path)
+    new_records = [record for record in records if record['time'] not in existing]
+    if not new_records:
+        return 0
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'a', encoding='utf-8') as f:
+        for record in new_records:
+            f.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n')
+    return len(new_records)
+
+
+def archive_day(day_dir: Path, archive_dir: Path) -> Dict[str, int]:
+    """1日分を集計してアーカイブに追記する（生データは削除しない）"""
+    day = day_of_dir(day_dir)
+    day_snapshots, error_count = load_day_snapshots(day_dir)
+    aggregates = aggregate_day(day_snapshots, day)
+    # 時間集計 → 日集計の順に書く（日集計があればその日は完了済み）
+    hourly_added = _append_records(hourly_file(archive_dir, day), aggregates['hourly'])
+    daily_added = _append_records(daily_file(archive_dir, day), [aggregates['daily']])
+    return {
+        'snapshots': len(day_snapshots),
+        'errors': error_count,
+        'hourly_records': hourly_added,
+        'daily_records': daily_added
+    }
+
+
+def _iter_archive_file(path: Path, start_time: datetime, end_time: datetime) -> Iterator[Dict[str, Any]]:
+    if not path.exists():
+        return
+    records = {}
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            record_dt = parse_jst(record.get('time') or '')
+            if record_dt is not None and start_time <= record_dt <= end_time:
+                records[record['time']] = record
+    for key in sorted(records):
+        yield records[key]
+
+
+def iter_hourly(archive_dir: Path, start_time: datetime, end_time: datetime) -> Iterator[Dict[str, Any]]:
+    """期間内の時間集計を時刻順に返す（該当する月ファイルのみ読む）"""
+    start_time, end_time = start_time.astimezone(JST), end_time.astimezone(JST)
+    month = date(start_time.year, start_time.month, 1)
+    while month <= end_time.date():
+        yield from _iter_archive_file(hourly_file(archive_dir, month), start_time, end_time)
+        month = date(month.year + (month.month == 12), month.month % 12 + 1, 1)
+
+
+def iter_daily(archive_dir: Path, start_time: datetime, end_time: datetime) -> Iterator[Dict[str, Any]]:
+    """期間内の日集計を時刻順に返す（該当する年ファイルのみ読む）"""
+    start_time, end_time = start_time.astimezone(JST), end_time.astimezone(JST)
+    for year in range(start_time.year, end_time.year + 1):
+        yield from _iter_archive_file(daily_file(archive_dir, date(year, 1, 1)), start_time, end_time)
+
+
+def partition_usage(day_dir: Path) -> Dict[str, int]:
+    """日ディレクトリ内のファイル数・バイト数"""
+    files = 0
+    size = 0
+    for path in day_dir.iterdir():
+        if path.is_file():
+            files += 1
+            size += path.stat().st_size
+    return {'files': files, 'bytes': size}
+
+
+def remove_empty_parents(day_dir: Path, history_dir: Path) -> None:
+    """日ディレクトリ削除後に空になった月・年ディレクトリを削除"""
+    for parent in (day_dir.parent, day_dir.parent.parent):
+        if parent == history_dir or any(parent.iterdir()):
+            break
+        parent.rmdir()
+
+
+def expiring_day_dirs(history_dir: Path, raw_days: int, today: Optional[date] = None) -> List[Path]:
+    """生データの保持期間を過ぎた日ディレクトリ（ディレクトリ名のみで判定）"""
+    if today is None:
+        today = datetime.now(JST).date()
+    cutoff = today - timedelta(days=raw_days)
+    expiring = []
+    for day_dir in iter_day_dirs(history_dir):
+        day = day_of_dir(day_dir)
+        if day is not None and day < cutoff:
+            expiring.append(day_dir)
+    return expiring
+
+
+def expiring_hourly_files(archive_dir: Path, hourly_days: int, today: Optional[date] = None) -> List[Path]:
+    """時間集計の保持期間を過ぎた月ファイル（月の末日が期限より前のもの）"""
+    if today is None:
+        today = datetime.now(JST).date()
+    cutoff = today - timedelta(days=hourly_days)
+    hourly_dir = archive_dir / HOURLY_DIR_NAME
+    expiring = []
+    if not hourly_dir.exists():
+        return expiring
+    for year_dir in sorted(hourly_dir.iterdir()):
+        if not year_dir.name.isdigit():
+            continue
+        for month_file in sorted(year_dir.glob("*.ndjson")):
+            try:
+                year, month = int(year_dir.name), int(month_file.stem)
+                month_end = date(year + (month == 12), month % 12 + 1, 1) - timedelta(days=1)
+            except ValueError:
+                continue
+            if month_end < cutoff:
+                expiring.append(month_file)
+    return expiring
+
+
+def apply_retention(history_dir: Path, archive_dir: Path, raw_days: int = 7, hourly_days: int = 365,
+                    today: Optional[date] = None, dry_run: bool = False, archive: bool = True) -> Dict[str, Any]:
+    """期限切れの生データを集計に縮約してから削除し、古い時間集計を削除する
+
+    archive=False では集計せずに生データを削除するだけにする（時間集計にも触れない）。
+    削除する（dry_run では削除される）ファイル数・バイト数も返す。
+    """
+    stats = {
+        'raw_days': raw_days,
+        'hourly_days': hourly_days,
+        'expired_days': [],
+        'deleted_files': 0,
+        'freed_bytes': 0,
+        'snapshots': 0,
+        'hourly_records': 0,
+        'daily_records': 0,
+        'removed_hourly_files': []
+    }
+    for day_dir in expiring_day_dirs(history_dir, raw_days, today):
+        usage = partition_usage(day_dir)
+        stats['expired_days'].append(day_of_dir(day_dir).isoformat())
+        stats['deleted_files'] += usage['files']
+        stats['freed_bytes'] += usage['bytes']
+        if dry_run:
+            continue
+        if archive:
+            result = archive_day(day_dir, archive_dir)
+            stats['snapshots'] += result['snapshots']
+            stats['hourly_records'] += result['hourly_records']
+            stats['daily_records'] += result['daily_records']
+        shutil.rmtree(day_dir)
+        remove_empty_parents(day_dir, history_dir)
+
+    if not archive:
+        return stats
+    for month_file in expiring_hourly_files(archive_dir, hourly_days, today):
+        stats['removed_hourly_files'].append(str(month_file.relative_to(archive_dir)))
+        stats['freed_bytes'] += month_file.stat().st_size
+        if not dry_run:
+            month_file.unlink()
+    return stats
+
+
+def main() -> int:
+    data_dir = Path(__file__).resolve().parent.parent / "data"
+    parser = argparse.ArgumentParser(description="期限切れの履歴データを集計に縮約して保持する")
+    parser.add_argument("--history-dir", type=Path, default=data_dir / "history")
+    parser.add_argument("--archive-dir", type=Path, default=data_dir / "archive")
+    parser.add_argument("--raw-days", type=int, default=7, help="生データ（10分間隔）の保持日数")
+    parser.add_argument("--hourly-days", type=int, default=365, help="時間集計の保持日数")
+    parser.add_argument("--dry-run", action="store_true", help="対象を表示するだけで変更しない")
+    args = parser.parse_args()
+
+    stats = apply_retention(args.history_dir, args.archive_dir, args.raw_days, args.hourly_days, dry_run=args.dry_run)
+    print(json.dumps(stats, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
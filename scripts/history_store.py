@@ -0,0 +1,480 @@
+#!/usr/bin/env python3
+"""
+履歴データストア
+data/history/YYYY/MM/DD/ 配下のスナップショットの読み込みと日次コンパクションを扱う
+
+1日分の HHMM.json は、日付が確定した後に1行1スナップショットの
+day.ndjson と時刻インデックス day.idx にまとめられる。
+書き込みモード "ndjson" では収集時点から同じ形式に追記する。
+日次ログ・HHMM.json はいずれも圧縮可能（history_codec 参照）。
+読み込み側はコンパクト済みの日とバラのファイル、圧縮の有無を区別せずに扱える。
+"""
+
+import json
+import os
+from bisect import bisect_left
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+try:
+    from zoneinfo import ZoneInfo
+except ImportError:
+    # Python 3.8以前の場合
+    import pytz
+    ZoneInfo = lambda x: pytz.timezone(x)
+
+from scripts.history_codec import (
+    CODEC_SUFFIXES, SUFFIX_CODECS, codec_of, compress, load_active_dictionary, open_binary, read_bytes
+)
+
+# 日本時間のタイムゾーン
+JST = ZoneInfo('Asia/Tokyo')
+
+# コンパクト済みの日次ファイル名
+DAY_LOG_NAME = "day.ndjson"
+DAY_INDEX_NAME = "day.idx"
+
+# スナップショットとして扱わないファイル
+SKIP_FILES = {"daily_summary.json"}
+
+# 書き込みモード: "files" = HHMM.json を1件ずつ作成, "ndjson" = 日次ログに追記
+HISTORY_WRITE_MODES = ("files", "ndjson")
+
+
+def day_dir_for(history_dir: Path, day: date) -> Path:
+    """日付に対応する履歴ディレクトリ（YYYY/MM/DD）を返す"""
+    return history_dir / day.strftime("%Y") / day.strftime("%m") / day.strftime("%d")
+
+
+def parse_jst(time_str: str) -> Optional[datetime]:
+    """ISO形式の時刻文字列をJSTのdatetimeに変換（タイムゾーンなしはJSTとして扱う）"""
+    if not time_str:
+        return None
+    try:
+        dt = datetime.fromisoformat(time_str.replace('Z', '+00:00'))
+    except (ValueError, AttributeError):
+        return None
+    if dt.tzinfo is None:
+        return dt.replace(tzinfo=JST)
+    return dt.astimezone(JST)
+
+
+def snapshot_key(data: Dict[str, Any]) -> str:
+    """スナップショットの識別キー（観測時刻、なければ取得時刻）"""
+    return data.get('data_time') or data.get('timestamp') or ''
+
+
+def history_dir_of(day_dir: Path) -> Path:
+    """日付ディレクトリ（YYYY/MM/DD）から履歴ディレクトリを求める"""
+    return day_dir.parent.parent.parent
+
+
+def iter_day_dirs(history_dir: Path) -> List[Path]:
+    """履歴ディレクトリ配下の日付ディレクトリを古い順に列挙（dicts などは除外）"""
+    day_dirs = []
+    if not history_dir.exists():
+        return day_dirs
+    for year_dir in sorted(history_dir.iterdir()):
+        if not year_dir.is_dir() or not year_dir.name.isdigit():
+            continue
+        for month_dir in sorted(year_dir.iterdir()):
+            if not month_dir.is_dir() or not month_dir.name.isdigit():
+                continue
+            for day_dir in sorted(month_dir.iterdir()):
+                if day_dir.is_dir() and day_dir.name.isdigit():
+                    day_dirs.append(day_dir)
+    return day_dirs
+
+
+def day_of_dir(day_dir: Path) -> Optional[date]:
+    """YYYY/MM/DD ディレクトリから日付を復元"""
+    try:
+        return date(int(day_dir.parent.parent.name), int(day_dir.parent.name), int(day_dir.name))
+    except ValueError:
+        return None
+
+
+def _is_snapshot_file(path: Path) -> bool:
+    """HHMM.json（圧縮版 HHMM.json.gz など含む）かどうか"""
+    name = path.name
+    if path.suffix in SUFFIX_CODECS:
+        name = path.stem
+    return name.endswith('.json') and name not in SKIP_FILES
+
+
+def loose_snapshot_files(day_dir: Path) -> List[Path]:
+    """コンパクトされていない HHMM.json を時刻順に列挙"""
+    return [p for p in sorted(day_dir.iterdir()) if p.is_file() and _is_snapshot_file(p)]
+
+
+def day_log_path(day_dir: Path) -> Optional[Path]:
+    """日次ログ（day.ndjson またはその圧縮版）のパス。なければ None"""
+    for suffix in [''] + list(CODEC_SUFFIXES.values()):
+        path = day_dir / (DAY_LOG_NAME + suffix)
+        if path.exists():
+            return path
+    return None
+
+
+def read_snapshot_file(file_path: Path) -> Dict[str, Any]:
+    """HHMM.json を読み込む（圧縮ファイルは展開）"""
+    return json.loads(read_bytes(file_path, history_dir_of(file_path.parent)))
+
+
+def read_day_index(day_dir: Path) -> List[Tuple[str, int]]:
+    """時刻インデックス（data_time → バイトオフセット）を読み込む"""
+    index_file = day_dir / DAY_INDEX_NAME
+    entries = []
+    if not index_file.exists():
+        return entries
+    with open(index_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            parts = line.rstrip('\n').split('\t')
+            if len(parts) != 2:
+                continue
+            try:
+                entries.append((parts[0], int(parts[1])))
+            except ValueError:
+                continue
+    return entries
+
+
+def read_day_log(day_dir: Path) -> Tuple[List[Dict[str, Any]], int]:
+    """コンパクト済みの日次ログを読み込む
+
+    Returns: (snapshots, error_count)
+    """
+    log_file = day_log_path(day_dir)
+    snapshots = []
+    error_count = 0
+    if log_file is None:
+        return snapshots, error_count
+    with open_binary(log_file, history_dir_of(day_dir)) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                snapshots.append(json.loads(line))
+            except json.JSONDecodeError:
+                error_count += 1
+    return snapshots, error_count
+
+
+def load_day_snapshots(day_dir: Path) -> Tuple[List[Dict[str, Any]], int]:
+    """1日分のスナップショットを時刻順に読み込む（コンパクト済み・バラのファイル両対応）
+
+    コンパクト途中で中断した場合に備えて data_time で重複を除外する。
+    Returns: (snapshots, error_count)
+    """
+    snapshots, error_count = read_day_log(day_dir)
+    seen = {snapshot_key(data) for data in snapshots}
+
+    for file_path in loose_snapshot_files(day_dir):
+        try:
+            data = read_snapshot_file(file_path)
+        except (ValueError, OSError):
+            error_count += 1
+            continue
+        if not isinstance(data, dict):
+            error_count += 1
+            continue
+        key = snapshot_key(data)
+        if key and key in seen:
+            continue
+        seen.add(key)
+        snapshots.append(data)
+
+    snapshots.sort(key=snapshot_key)
+    return snapshots, error_count
+
+
+def _encode_line(data: Dict[str, Any]) -> bytes:
+    """スナップショットをNDJSONの1行に変換"""
+    return (json.dumps(data, ensure_ascii=False, separators=(',', ':')) + '\n').encode('utf-8')
+
+
+def _write_atomic(path: Path, payload: bytes) -> None:
+    """一時ファイル経由でアトミックに書き込む"""
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, 'wb') as f:
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _needs_compaction(day_dir: Path, codec: Optional[str]) -> bool:
+    """バラのファイルが残っているか、日次ログの圧縮形式が指定と異なるか（codec=None は今の形式のまま）"""
+    if loose_snapshot_files(day_dir):
+        return True
+    if codec is None:
+        return False
+    log_file = day_log_path(day_dir)
+    return log_file is not None and codec_of(log_file) != codec
+
+
+def compact_day(day_dir: Path, remove_loose: bool = True, codec: Optional[str] = None) -> int:
+    """1日分の HHMM.json を day.ndjson + day.idx にまとめる
+
+    既にコンパクト済みの場合は、後から追加されたバラのファイルも取り込んで書き直す。
+    codec を指定すると日次ログをその形式で圧縮して保存する（インデックスは展開後のオフセット）。
+    codec=None では既存の日次ログの形式を保つ（圧縮済みの日を非圧縮に戻さない）。
+    Returns: まとめたスナップショット数
+    """
+    if not _needs_compaction(day_dir, codec):
+        return 0
+    loose_files = loose_snapshot_files(day_dir)
+    old_log = day_log_path(day_dir)
+    if codec is None and old_log is not None:
+        codec = codec_of(old_log)
+
+    snapshots, _ = load_day_snapshots(day_dir)
+    if not snapshots:
+        return 0
+
+    log_lines = []
+    index_lines = []
+    offset = 0
+    for data in snapshots:
+        line = _encode_line(data)
+        index_lines.append(f"{snapshot_key(data)}\t{offset}\n")
+        log_lines.append(line)
+        offset += len(line)
+
+    # ログ → インデックス → バラのファイル削除の順で、どこで中断しても読み込めるようにする
+    log_payload = b''.join(log_lines)
+    log_file = day_dir / DAY_LOG_NAME
+    if codec:
+        log_payload = compress(log_payload, codec, load_active_dictionary(history_dir_of(day_dir), codec))
+        log_file = day_dir / (DAY_LOG_NAME + CODEC_SUFFIXES[codec])
+    _write_atomic(log_file, log_payload)
+    _write_atomic(day_dir / DAY_INDEX_NAME, ''.join(index_lines).encode('utf-8'))
+
+    if old_log is not None and old_log != log_file:
+        old_log.unlink()
+    if remove_loose:
+        for file_path in loose_files:
+            file_path.unlink()
+
+    return len(snapshots)
+
+
+def compact_history(history_dir: Path, today: Optional[date] = None, dry_run: bool = False,
+                    codec: Optional[str] = None) -> Dict[str, Any]:
+    """確定済み（JSTで今日より前）の日をすべてコンパクトする（codec 指定時は圧縮形式もそろえ、None なら各日の形式のまま）"""
+    if today is None:
+        today = datetime.now(JST).date()
+
+    stats = {
+        'compacted_days': 0,
+        'snapshots': 0,
+        'removed_files': 0,
+        'days': []
+    }
+    for day_dir in iter_day_dirs(history_dir):
+        day = day_of_dir(day_dir)
+        if day is None or day >= today:
+            continue
+        if not _needs_compaction(day_dir, codec):
+            continue
+        loose_count = len(loose_snapshot_files(day_dir))
+
+        count = loose_count if dry_run else compact_day(day_dir, codec=codec)
+        stats['compacted_days'] += 1
+        stats['snapshots'] += count
+        stats['removed_files'] += loose_count
+        stats['days'].append(day.isoformat())
+    return stats
+
+
+def _precedes_log(entries: List[Tuple[str, int]], data_dt: datetime) -> bool:
+    """日次ログの最後の行より前の時刻か（追記すると時刻順でなくなる）"""
+    if not entries:
+        return False
+    last_dt = parse_jst(entries[-1][0])
+    return last_dt is not None and data_dt < last_dt
+
+
+def append_snapshot(history_dir: Path, data: Dict[str, Any]) -> Optional[int]:
+    """スナップショットを日次ログ day.ndjson に1行追記し、インデックスを更新する
+
+    同じ data_time が既に記録されている場合は追記しない。
+    その日のログが圧縮済み（過去日の遅延データ）の場合や、ログの最後の行より前の時刻（遅れて届いた・再試行した収集）の場合は
+    HHMM.json として書き、次回のコンパクションで取り込む（日次ログは常に時刻順に保つ）。
+    Returns: 書き込んだ行のバイトオフセット（スキップ時は None）
+    """
+    key = snapshot_key(data)
+    data_dt = parse_jst(key)
+    if data_dt is None:
+        raise ValueError(f"スナップショットの時刻が不正です: {key!r}")
+
+    day_dir = day_dir_for(history_dir, data_dt.date())
+    day_dir.mkdir(parents=True, exist_ok=True)
+
+    entries = read_day_index(day_dir)
+    if any(entry_key == key for entry_key, _ in entries):
+        return None
+
+    log_file = day_log_path(day_dir)
+    if (log_file is not None and codec_of(log_file) is not None) or _precedes_log(entries, data_dt):
+        write_snapshot(history_dir, data, mode="files")
+        return None
+
+    # ログ → インデックスの順に追記（インデックス欠落分は読み込み時に前方走査で補う）
+    with open(day_dir / DAY_LOG_NAME, 'ab') as f:
+        offset = f.tell()
+        f.write(_encode_line(data))
+    with open(day_dir / DAY_INDEX_NAME, 'a', encoding='utf-8') as f:
+        f.write(f"{key}\t{offset}\n")
+    return offset
+
+
+def write_snapshots(history_dir: Path, snapshots: Iterable[Dict[str, Any]], mode: str = "ndjson") -> Dict[str, int]:
+    """複数のスナップショットを日ごとにまとめて履歴に書き込む（一括取り込み用）
+
+    既に記録されている data_time（日次ログ・バラのファイルとも）は書き込まない。
+    "ndjson" モードでは日ごとにログとインデックスへ1回ずつ追記する。
+    Returns: {'written': 書き込んだ件数, 'skipped': 重複で除外した件数, 'days': 対象日数}
+    """
+    if mode not in HISTORY_WRITE_MODES:
+        raise ValueError(f"不明な書き込みモードです: {mode}")
+
+    by_day: Dict[date, List[Dict[str, Any]]] = {}
+    for data in snapshots:
+        data_dt = parse_jst(snapshot_key(data))
+        if data_dt is None:
+            raise ValueError(f"スナップショットの時刻が不正です: {snapshot_key(data)!r}")
+        by_day.setdefault(data_dt.date(), []).append(data)
+
+    stats = {'written': 0, 'skipped': 0, 'days': len(by_day)}
+    for day, day_snapshots in sorted(by_day.items()):
+        day_dir = day_dir_for(history_dir, day)
+        seen = set()
+        if day_dir.is_dir():
+            existing, _ = load_day_snapshots(day_dir)
+            seen = {snapshot_key(data) for data in existing}
+        new_snapshots = []
+        for data in sorted(day_snapshots, key=snapshot_key):
+            key = snapshot_key(data)
+            if key in seen:
+                stats['skipped'] += 1
+                continue
+            seen.add(key)
+            new_snapshots.append(data)
+        if not new_snapshots:
+            continue
+
+        day_dir.mkdir(parents=True, exist_ok=True)
+        log_file = day_log_path(day_dir)
+        if (mode == "files" or (log_file is not None and codec_of(log_file) is not None)
+                or _precedes_log(read_day_index(day_dir), parse_jst(snapshot_key(new_snapshots[0])))):
+            for data in new_snapshots:
+                write_snapshot(history_dir, data, mode="files")
+        else:
+            # ログ → インデックスの順に追記（インデックス欠落分は読み込み時に前方走査で補う）
+            index_lines = []
+            with open(day_dir / DAY_LOG_NAME, 'ab') as f:
+                offset = f.tell()
+                for data in new_snapshots:
+                    line = _encode_line(data)
+                    index_lines.append(f"{snapshot_key(data)}\t{offset}\n")
+                    f.write(line)
+                    offset += len(line)
+            with open(day_dir / DAY_INDEX_NAME, 'a', encoding='utf-8') as f:
+                f.write(''.join(index_lines))
+        stats['written'] += len(new_snapshots)
+    return stats
+
+
+def write_snapshot(history_dir: Path, data: Dict[str, Any], mode: str = "files", codec: Optional[str] = None) -> Path:
+    """書き込みモードに応じてスナップショットを履歴に保存する
+
+    "files" モードで codec を指定すると、登録済みの辞書で圧縮した HHMM.json.<拡張子> を書く。
+
+    Returns: 書き込んだファイルのパス
+    """
+    if mode not in HISTORY_WRITE_MODES:
+        raise ValueError(f"不明な書き込みモードです: {mode}")
+
+    data_dt = parse_jst(snapshot_key(data))
+    if data_dt is None:
+        raise ValueError(f"スナップショットの時刻が不正です: {snapshot_key(data)!r}")
+    day_dir = day_dir_for(history_dir, data_dt.date())
+
+    if mode == "ndjson":
+        append_snapshot(history_dir, data)
+        return day_dir / DAY_LOG_NAME
+
+    day_dir.mkdir(parents=True, exist_ok=True)
+    file_path = day_dir / f"{data_dt.strftime('%H%M')}.json"
+    payload = json.dumps(data, ensure_ascii=False, indent=2).encode('utf-8')
+    if codec:
+        payload = compress(payload, codec, load_active_dictionary(history_dir, codec))
+        file_path = file_path.with_name(file_path.name + CODEC_SUFFIXES[codec])
+    _write_atomic(file_path, payload)
+    return file_path
+
+
+# 時刻を解釈できないインデックスの行は先頭側に並べる
+_MIN_TIME = datetime.min.replace(tzinfo=JST)
+
+
+def _seek_offset(day_dir: Path, start_time: datetime) -> int:
+    """インデックスから開始時刻以降の最初の行のオフセットを二分探索で求める
+
+    日次ログは時刻順に追記される（順序が前後するスナップショットは append_snapshot がバラのファイルに書く）ため、
+    インデックスも時刻順に並んでいる。
+    """
+    entries = read_day_index(day_dir)
+    if not entries:
+        return 0
+    # bisect の key= は Python 3.10 以降のため、時刻のリストを作って探索する（ワークフローは 3.9）
+    times = [parse_jst(key) or _MIN_TIME for key, _ in entries]
+    position = bisect_left(times, start_time)
+    if position < len(entries):
+        return entries[position][1]
+    # 開始時刻以降の行がインデックスにない場合は末尾の行から走査（インデックス欠落分を拾う）
+    return entries[-1][1]
+
+
+def _iter_day_log(day_dir: Path, start_time: datetime) -> Iterator[Dict[str, Any]]:
+    """日次ログを開始時刻の位置まで seek して前方に読み進める"""
+    with open_binary(day_log_path(day_dir), history_dir_of(day_dir)) as f:
+        f.seek(_seek_offset(day_dir, start_time))
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                continue
+
+
+def iter_snapshots(history_dir: Path, start_time: datetime, end_time: Optional[datetime] = None) -> Iterator[Dict[str, Any]]:
+    """指定期間のスナップショットを時刻順に1件ずつ返すジェネレーター
+
+    日次ログのみの日はインデックスで seek して逐次読み込むため、
+    長期間を走査してもメモリに保持するのは高々1日分（バラのファイルが混在する日）に限られる。
+    """
+    start_time = start_time.astimezone(JST)
+    end_time = (end_time or datetime.now(JST)).astimezone(JST)
+
+    day = start_time.date()
+    while day <= end_time.date():
+        day_dir = day_dir_for(history_dir, day)
+        day += timedelta(days=1)
+        if not day_dir.exists():
+            continue
+
+        if loose_snapshot_files(day_dir) or day_log_path(day_dir) is None:
+            day_snapshots, _ = load_day_snapshots(day_dir)
+            snapshots = iter(day_snapshots)
+        else:
+            snapshots = _iter_day_log(day_dir, start_time)
+
+        # 以前の版で順不同に追記された日次ログもあるため、終了時刻を過ぎても打ち切らない（読むのは高々1日分）
+        for data in snapshots:
+            data_dt = parse_jst(snapshot_key(data))
+            if data_dt is None or data_dt < start_time or data_dt > end_time:
+                continue
+            yield data
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+観測データCSVの一括取り込み
+山口県土木防災情報システムからダウンロードしたダム（dam_*.csv）・河川水位（water-level_*.csv）の
+CSV（Shift-JIS）を、何年分でもまとめて履歴ストアに書き込む。
+
+- CSVは chunksize 行ずつ読み込み、時刻の正規化（全角スペース・24:00 表記）と数値変換を列単位で行う
+- ダムと河川を時刻で結合し、latest.json と同じ形式のスナップショットにする
+- 既に履歴にある data_time は書き込まない（何度実行しても重複しない）
+
+使い方:
+    python scripts/import_csv.py sample/dam_*.csv sample/water-level_*.csv [--mode ndjson|files] [--dry-run]
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from scripts.collector.parsers import RIVER_STATUS_LEVELS
+from scripts.history_store import HISTORY_WRITE_MODES, write_snapshots
+
+# CSVの列構成（先頭の説明行を skiprows 行読み飛ばした次の行が見出し）
+DAM_COLUMNS = ['timestamp', 'hourly_rain', 'cumulative_rain', 'water_level',
+               'storage_rate', 'inflow', 'outflow', 'storage_change']
+RIVER_COLUMNS = ['timestamp', 'water_level', 'level_change']
+DAM_SKIPROWS = 7
+RIVER_SKIPROWS = 6
+
+# Shift-JIS の拡張文字（①、㎥ など）も読めるよう cp932 で読む
+CSV_ENCODING = 'cp932'
+
+DEFAULT_CHUNKSIZE = 50_000
+
+
+def normalize_timestamps(values: pd.Series) -> pd.Series:
+    """'2023/06/25　00:20'、'2023/06/25 24:00' などを JST の datetime に変換（解析できない行は NaT）"""
+    text = (values.astype(str)
+            .str.replace('　', ' ', regex=False)
+            .str.replace(r'\s+', ' ', regex=True)
+            .str.strip())
+    # 24:00 は翌日 00:00
+    end_of_day = text.str.endswith(' 24:00')
+    text = text.where(~end_of_day, text.str[:-5] + '00:00')
+
+    parsed = pd.to_datetime(text, format='%Y/%m/%d %H:%M', errors='coerce')
+    missing = parsed.isna()
+    if missing.any():
+        parsed[missing] = pd.to_datetime(text[missing], format='%Y/%m/%d %H:%M:%S', errors='coerce')
+    parsed = parsed.where(~end_of_day, parsed + pd.Timedelta(days=1))
+    return parsed.dt.tz_localize('Asia/Tokyo')
+
+
+def read_export(path: Path, columns: List[str], skiprows: int, chunksize: int = DEFAULT_CHUNKSIZE) -> Tuple[pd.DataFrame, int]:
+    """CSVを chunksize 行ずつ読み込み、時刻と数値を変換した DataFrame を返す
+
+    Returns: (frame, 読み込んだ行数)
+    """
+    frames = []
+    rows = 0
+    reader = pd.read_csv(path, encoding=CSV_ENCODING, skiprows=skiprows, header=0, dtype=str,
+                         usecols=range(len(columns)), chunksize=chunksize, skip_blank_lines=True)
+    for chunk in reader:
+        rows += len(chunk)
+        chunk.columns = columns
+        chunk['time'] = normalize_timestamps(chunk['timestamp'])
+        chunk = chunk.drop(columns='timestamp').dropna(subset=['time'])
+        numeric = [column for column in columns if column != 'timestamp']
+        chunk[numeric] = chunk[numeric].apply(
+            lambda column: pd.to_numeric(column.str.replace(',', '', regex=False).str.strip(), errors='coerce')
+        )
+        frames.append(chunk)
+    frame = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=['time'] + columns[1:])
+    return frame, rows
+
+
+def classify_export(path: Path) -> str:
+    """ファイル名から種類を判定（dam_*.csv → dam、water-level_*.csv → river）"""
+    name = path.name.lower()
+    if name.startswith('dam'):
+        return 'dam'
+    if name.startswith('water-level') or name.startswith('water_level'):
+        return 'river'
+    raise ValueError(f"ファイル名から種類を判定できません: {path.name}")
+
+
+def load_exports(paths: Iterable[Path], chunksize: int = DEFAULT_CHUNKSIZE) -> Tuple[pd.DataFrame, pd.DataFrame, int]:
+    """ダム・河川のCSVをすべて読み込む（同じ時刻は後のファイルを優先）
+
+    Returns: (dam, river, 読み込んだ行数)
+    """
+    dam_frames, river_frames = [], []
+    rows = 0
+    for path in sorted(paths):
+        if classify_export(path) == 'dam':
+            frame, count = read_export(path, DAM_COLUMNS, DAM_SKIPROWS, chunksize)
+            dam_frames.append(frame)
+        else:
+            frame, count = read_export(path, RIVER_COLUMNS, RIVER_SKIPROWS, chunksize)
+            river_frames.append(frame)
+        rows += count
+
+    def combine(frames: List[pd.DataFrame], columns: List[str]) -> pd.DataFrame:
+        if not frames:
+            return pd.DataFrame(columns=['time'] + columns[1:])
+        return pd.concat(frames, ignore_index=True).drop_duplicates('time', keep='last')
+
+    return combine(dam_frames, DAM_COLUMNS), combine(river_frames, RIVER_COLUMNS), rows
+
+
+def merge_series(dam: pd.DataFrame, river: pd.DataFrame) -> pd.DataFrame:
+    """ダムと河川を時刻で外部結合（列名は dam_* / river_* / rainfall_*）"""
+    dam = dam.rename(columns={
+        'hourly_rain': 'rainfall_hourly', 'cumulative_rain': 'rainfall_cumulative',
+        'water_level': 'dam_water_level', 'storage_rate': 'dam_storage_rate', 'inflow': 'dam_inflow',
+        'outflow': 'dam_outflow', 'storage_change': 'dam_storage_change'
+    })
+    river = river.rename(columns={'water_level': 'river_water_level', 'level_change': 'river_level_change'})
+    merged = dam.merge(river, on='time', how='outer').sort_values('time', ignore_index=True)
+
+    levels = merged['river_water_level']
+    conditions = [levels >= threshold for threshold, _ in RIVER_STATUS_LEVELS]
+    merged['river_status'] = np.select(conditions, [name for _, name in RIVER_STATUS_LEVELS], default='正常')
+    merged['rainfall_change'] = merged['rainfall_hourly'].diff().fillna(0)
+    merged['data_time'] = merged['time'].dt.strftime('%Y-%m-%dT%H:%M:%S+09:00')
+    return merged
+
+
+def _column(frame: pd.DataFrame, name: str, cast=float) -> List[Any]:
+    """列を Python のリストに（欠損は None）"""
+    if name not in frame:
+        return [None] * len(frame)
+    values = frame[name]
+    mask = values.notna().tolist()
+    return [cast(value) if ok else None for value, ok in zip(values.tolist(), mask)]
+
+
+def frame_to_snapshots(merged: pd.DataFrame) -> List[Dict[str, Any]]:
+    """結合済みの DataFrame を latest.json と同じ形式のスナップショットのリストにする"""
+    columns = {
+        'data_time': merged['data_time'].tolist(),
+        'dam_water_level': _column(merged, 'dam_water_level'),
+        'dam_storage_rate': _column(merged, 'dam_storage_rate'),
+        'dam_inflow': _column(merged, 'dam_inflow'),
+        'dam_outflow': _column(merged, 'dam_outflow'),
+        'dam_storage_change': _column(merged, 'dam_storage_change'),
+        'river_water_level': _column(merged, 'river_water_level'),
+        'river_level_change': _column(merged, 'river_level_change'),
+        'river_status': merged['river_status'].tolist(),
+        'rainfall_hourly': _column(merged, 'rainfall_hourly', int),
+        'rainfall_cumulative': _column(merged, 'rainfall_cumulative', int),
+        'rainfall_change': _column(merged, 'rainfall_change', int)
+    }
+    snapshots = []
+    for row in zip(*columns.values()):
+        values = dict(zip(columns.keys(), row))
+        snapshots.append({
+            'timestamp': values['data_time'],
+            'data_time': values['data_time'],
+            'dam': {
+                'water_level': values['dam_water_level'],
+                'storage_rate': values['dam_storage_rate'],
+                'inflow': values['dam_inflow'],
+                'outflow': values['dam_outflow'],
+                'storage_change': values['dam_storage_change']
+            },
+            'river': {
+                'water_level': values['river_water_level'],
+                'level_change': values['river_level_change'],
+                'status': values['river_status']
+            },
+            'rainfall': {
+                'hourly': values['rainfall_hourly'],
+                'cumulative': values['rainfall_cumulative'],
+                'change': values['rainfall_change']
+            },
+            'weather': {},
+            'precipitation_intensity': {'observation': [], 'forecast': [], 'update_time': values['data_time']}
+        })
+    return snapshots
+
+
+def import_exports(paths: Iterable[Path], history_dir: Path, mode: str = "ndjson",
+                   chunksize: int = DEFAULT_CHUNKSIZE, dry_run: bool = False) -> Dict[str, Any]:
+    """CSVを読み込んで履歴に書き込み、処理件数と速度を返す"""
+    started = time.perf_counter()
+    dam, river, rows = load_exports(paths, chunksize)
+    read_done = time.perf_counter()
+    snapshots = frame_to_snapshots(merge_series(dam, river))
+    convert_done = time.perf_counter()
+
+    stats = {'written': 0, 'skipped': 0, 'days': 0}
+    if not dry_run:
+        stats = write_snapshots(history_dir, snapshots, mode)
+    finished = time.perf_counter()
+
+    elapsed = finished - started
+    return {
+        'csv_rows': rows,
+        'dam_rows': len(dam),
+        'river_rows': len(river),
+        'snapshots': len(snapshots),
+        'written': stats['written'],
+        'skipped_existing': stats['skipped'],
+        'days': stats['days'],
+        'dry_run': dry_run,
+        'read_ms': round((read_done - started) * 1000, 2),
+        'convert_ms': round((convert_done - read_done) * 1000, 2),
+        'write_ms': round((finished - convert_done) * 1000, 2),
+        'rows_per_sec': round(rows / elapsed, 1) if elapsed > 0 else None
+    }
+
+
+def main() -> None:
+    data_dir = Path(__file__).resolve().parent.parent / "data"
+    parser = argparse.ArgumentParser(description="ダム・河川水位のCSVを履歴に一括取り込みする")
+    parser.add_argument("paths", nargs="+", type=Path, help="dam_*.csv / water-level_*.csv")
+    parser.add_argument("--history-dir", type=Path, default=data_dir / "history")
+    parser.add_argument("--mode", choices=HISTORY_WRITE_MODES, default="ndjson",
+                        help="ndjson: 日次ログにまとめて追記 / files: HHMM.json を1件ずつ書く")
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE, help="CSVを読み込む行数の単位")
+    parser.add_argument("--dry-run", action="store_true", help="読み込みと変換だけ行い、書き込まない")
+    args = parser.parse_args()
+
+    result = import_exports(args.paths, args.history_dir, args.mode, args.chunksize, args.dry_run)
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
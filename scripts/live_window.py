@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+"""
+直近の履歴の共有メモリ（複数のプロセスで1つの領域を読む）
+複数の Streamlit プロセスが同じ直近の履歴を持つと、プロセスの数だけ同じデータがメモリに載る。
+収集側（ローダー）が直近 WINDOW_HOURS 時間の全メトリクスを multiprocessing.shared_memory の領域に
+NumPy の配列の並びで1回だけ書き、各プロセスはその領域を読み取り専用でマップして配列のビューとして読む。
+
+- 領域: 先頭にマジック・バージョン・ヘッダー長、続けて JSON のヘッダー（世代 = 最新の観測時刻、行数、各列の
+  dtype とオフセット）、64バイト境界に揃えた列（観測時刻は UTF-8 の固定長バイト列と UNIX 時刻(μs)、
+  メトリクスは float64（整数だけの項目は int64）と欠損・None の状態の配列、river.status は UTF-8 の固定長バイト列）
+- 新しいスナップショットのたびに新しい領域を作って書き込み、ポインタ（data/live_window.json）を
+  アトミックに差し替える。読む側は書き込み済みの領域しか見ない。古い領域は1つ前まで残して unlink する
+  （マップ済みのプロセスは unlink 後も読める）
+- 読む側は Linux では /dev/shm のファイルを mmap の ACCESS_READ でマップする（書き込みできない）。
+  ポインタが latest.json より古い（ローダーが止まっている）・領域がない場合は None を返し、呼び出し側はディスクから読む
+
+読んだ履歴は CompactHistory（scripts/history_records.py）として返すため、各行は dict と同じように読める。
+整数と小数が混在する項目は float として読める。天気・降水強度などの入れ子の項目は含まない。
+
+使い方:
+    python scripts/live_window.py serve [--data-dir data] [--interval 5]   # latest.json が変わるたびに公開
+    python scripts/live_window.py show [--data-dir data]
+収集デーモンは --live-window を指定すると保存のたびに公開する。
+"""
+
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Deque, Dict, List, Optional, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from scripts.history_store import JST, _write_atomic, iter_snapshots, parse_jst, snapshot_key
+
+if TYPE_CHECKING:
+    from scripts.history_records import CompactHistory
+
+FORMAT_VERSION = 1
+MAGIC = b"KTLW"
+# マジック・バージョン・予約・JSON のヘッダーのバイト数
+PREFIX = struct.Struct("<4sHHI")
+ALIGN = 64
+POINTER_FILE = "live_window.json"
+SEGMENT_PREFIX = "kotogawa_live"
+WINDOW_HOURS = 120
+SHM_DIR = Path("/dev/shm")
+
+# 数値のメトリクス（スナップショット内の位置）
+METRICS: List[Tuple[str, str]] = [
+    ('dam', 'water_level'), ('dam', 'storage_rate'), ('dam', 'inflow'), ('dam', 'outflow'), ('dam', 'storage_change'),
+    ('river', 'water_level'), ('river', 'level_change'),
+    ('rainfall', 'hourly'), ('rainfall', 'cumulative'), ('rainfall', 'change'),
+]
+# 文字列のメトリクス
+TEXT_METRICS: List[Tuple[str, str]] = [('river', 'status')]
+
+
+def _aligned(offset: int) -> int:
+    return (offset + ALIGN - 1) // ALIGN * ALIGN
+
+
+def encode_window(snapshots: List[Dict[str, Any]], generation: str, window_hours: int = WINDOW_HOURS) -> bytes:
+    """スナップショット（観測時刻順）を領域の内容にする"""
+    import numpy as np
+    from scripts.history_records import ABSENT, NULL, PRESENT
+
+    rows = [(parse_jst(snapshot_key(snapshot)), snapshot) for snapshot in snapshots]
+    rows = [(data_dt, snapshot) for data_dt, snapshot in rows if data_dt is not None]
+    arrays: List[Tuple[Dict[str, Any], np.ndarray]] = []
+    arrays.append(({'path': ['data_time']},
+                   np.array([snapshot_key(snapshot).encode('utf-8') for _, snapshot in rows], dtype=np.bytes_)))
+    arrays.append(({'name': 'epoch_us'},
+                   np.array([int(data_dt.timestamp() * 1_000_000) for data_dt, _ in rows], dtype='<i8')))
+
+    def state_of(section: str, key: str) -> np.ndarray:
+        values = [snapshot.get(section) or {} for _, snapshot in rows]
+        return np.array([ABSENT if key not in value else (NULL if value[key] is None else PRESENT) for value in values],
+                        dtype=np.int8)
+
+    for section, key in METRICS:
+        values = [(snapshot.get(section) or {}).get(key) for _, snapshot in rows]
+        numbers = [value for value in values if isinstance(value, (int, float)) and not isinstance(value, bool)]
+        if numbers and all(isinstance(value, int) for value in numbers):
+            # 整数だけの項目（雨量の 0 など）は整数の列にする（ディスクから読んだ場合と同じ値・型になる）
+            numbers = np.array([value if isinstance(value, int) else 0 for value in values], dtype='<i8')
+        else:
+            numbers = np.array([value if isinstance(value, (int, float)) else np.nan for value in values], dtype='<f8')
+        arrays.append(({'path': [section, key]}, numbers))
+        arrays.append(({'state_of': [section, key]}, state_of(section, key)))
+    for section, key in TEXT_METRICS:
+        values = [(snapshot.get(section) or {}).get(key) for _, snapshot in rows]
+        texts = np.array([value.encode('utf-8') if isinstance(value, str) else b'' for value in values], dtype=np.bytes_)
+        arrays.append(({'path': [section, key]}, texts))
+        arrays.append(({'state_of': [section, key]}, state_of(section, key)))
+
+    # ヘッダーの長さはオフセットに依存するため、余裕を持った長さで2回作る
+    columns = [{**meta, 'dtype': array.dtype.str, 'offset': 0} for meta, array in arrays]
+    header = {'format_version': FORMAT_VERSION, 'generation': generation, 'rows': len(rows),
+              'window_hours': window_hours, 'written_at': datetime.now(JST).isoformat(), 'columns': columns}
+    reserved = len(json.dumps(header).encode('utf-8')) + 16 * len(columns) + 64
+    offset = _aligned(PREFIX.size + reserved)
+    for column, (_, array) in zip(columns, arrays):
+        column['offset'] = offset
+        offset = _aligned(offset + array.nbytes)
+    header_bytes = json.dumps(header).encode('utf-8').ljust(reserved)
+
+    buffer = bytearray(offset)
+    PREFIX.pack_into(buffer, 0, MAGIC, FORMAT_VERSION, 0, len(header_bytes))
+    buffer[PREFIX.size:PREFIX.size + len(header_bytes)] = header_bytes
+    for column, (_, array) in zip(columns, arrays):
+        buffer[column['offset']:column['offset'] + array.nbytes] = array.tobytes()
+    return bytes(buffer)
+
+
+class LiveWindow:
+    """マップした領域（配列はすべて領域のビューで、書き込みできない）"""
+
+    def __init__(self, buffer, segment: str, keepalive: Any = None):
+        import numpy as np
+        from scripts.history_records import CompactHistory
+
+        magic, version, _, header_len = PREFIX.unpack_from(buffer, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f"共有メモリ {segment} の形式が違います")
+        header = json.loads(bytes(buffer[PREFIX.size:PREFIX.size + header_len]).decode('utf-8'))
+        self.segment = segment
+        self.generation: str = header['generation']
+        self.rows: int = header['rows']
+        self.window_hours: int = header['window_hours']
+        self.nbytes = len(buffer)
+        # 領域（mmap / SharedMemory）は配列が参照している間は閉じない
+        self._buffer = buffer
+        self._keepalive = keepalive
+
+        values: Dict[Tuple[str, ...], Any] = {}
+        states: Dict[Tuple[str, ...], Any] = {}
+        for column in header['columns']:
+            array = np.frombuffer(buffer, dtype=np.dtype(column['dtype']), count=self.rows, offset=column['offset'])
+            array.flags.writeable = False
+            if 'path' in column:
+                values[tuple(column['path'])] = array
+            elif 'state_of' in column:
+                states[tuple(column['state_of'])] = array
+            elif column.get('name') == 'epoch_us':
+                self.epoch_us = array
+        self.history: "CompactHistory" = CompactHistory.from_arrays(
+            {path: (array, states.get(path)) for path, array in values.items()}
+        )
+
+    @property
+    def start(self) -> datetime:
+        """領域に含む期間の始まり（世代から window_hours 前）"""
+        return parse_jst(self.generation) - timedelta(hours=self.window_hours)
+
+    def covers(self, start: datetime) -> bool:
+        return start >= self.start
+
+    def between(self, start: datetime, end: datetime) -> "CompactHistory":
+        """観測時刻が [start, end] の行（配列のビュー、コピーしない）"""
+        import numpy as np
+
+        first = int(np.searchsorted(self.epoch_us, int(start.timestamp() * 1_000_000), side='left'))
+        last = int(np.searchsorted(self.epoch_us, int(end.timestamp() * 1_000_000), side='right'))
+        return self.history[first:last]
+
+
+def open_segment(segment: str) -> LiveWindow:
+    """領域を読み取り専用でマップする（/dev/shm がない環境では SharedMemory で開く）"""
+    shm_file = SHM_DIR / segment
+    if SHM_DIR.is_dir():
+        with open(shm_file, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return LiveWindow(mapped, segment, mapped)
+
+    from multiprocessing import resource_tracker, shared_memory
+
+    shm = shared_memory.SharedMemory(name=segment)
+    # 読む側のプロセスの終了時に領域が unlink されないよう、リソーストラッカーの登録を外す
+    try:
+        resource_tracker.unregister(shm._name, "shared_memory")
+    except Exception:
+        pass
+    return LiveWindow(shm.buf, segment, shm)
+
+
+class LiveWindowPublisher:
+    """ローダー側: スナップショットのたびに新しい領域を書き、ポインタを差し替える"""
+
+    def __init__(self, data_dir: Path, window_hours: int = WINDOW_HOURS, keep: int = 2):
+        self.data_dir = data_dir
+        self.window_hours = window_hours
+        self.pointer = data_dir / POINTER_FILE
+        # 作った領域（新しいものが後ろ）。読み途中のプロセスのため keep 個まで残す
+        self._segments: Deque[Any] = deque()
+        self.keep = keep
+        self._counter = 0
+
+    def publish(self, latest: Dict[str, Any]) -> Dict[str, Any]:
+        """latest を最新とする直近 window_hours 時間を公開する
+
+        Returns: ポインタの内容（segment, generation, rows, bytes）
+        """
+        from multiprocessing import shared_memory
+
+        generation = snapshot_key(latest)
+        end = parse_jst(generation)
+        snapshots = list(iter_snapshots(self.data_dir / "history", end - timedelta(hours=self.window_hours), end))
+        snapshots.sort(key=lambda item: snapshot_key(item))
+        content = encode_window(snapshots, generation, self.window_hours)
+
+        self._counter += 1
+        name = f"{SEGMENT_PREFIX}_{os.getpid()}_{int(time.time() * 1000)}_{self._counter}"
+        shm = shared_memory.SharedMemory(name=name, create=True, size=len(content))
+        shm.buf[:len(content)] = content
+        self._segments.append(shm)
+
+        pointer = {'segment': name, 'generation': generation, 'rows': len(snapshots),
+                   'bytes': len(content), 'written_at': datetime.now(JST).isoformat()}
+        _write_atomic(self.pointer, json.dumps(pointer, ensure_ascii=False, indent=2).encode('utf-8'))
+        while len(self._segments) > self.keep:
+            self._unlink(self._segments.popleft())
+        return pointer
+
+    @staticmethod
+    def _unlink(shm) -> None:
+        shm.close()
+        try:
+            shm.unlink()
+        except FileNotFoundError:
+            pass
+
+    def close(self) -> None:
+        """ポインタを消し、作った領域をすべて unlink する"""
+        try:
+            pointer = json.loads(self.pointer.read_text(encoding='utf-8'))
+            if any(shm.name == pointer.get('segment') for shm in self._segments):
+                self.pointer.unlink()
+        except (OSError, ValueError):
+            pass
+        while self._segments:
+            self._unlink(self._segments.popleft())
+
+
+_current_lock = threading.Lock()
+_current: Dict[Path, Tuple[int, Optional[LiveWindow]]] = {}
+
+
+def current(data_dir: Path) -> Optional[LiveWindow]:
+    """公開中の直近の履歴（ポインタが latest.json より古い・領域がなければ None）
+
+    ポインタの更新時刻が変わるまでは同じマップを使う（プロセスで1つ）。
+    """
+    pointer = data_dir / POINTER_FILE
+    try:
+        pointer_mtime = pointer.stat().st_mtime_ns
+        if pointer_mtime < (data_dir / "latest.json").stat().st_mtime_ns:
+            return None
+    except OSError:
+        return None
+    with _current_lock:
+        cached = _current.get(data_dir)
+        if cached is not None and cached[0] == pointer_mtime:
+            return cached[1]
+        try:
+            window = open_segment(json.loads(pointer.read_text(encoding='utf-8'))['segment'])
+        except (OSError, ValueError, KeyError):
+            window = None
+        _current[data_dir] = (pointer_mtime, window)
+        return window
+
+
+def serve(data_dir: Path, interval: float) -> None:
+    """latest.json が変わるたびに公開する（Ctrl-C で終了し、領域を unlink する）"""
+    publisher = LiveWindowPublisher(data_dir)
+    latest_file = data_dir / "latest.json"
+    published_mtime = None
+    try:
+        while True:
+            try:
+                mtime = latest_file.stat().st_mtime_ns
+            except OSError:
+                mtime = None
+            if mtime is not None and mtime != published_mtime:
+                latest = json.loads(latest_file.read_text(encoding='utf-8'))
+                started = time.perf_counter()
+                pointer = publisher.publish(latest)
+                published_mtime = mtime
+                print(f"{pointer['generation']}: {pointer['rows']}行, {pointer['bytes'] / 1024:,.0f}KB "
+                      f"({(time.perf_counter() - started) * 1000:.0f}ms) → {pointer['segment']}", flush=True)
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        publisher.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="直近の履歴の共有メモリ")
+    parser.add_argument("command", choices=("serve", "show"))
+    parser.add_argument("--data-dir", type=Path, default=ROOT / "data")
+    parser.add_argument("--interval", type=float, default=5.0, help="serve: latest.json を確認する間隔（秒）")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        serve(args.data_dir, args.interval)
+        return
+    window = current(args.data_dir)
+    if window is None:
+        print("公開中の共有メモリはありません（serve を起動するか、収集デーモンを --live-window 付きで起動してください）")
+        sys.exit(1)
+    print(f"{window.segment}: 世代 {window.generation}, {window.rows}行（直近{window.window_hours}時間）, "
+          f"{window.nbytes / 1024:,.0f}KB")
+    if window.rows:
+        print(json.dumps(window.history[-1].to_dict(), ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+"""
+再実行ごとのメモリ計測（tracemalloc）
+環境変数 KOTOGAWA_MEMPROFILE に出力先ディレクトリ（"1" で logs/memprofile）を指定すると、
+アプリの再実行の前後で tracemalloc のスナップショットを取り、次を記録する。
+
+- 再実行の間に確保され、終了時点でも残っているメモリ（アプリの関数ごと・確保した行ごと）
+- st.cache_data / st.cache_resource のキャッシュごとの大きさと、セッション状態の大きさ
+- DUMP_EVERY 回ごとのスナップショット（compare で任意の2時点を比較できる）
+
+記録は <出力先>/reruns.ndjson に1行ずつ追記する。確保元はトレースバックをさかのぼり、
+このリポジトリ内で最も内側の関数に割り当てる（キャッシュからの復元など Streamlit 内部の確保も、
+呼び出したアプリの関数に計上される）。複数セッションが同時に再実行すると、その確保も差分に含まれる。
+
+tracemalloc 自体が重い（再実行が数倍〜数十倍遅くなる）ため、計測用の環境でのみ有効にする。
+アプリの関数に届かない確保は「リポジトリ外の行」として計上される（KOTOGAWA_MEMPROFILE_FRAMES で深さを調整）。
+
+使い方:
+    KOTOGAWA_MEMPROFILE=logs/memprofile streamlit run streamlit_app_old.py
+    python scripts/memprofile.py report [logs/memprofile]
+    python scripts/memprofile.py compare [前.tmsnap] [後.tmsnap] [--dir logs/memprofile] [--top 20]
+"""
+
+import argparse
+import ast
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+MEMPROFILE_ENV = "KOTOGAWA_MEMPROFILE"
+DEFAULT_DIR = ROOT / "logs" / "memprofile"
+REPORT_FILE = "reruns.ndjson"
+FRAMES_ENV = "KOTOGAWA_MEMPROFILE_FRAMES"
+# スナップショットに残すフレーム数。深いほど Streamlit・Plotly の内部からアプリの関数までたどれるが、
+# 確保のたびにフレームを記録するため再実行が遅くなる（手元では 1:約3倍、10:約25倍、30:約45倍）
+NFRAMES = 10
+TOP = 15
+# この回数の再実行ごとにスナップショットを保存する
+DUMP_EVERY = 20
+
+# 計測自体（このモジュール・tracemalloc）の確保は集計から除く
+_IGNORED = (__file__, tracemalloc.__file__)
+
+
+def profile_dir() -> Optional[Path]:
+    """計測が有効なら出力先ディレクトリ"""
+    value = os.environ.get(MEMPROFILE_ENV, "").strip()
+    if not value or value == "0":
+        return None
+    return DEFAULT_DIR if value == "1" else Path(value)
+
+
+@lru_cache(maxsize=None)
+def _function_ranges(filename: str) -> Tuple[Tuple[int, int, str], ...]:
+    """ファイル内の関数の (開始行, 終了行, 修飾名)（内側の関数ほど後ろ）"""
+    try:
+        tree = ast.parse(Path(filename).read_text(encoding='utf-8'))
+    except (OSError, SyntaxError, ValueError):
+        return ()
+    ranges = []
+
+    def visit(node: ast.AST, prefix: str) -> None:
+        for child in ast.iter_child_nodes(node):
+            if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                name = f"{prefix}{child.name}"
+                if not isinstance(child, ast.ClassDef):
+                    ranges.append((child.lineno, child.end_lineno or child.lineno, name))
+                visit(child, f"{name}.")
+    visit(tree, "")
+    return tuple(sorted(ranges, key=lambda item: (item[0], -item[1])))
+
+
+def function_at(filename: str, lineno: int) -> str:
+    """ファイル名と行番号から、その行を含む最も内側の関数名"""
+    name = "<module>"
+    for start, end, qualname in _function_ranges(filename):
+        if start <= lineno <= end:
+            name = qualname
+    return name
+
+
+def _own_frame(traceback: tracemalloc.Traceback) -> Optional[tracemalloc.Frame]:
+    """トレースバックのうち、このリポジトリ内で最も内側のフレーム"""
+    root = str(ROOT)
+    for frame in reversed(traceback):
+        if frame.filename.startswith(root) and "site-packages" not in frame.filename:
+            return frame
+    return None
+
+
+def site_label(traceback: tracemalloc.Traceback) -> Tuple[str, str]:
+    """(関数, 確保した行) のラベル。リポジトリ外のみのときは最も内側の行（関数名は解析しない）"""
+    frame = _own_frame(traceback)
+    if frame is None:
+        # リポジトリ外はライブラリ内のパスで表す（例: _plotly_utils/utils.py:513）
+        filename = traceback[-1].filename
+        line = f"{filename.rsplit('site-packages' + os.sep, 1)[-1]}:{traceback[-1].lineno}"
+        return line, line
+    relative = os.path.relpath(frame.filename, ROOT)
+    return f"{relative}:{function_at(frame.filename, frame.lineno)}", f"{relative}:{frame.lineno}"
+
+
+def _ignored(traceback: tracemalloc.Traceback) -> bool:
+    return any(frame.filename in _IGNORED for frame in traceback)
+
+
+def attribute(before: tracemalloc.Snapshot, after: tracemalloc.Snapshot, top: int = TOP) -> Dict[str, Any]:
+    """2つのスナップショットの差分を、関数ごと・行ごとにまとめる"""
+    diff = [stat for stat in after.compare_to(before, 'traceback') if stat.size_diff and not _ignored(stat.traceback)]
+    functions: Dict[str, List[int]] = {}
+    sites: Dict[str, List[int]] = {}
+    for stat in diff:
+        function, line = site_label(stat.traceback)
+        for table, key in ((functions, function), (sites, line)):
+            entry = table.setdefault(key, [0, 0])
+            entry[0] += stat.size_diff
+            entry[1] += stat.count_diff
+
+    def ranked(table: Dict[str, List[int]], label: str) -> List[Dict[str, Any]]:
+        rows = sorted(table.items(), key=lambda item: abs(item[1][0]), reverse=True)[:top]
+        return [{label: key, 'size_diff_kb': round(size / 1024, 1), 'count_diff': count} for key, (size, count) in rows]
+
+    return {
+        'total_diff_kb': round(sum(stat.size_diff for stat in diff) / 1024, 1),
+        'functions': ranked(functions, 'function'),
+        'sites': ranked(sites, 'site')
+    }
+
+
+def cache_sizes() -> List[Dict[str, Any]]:
+    """キャッシュ・セッション状態ごとのバイト数（Streamlit の統計から）
+
+    st.cache_data はシリアライズ後の大きさ。st.cache_resource は
+    server.enableExpensiveMemoryStats が無効だと件数しか分からない（size_kb は None、entries に件数）。
+    """
+    from streamlit import config
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.caching import get_data_cache_stats_provider, get_resource_cache_stats_provider
+    from streamlit.runtime.stats import CacheStat
+
+    stats = []
+    for provider in (get_data_cache_stats_provider(), get_resource_cache_stats_provider()):
+        for family_stats in provider.get_stats().values():
+            stats.extend(family_stats)
+    # セッション状態はサーバーの統計にしかない（AppTest などでは空）
+    if Runtime.exists():
+        for family_stats in Runtime.instance().stats_mgr.get_stats().values():
+            stats.extend(stat for stat in family_stats if isinstance(stat, CacheStat)
+                         and stat.category_name not in ("st_cache_data", "st_cache_resource"))
+
+    expensive = config.get_option("server.enableExpensiveMemoryStats")
+    groups: Dict[Tuple[str, str], int] = {}
+    for stat in stats:
+        key = (stat.category_name, stat.cache_name)
+        groups[key] = groups.get(key, 0) + stat.byte_length
+    rows = []
+    for (category, name), size in sorted(groups.items(), key=lambda item: item[1], reverse=True):
+        counted_only = category == "st_cache_resource" and not expensive
+        rows.append({'category': category, 'cache': name,
+                     'entries': size if counted_only else None,
+                     'size_kb': None if counted_only else round(size / 1024, 1)})
+    return rows
+
+
+def active_sessions() -> Optional[int]:
+    """サーバーで実行中なら接続中のセッション数"""
+    from streamlit.runtime import Runtime
+
+    if not Runtime.exists():
+        return None
+    session_mgr = getattr(Runtime.instance(), '_session_mgr', None)
+    return session_mgr.num_active_sessions() if session_mgr is not None else None
+
+
+class RerunProfiler:
+    """再実行の前後でスナップショットを取り、差分とキャッシュの大きさを記録する"""
+
+    def __init__(self, output_dir: Path):
+        self.output_dir = output_dir
+        self._lock = threading.Lock()
+        self._reruns = 0
+        self._local = threading.local()
+        self.last_report: Optional[Dict[str, Any]] = None
+
+    def begin(self) -> None:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(int(os.environ.get(FRAMES_ENV, NFRAMES)))
+        self._local.started = time.perf_counter()
+        self._local.before = tracemalloc.take_snapshot()
+
+    def end(self, app: str) -> Optional[Dict[str, Any]]:
+        before = getattr(self._local, 'before', None)
+        if before is None:
+            return None
+        self._local.before = None
+        rerun_ms = (time.perf_counter() - self._local.started) * 1000
+        after = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        with self._lock:
+            self._reruns += 1
+            rerun = self._reruns
+
+        report = {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'app': app,
+            'rerun': rerun,
+            'rerun_ms': round(rerun_ms, 1),
+            'traced_kb': round(current / 1024, 1),
+            'peak_kb': round(peak / 1024, 1),
+            'sessions': active_sessions(),
+            'retained': attribute(before, after),
+            'caches': cache_sizes()
+        }
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        if rerun == 1 or rerun % DUMP_EVERY == 0:
+            snapshot_path = self.output_dir / f"rerun-{rerun:06d}.tmsnap"
+            after.filter_traces([tracemalloc.Filter(False, name, all_frames=True) for name in _IGNORED]).dump(str(snapshot_path))
+            report['snapshot'] = snapshot_path.name
+        with self._lock:
+            with open(self.output_dir / REPORT_FILE, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(report, ensure_ascii=False) + "\n")
+            self.last_report = report
+        return report
+
+
+_profiler_lock = threading.Lock()
+_profiler: Optional[RerunProfiler] = None
+
+
+def profiler() -> Optional[RerunProfiler]:
+    """計測が有効ならプロセスで共有する RerunProfiler"""
+    global _profiler
+    output_dir = profile_dir()
+    if output_dir is None:
+        return None
+    with _profiler_lock:
+        if _profiler is None:
+            _profiler = RerunProfiler(output_dir)
+    return _profiler
+
+
+@contextmanager
+def rerun(app: str) -> Iterator[None]:
+    """with rerun("アプリ名"): で囲んだ再実行を計測する（無効なら何もしない）"""
+    active = profiler()
+    if active is None:
+        yield
+        return
+    active.begin()
+    try:
+        yield
+    finally:
+        active.end(app)
+
+
+def last_report() -> Optional[Dict[str, Any]]:
+    """直近の再実行の記録（画面表示用）"""
+    return _profiler.last_report if _profiler is not None else None
+
+
+def compare_snapshots(before_path: Path, after_path: Path, top: int = TOP) -> Dict[str, Any]:
+    """保存した2つのスナップショットを比較する"""
+    before = tracemalloc.Snapshot.load(str(before_path))
+    after = tracemalloc.Snapshot.load(str(after_path))
+    return attribute(before, after, top)
+
+
+def print_attribution(result: Dict[str, Any]) -> None:
+    print(f"増減の合計: {result['total_diff_kb']:+,.1f} KB")
+    for title, rows, key in (("関数", result['functions'], 'function'), ("確保した行", result['sites'], 'site')):
+        print(f"\n{title}:")
+        for row in rows:
+            print(f"  {row['size_diff_kb']:>+12,.1f} KB {row['count_diff']:>+9,d}  {row[key]}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="再実行ごとのメモリ計測の集計")
+    sub = parser.add_subparsers(dest="command", required=True)
+    report = sub.add_parser("report", help="直近の再実行の記録を表示")
+    report.add_argument("dir", nargs="?", type=Path, default=DEFAULT_DIR)
+    compare = sub.add_parser("compare", help="2時点のスナップショットを比較（省略時は最初と最後）")
+    compare.add_argument("before", nargs="?", type=Path)
+    compare.add_argument("after", nargs="?", type=Path)
+    compare.add_argument("--dir", type=Path, default=DEFAULT_DIR)
+    compare.add_argument("--top", type=int, default=TOP)
+    args = parser.parse_args()
+
+    if args.command == "report":
+        report_path = args.dir / REPORT_FILE
+        if not report_path.exists():
+            parser.error(f"{report_path} がありません（{MEMPROFILE_ENV} を指定してアプリを起動してください）")
+        lines = report_path.read_text(encoding='utf-8').splitlines()
+        latest = json.loads(lines[-1])
+        print(f"{latest['time']} {latest['app']} 再実行 {latest['rerun']}回目 ({latest['rerun_ms']:.0f}ms) "
+              f"tracemalloc {latest['traced_kb'] / 1024:,.1f} MB（ピーク {latest['peak_kb'] / 1024:,.1f} MB）"
+              f" セッション {latest['sessions'] if latest['sessions'] is not None else '-'}")
+        print("\n再実行後も残っている確保:")
+        print_attribution(latest['retained'])
+        print("\nキャッシュ:")
+        for row in latest['caches']:
+            size = f"{row['size_kb']:>12,.1f} KB" if row['size_kb'] is not None else f"{row['entries']:>13,d}件"
+            print(f"  {size}  {row['category']} {row['cache']}")
+        return
+
+    before, after = args.before, args.after
+    if before is None or after is None:
+        dumps = sorted(args.dir.glob("rerun-*.tmsnap"))
+        if len(dumps) < 2:
+            parser.error(f"{args.dir} に比較できるスナップショットが2つ以上ありません")
+        before, after = before or dumps[0], after or dumps[-1]
+    print(f"{before.name} → {after.name}")
+    print_attribution(compare_snapshots(before, after, args.top))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+"""
+ローテーション付きの NDJSON ログ
+クリーンアップの結果・収集間隔の判断・リプレイの書き込みと描画など、1回ごとの記録を1行ずつ追記する。
+ファイルが一定サイズを超えたら name.1.ndjson ... name.N.ndjson に送り、ログが無制限に増えないようにする。
+"""
+
+import json
+from pathlib import Path
+from typing import Any, Dict
+
+# ログのローテーション設定
+LOG_MAX_BYTES = 256 * 1024
+LOG_BACKUPS = 3
+
+
+def append_log(log_file: Path, record: Dict[str, Any], max_bytes: int = LOG_MAX_BYTES, backups: int = LOG_BACKUPS) -> None:
+    """NDJSONログに1行追記（max_bytes を超えたら <名前>.1.ndjson ... にローテーション）"""
+    log_file.parent.mkdir(parents=True, exist_ok=True)
+    if log_file.exists() and log_file.stat().st_size >= max_bytes:
+        for i in range(backups - 1, 0, -1):
+            src = log_file.with_name(f"{log_file.stem}.{i}{log_file.suffix}")
+            if src.exists():
+                src.replace(log_file.with_name(f"{log_file.stem}.{i + 1}{log_file.suffix}"))
+        log_file.replace(log_file.with_name(f"{log_file.stem}.1{log_file.suffix}"))
+    with open(log_file, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n')
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+記録データのリプレイ
+履歴（data/history）や取り込み用CSVのスナップショットを、模擬時計に合わせて別のデータディレクトリへ
+latest.json / 履歴として書き込む。アプリを KOTOGAWA_DATA_DIR と KOTOGAWA_CLOCK_FILE を指定して起動すると、
+ライブと同じ経路（キャッシュ・警戒判定・自動更新）で洪水時のデータを再生できる。
+
+各スナップショットは模擬時刻が data_time + publish_delay に達した時点で書き込む。書き込み時刻とアプリの描画時刻は
+<data-dir>/logs/ に記録され、--report で書き込みから描画までの遅延を集計できる。
+
+使い方:
+    python scripts/replay.py --data-dir /tmp/replay --csv sample/dam_*.csv sample/water-level_*.csv --speed 60
+    KOTOGAWA_DATA_DIR=/tmp/replay KOTOGAWA_CLOCK_FILE=/tmp/replay/replay_clock.json streamlit run streamlit_app.py
+    python scripts/replay.py --data-dir /tmp/replay --report
+"""
+
+import argparse
+import json
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from scripts.clock import write_clock_file
+from scripts.history_store import (
+    HISTORY_WRITE_MODES, iter_day_dirs, load_day_snapshots, parse_jst, snapshot_key, write_snapshots
+)
+from scripts.ndjson_log import append_log
+
+PUBLISH_LOG = Path("logs") / "replay.ndjson"
+RENDER_LOG = Path("logs") / "replay_render.ndjson"
+CLOCK_FILE = "replay_clock.json"
+
+
+def load_history_snapshots(history_dir: Path, start: Optional[datetime], end: Optional[datetime]) -> List[Dict[str, Any]]:
+    """履歴から期間内のスナップショットを時刻順に読み込む"""
+    snapshots = []
+    for day_dir in iter_day_dirs(history_dir):
+        day_snapshots, _ = load_day_snapshots(day_dir)
+        snapshots.extend(day_snapshots)
+    return _in_range(snapshots, start, end)
+
+
+def load_csv_snapshots(paths: List[Path], start: Optional[datetime], end: Optional[datetime]) -> List[Dict[str, Any]]:
+    """取り込み用CSVからスナップショットを作る"""
+    from scripts.import_csv import frame_to_snapshots, load_exports, merge_series
+
+    dam, river, _ = load_exports(paths)
+    return _in_range(frame_to_snapshots(merge_series(dam, river)), start, end)
+
+
+def _in_range(snapshots: List[Dict[str, Any]], start: Optional[datetime], end: Optional[datetime]) -> List[Dict[str, Any]]:
+    selected = []
+    for data in snapshots:
+        data_dt = parse_jst(snapshot_key(data))
+        if data_dt is None or (start and data_dt < start) or (end and data_dt > end):
+            continue
+        selected.append(data)
+    selected.sort(key=snapshot_key)
+    return selected
+
+
+def publish(data_dir: Path, data: Dict[str, Any], history_mode: str) -> None:
+    """latest.json の置き換えと履歴への追加（収集デーモンと同じ書き込み）"""
+    from scripts.collector.runner import publish_snapshot
+
+    publish_snapshot(data_dir, data, history_mode)
+
+
+def record_render(data_dir: Path, data_time: Optional[str], run_ms: float) -> None:
+    """アプリが描画したスナップショットの時刻を記録（リプレイ中のみアプリから呼ばれる）"""
+    append_log(data_dir / RENDER_LOG, {
+        'data_time': data_time,
+        'rendered_at': time.time(),
+        'run_ms': round(run_ms, 2)
+    })
+
+
+def run_replay(snapshots: List[Dict[str, Any]], data_dir: Path, speed: float, publish_delay: timedelta,
+               prefill: timedelta, history_mode: str = "ndjson") -> Dict[str, Any]:
+    """模擬時計を起動し、各スナップショットを公開時刻に書き込む"""
+    if not snapshots:
+        raise ValueError("リプレイするスナップショットがありません")
+
+    data_dir.mkdir(parents=True, exist_ok=True)
+    first_dt = parse_jst(snapshot_key(snapshots[0]))
+    # 期間が短い場合も最後のスナップショットは再生する
+    prefill_end = min(first_dt + prefill, parse_jst(snapshot_key(snapshots[-1])))
+    before = [data for data in snapshots if parse_jst(snapshot_key(data)) < prefill_end]
+    replayed = snapshots[len(before):]
+
+    # 開始前の期間は一括で書き込み、グラフに表示できる履歴を用意する
+    if before:
+        write_snapshots(data_dir / "history", before[:-1], history_mode)
+        publish(data_dir, before[-1], history_mode)
+
+    clock = write_clock_file(data_dir / CLOCK_FILE, prefill_end + publish_delay, speed)
+    print(f"模擬時計: {clock.sim_start.isoformat()} から {speed:g} 倍速 / {len(replayed)} 件を再生")
+
+    for data in replayed:
+        sim_publish = parse_jst(snapshot_key(data)) + publish_delay
+        wait = clock.real_time_of(sim_publish) - time.time()
+        if wait > 0:
+            time.sleep(wait)
+        started = time.perf_counter()
+        publish(data_dir, data, history_mode)
+        append_log(data_dir / PUBLISH_LOG, {
+            'data_time': snapshot_key(data),
+            'published_at': time.time(),
+            'lag_ms': round(max(-wait, 0) * 1000, 2),
+            'write_ms': round((time.perf_counter() - started) * 1000, 2),
+            'river_status': (data.get('river') or {}).get('status')
+        })
+    return {'prefilled': len(before), 'replayed': len(replayed), 'speed': speed}
+
+
+def _read_log(path: Path) -> List[Dict[str, Any]]:
+    records = []
+    if path.exists():
+        with open(path, 'r', encoding='utf-8') as f:
+            records = [json.loads(line) for line in f if line.strip()]
+    return records
+
+
+def latency_report(data_dir: Path) -> Dict[str, Any]:
+    """書き込みから、そのスナップショットを最初に描画するまでの遅延"""
+    published = {record['data_time']: record['published_at'] for record in _read_log(data_dir / PUBLISH_LOG)}
+    first_render = {}
+    run_ms = []
+    for record in _read_log(data_dir / RENDER_LOG):
+        run_ms.append(record['run_ms'])
+        key = record.get('data_time')
+        if key in published and key not in first_render:
+            first_render[key] = record['rendered_at']
+
+    latencies = sorted((first_render[key] - published[key]) * 1000 for key in first_render)
+
+    def pick(q: float) -> Optional[float]:
+        return round(latencies[min(int(q * len(latencies)), len(latencies) - 1)], 1) if latencies else None
+
+    return {
+        'published': len(published),
+        'rendered': len(first_render),
+        'never_rendered': len(published) - len(first_render),
+        'latency_ms': {
+            'p50': pick(0.50),
+            'p95': pick(0.95),
+            'max': round(latencies[-1], 1) if latencies else None,
+            'mean': round(statistics.mean(latencies), 1) if latencies else None
+        },
+        'run_ms_p50': round(statistics.median(run_ms), 1) if run_ms else None
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="記録データを模擬時計に合わせて再生する")
+    parser.add_argument("--data-dir", type=Path, required=True, help="再生先のデータディレクトリ（本番の data/ 以外）")
+    parser.add_argument("--history-dir", type=Path, help="再生する履歴（data/history など）")
+    parser.add_argument("--csv", nargs="+", type=Path, help="再生するCSV（dam_*.csv / water-level_*.csv）")
+    parser.add_argument("--start", help="再生開始時刻（ISO形式、JST）")
+    parser.add_argument("--end", help="再生終了時刻（ISO形式、JST）")
+    parser.add_argument("--speed", type=float, default=60.0, help="倍速（60 なら10分間のデータが10秒ごと）")
+    parser.add_argument("--publish-delay", type=float, default=3.0, help="観測時刻から書き込みまでの模擬時間（分）")
+    parser.add_argument("--prefill-hours", type=float, default=24.0, help="再生前に一括で書き込む期間（時間）")
+    parser.add_argument("--history-mode", choices=HISTORY_WRITE_MODES, default="ndjson")
+    parser.add_argument("--report", action="store_true", help="書き込みから描画までの遅延を集計して終了")
+    args = parser.parse_args()
+
+    production_dir = (Path(__file__).resolve().parent.parent / "data").resolve()
+    if args.data_dir.resolve() == production_dir:
+        parser.error("本番の data/ には再生できません。別のディレクトリを指定してください")
+
+    if args.report:
+        print(json.dumps(latency_report(args.data_dir), ensure_ascii=False, indent=2))
+        return
+
+    start = parse_jst(args.start) if args.start else None
+    end = parse_jst(args.end) if args.end else None
+    if args.csv:
+        snapshots = load_csv_snapshots(args.csv, start, end)
+    elif args.history_dir:
+        snapshots = load_history_snapshots(args.history_dir, start, end)
+    else:
+        parser.error("--history-dir または --csv を指定してください")
+
+    result = run_replay(snapshots, args.data_dir, args.speed, timedelta(minutes=args.publish_delay),
+                        timedelta(hours=args.prefill_hours), args.history_mode)
+    print(json.dumps(result, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
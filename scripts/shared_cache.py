@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+複数の Streamlit プロセスで共有するディスクキャッシュ（SQLite）
+ロードバランサーの後ろで複数のプロセスを動かすと、st.cache_data・st.cache_resource はプロセスごとのため、
+新しい観測が届くたびに各プロセスが同じ履歴を読み込み、同じグラフを作る。
+このキャッシュは観測時刻（世代）をキーに含めたエントリを1つの SQLite ファイルに置き、
+最初に計算したプロセスが書き込んだ結果を他のプロセスが読む。
+
+- 値はバイト列（履歴は pickle、グラフは Plotly の JSON など、呼び出し側で変換する）
+- 同じキーを複数のプロセスが同時に計算しないよう、計算中はリース（有効期限つきの予約）を取る。
+  リースを取れなかったプロセスは結果が書き込まれるまで待つ（リースが切れたら自分で計算する）
+- 合計サイズが max_bytes を超えたら、最後に読まれた時刻が古いものから削除する（LRU）
+- SQLite は WAL モードで開き、接続はスレッドごとに持つ（Streamlit はセッションごとに別スレッドで実行する）
+
+環境変数 KOTOGAWA_SHARED_CACHE にファイルのパスを指定すると有効になる（"1" なら data/cache/shared.sqlite）。
+KOTOGAWA_SHARED_CACHE_MB で上限（既定 256MB）を変えられる。
+
+使い方:
+    python scripts/shared_cache.py stats [path]
+    python scripts/shared_cache.py clear [path]
+"""
+
+import argparse
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+SHARED_CACHE_ENV = "KOTOGAWA_SHARED_CACHE"
+MAX_MB_ENV = "KOTOGAWA_SHARED_CACHE_MB"
+DEFAULT_MAX_MB = 256
+# 計算中のリースの有効期限（秒）と、他のプロセスの計算を待つ間隔
+LEASE_SECONDS = 60.0
+POLL_INTERVAL = 0.05
+# 読み込みのたびに最終アクセス時刻を書き込まない（この秒数以内なら更新しない）
+TOUCH_AFTER = 5.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    generation TEXT NOT NULL,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    created REAL NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed);
+CREATE TABLE IF NOT EXISTS leases (
+    key TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    expires REAL NOT NULL
+);
+"""
+
+
+class SharedCache:
+    """SQLite ファイル1つを複数のプロセス・スレッドで共有するキャッシュ"""
+
+    def __init__(self, path: Path, max_bytes: int = DEFAULT_MAX_MB * 1024 * 1024):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        # このプロセスでの回数: hit / computed（自分で計算）/ waited（他のプロセスの結果を待って読んだ）
+        self._stats: Dict[str, int] = {'hit': 0, 'miss': 0, 'computed': 0, 'waited': 0, 'evicted': 0}
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._connect().executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def _count(self, name: str, amount: int = 1) -> None:
+        with self._stats_lock:
+            self._stats[name] += amount
+
+    def get(self, key: str) -> Optional[bytes]:
+        """値を読む（なければ None）"""
+        connection = self._connect()
+        row = connection.execute("SELECT value, accessed FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        now = time.time()
+        if now - row[1] > TOUCH_AFTER:
+            connection.execute("UPDATE entries SET accessed = ? WHERE key = ?", (now, key))
+        return row[0]
+
+    def put(self, key: str, generation: str, value: bytes) -> None:
+        """値を書き込む（同じキーがあれば置き換える）。上限を超えたら古いものから削除する"""
+        now = time.time()
+        connection = self._connect()
+        connection.execute(
+            "INSERT OR REPLACE INTO entries (key, generation, value, size, created, accessed) VALUES (?, ?, ?, ?, ?, ?)",
+            (key, generation, sqlite3.Binary(value), len(value), now, now)
+        )
+        self._evict(connection)
+
+    def _evict(self, connection: sqlite3.Connection) -> None:
+        total = connection.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        evicted = 0
+        for key, size in connection.execute("SELECT key, size FROM entries ORDER BY accessed").fetchall():
+            if total <= self.max_bytes:
+                break
+            connection.execute("DELETE FROM entries WHERE key = ?", (key,))
+            total -= size
+            evicted += 1
+        self._count('evicted', evicted)
+
+    def _claim(self, key: str) -> bool:
+        """計算のリースを取る（期限切れのリースは取り直せる）"""
+        now = time.time()
+        cursor = self._connect().execute(
+            "INSERT INTO leases (key, owner, expires) VALUES (?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET owner = excluded.owner, expires = excluded.expires "
+            "WHERE leases.expires < ?",
+            (key, self.owner, now + LEASE_SECONDS, now)
+        )
+        return cursor.rowcount == 1
+
+    def _release(self, key: str) -> None:
+        self._connect().execute("DELETE FROM leases WHERE key = ? AND owner = ?", (key, self.owner))
+
+    def _leased(self, key: str) -> bool:
+        row = self._connect().execute("SELECT expires FROM leases WHERE key = ?", (key,)).fetchone()
+        return row is not None and row[0] >= time.time()
+
+    def get_or_compute(self, key: str, generation: str, compute: Callable[[], bytes],
+                       wait: float = LEASE_SECONDS) -> bytes:
+        """値を読み、なければ計算して書き込む（他のプロセスが計算中なら、その結果を待つ）"""
+        value = self.get(key)
+        if value is not None:
+            self._count('hit')
+            return value
+        self._count('miss')
+
+        deadline = time.monotonic() + wait
+        while not self._claim(key):
+            # 他のプロセスが計算中: 書き込まれるかリースが切れるまで待つ
+            time.sleep(POLL_INTERVAL)
+            value = self.get(key)
+            if value is not None:
+                self._count('waited')
+                return value
+            if time.monotonic() > deadline or not self._leased(key):
+                break
+        try:
+            # リースを取る間に書き込まれていれば計算しない
+            value = self.get(key)
+            if value is not None:
+                self._count('waited')
+                return value
+            value = compute()
+            self.put(key, generation, value)
+            self._count('computed')
+            return value
+        finally:
+            self._release(key)
+
+    def stats(self) -> Dict[str, int]:
+        """このプロセスでの回数と、ファイル全体のエントリ数・合計サイズ"""
+        entries, total = self._connect().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        with self._stats_lock:
+            return {**self._stats, 'entries': entries, 'bytes': total}
+
+    def clear(self) -> None:
+        connection = self._connect()
+        connection.execute("DELETE FROM entries")
+        connection.execute("DELETE FROM leases")
+
+
+def cache_path(default_dir: Path) -> Optional[Path]:
+    """有効ならキャッシュファイルのパス"""
+    value = os.environ.get(SHARED_CACHE_ENV, "").strip()
+    if not value or value == "0":
+        return None
+    return default_dir / "cache" / "shared.sqlite" if value == "1" else Path(value)
+
+
+_caches_lock = threading.Lock()
+_caches: Dict[Path, SharedCache] = {}
+
+
+def get_cache(default_dir: Path) -> Optional[SharedCache]:
+    """KOTOGAWA_SHARED_CACHE が指定されていれば、プロセスで共有する SharedCache（ファイルごとに1つ）"""
+    path = cache_path(default_dir)
+    if path is None:
+        return None
+    with _caches_lock:
+        if path not in _caches:
+            max_mb = float(os.environ.get(MAX_MB_ENV, DEFAULT_MAX_MB))
+            _caches[path] = SharedCache(path, int(max_mb * 1024 * 1024))
+        return _caches[path]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="共有ディスクキャッシュの確認・削除")
+    parser.add_argument("command", choices=("stats", "clear"))
+    parser.add_argument("path", nargs="?", type=Path,
+                        default=Path(__file__).resolve().parent.parent / "data" / "cache" / "shared.sqlite")
+    args = parser.parse_args()
+    if not args.path.exists():
+        parser.error(f"{args.path} がありません")
+
+    cache = SharedCache(args.path)
+    if args.command == "clear":
+        cache.clear()
+        print(f"{args.path} を空にしました")
+        return
+    stats = cache.stats()
+    print(f"{args.path}: {stats['entries']} 件, {stats['bytes'] / 1024 / 1024:,.1f} MB")
+    rows = cache._connect().execute(
+        "SELECT generation, COUNT(*), SUM(size) FROM entries GROUP BY generation ORDER BY generation DESC LIMIT 10"
+    ).fetchall()
+    for generation, count, size in rows:
+        print(f"  {generation}: {count} 件, {size / 1024:,.0f} KB")
+
+
+if __name__ == "__main__":
+    main()
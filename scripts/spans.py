@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+画面の処理時間の計測（スパン）
+履歴の読み込み・グラフ作成・メトリクス表示などの区間を @traced / span() で囲み、
+再実行（rerun）ごとの所要時間・回数と、プロセス全体の直近の分布（p50/p95）を記録する。
+
+- 再実行ごとの記録はスレッドごとに持つ（Streamlit はセッションのスクリプトを別スレッドで実行する）
+- 分布は区間名ごとに直近 WINDOW 件を保持し、Prometheus テキスト形式 / OpenMetrics で出力する
+- 環境変数 KOTOGAWA_METRICS_PORT を指定すると、そのポートで GET /metrics を返す（既定は無効）
+
+計測自体のコストは time.perf_counter 2回と deque への追加のみ。
+"""
+
+import functools
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Tuple
+
+METRICS_PORT_ENV = "KOTOGAWA_METRICS_PORT"
+METRIC_PREFIX = "kotogawa"
+# 区間ごとに保持する直近の件数（p50/p95 の算出対象）
+WINDOW = 500
+QUANTILES = (0.5, 0.95)
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+OPENMETRICS_CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+
+class SpanRegistry:
+    """区間名 → 直近の所要時間（秒）と累計"""
+
+    def __init__(self, window: int = WINDOW):
+        self.window = window
+        self._lock = threading.Lock()
+        self._recent: Dict[str, Deque[float]] = {}
+        self._totals: Dict[str, Tuple[int, float]] = {}
+        self._reruns = 0
+        self._local = threading.local()
+
+    def begin_rerun(self) -> None:
+        """再実行の開始（このスレッドの記録をリセット）"""
+        self._local.current = {}
+        with self._lock:
+            self._reruns += 1
+
+    def record(self, name: str, seconds: float) -> None:
+        current = getattr(self._local, 'current', None)
+        if current is not None:
+            count, total = current.get(name, (0, 0.0))
+            current[name] = (count + 1, total + seconds)
+        with self._lock:
+            self._recent.setdefault(name, deque(maxlen=self.window)).append(seconds)
+            count, total = self._totals.get(name, (0, 0.0))
+            self._totals[name] = (count + 1, total + seconds)
+
+    def current_rerun(self) -> List[Dict[str, Any]]:
+        """このスレッドの直近の再実行で記録した区間（所要時間の長い順）"""
+        current = getattr(self._local, 'current', None) or {}
+        rows = [{'span': name, 'count': count, 'total_ms': round(total * 1000, 2)}
+                for name, (count, total) in current.items()]
+        return sorted(rows, key=lambda row: row['total_ms'], reverse=True)
+
+    def rollup(self) -> List[Dict[str, Any]]:
+        """区間ごとの直近 window 件の p50/p95 と累計"""
+        with self._lock:
+            recent = {name: sorted(values) for name, values in self._recent.items()}
+            totals = dict(self._totals)
+        rows = []
+        for name, values in sorted(recent.items()):
+            count, total = totals[name]
+            rows.append({
+                'span': name,
+                **{f"p{int(q * 100)}_ms": round(_quantile(values, q) * 1000, 2) for q in QUANTILES},
+                'count': count,
+                'total_ms': round(total * 1000, 2)
+            })
+        return rows
+
+    def timing_rows(self) -> List[Dict[str, Any]]:
+        """画面表示用: 直近の再実行の所要時間に、プロセス全体の p50/p95 を並べる"""
+        rollup = {row['span']: row for row in self.rollup()}
+        return [{'区間': row['span'], '回数': row['count'], '今回(ms)': row['total_ms'],
+                 'p50(ms)': rollup.get(row['span'], {}).get('p50_ms'),
+                 'p95(ms)': rollup.get(row['span'], {}).get('p95_ms')}
+                for row in self.current_rerun()]
+
+    def exposition(self, openmetrics: bool = False) -> str:
+        """Prometheus テキスト形式（openmetrics=True で OpenMetrics）"""
+        metric = f"{METRIC_PREFIX}_span_duration_seconds"
+        reruns = f"{METRIC_PREFIX}_reruns"
+        with self._lock:
+            recent = {name: sorted(values) for name, values in self._recent.items()}
+            totals = dict(self._totals)
+            rerun_count = self._reruns
+
+        lines = [f"# HELP {metric} 画面の区間ごとの所要時間（直近{self.window}件の分位数）",
+                 f"# TYPE {metric} summary"]
+        for name, values in sorted(recent.items()):
+            label = name.replace('\\', '\\\\').replace('"', '\\"')
+            for q in QUANTILES:
+                lines.append(f'{metric}{{span="{label}",quantile="{q}"}} {_quantile(values, q):.6f}')
+            count, total = totals[name]
+            lines.append(f'{metric}_sum{{span="{label}"}} {total:.6f}')
+            lines.append(f'{metric}_count{{span="{label}"}} {count}')
+        if openmetrics:
+            lines += [f"# HELP {reruns} 再実行の回数", f"# TYPE {reruns} counter", f"{reruns}_total {rerun_count}", "# EOF"]
+        else:
+            lines += [f"# HELP {reruns}_total 再実行の回数", f"# TYPE {reruns}_total counter", f"{reruns}_total {rerun_count}"]
+        return "\n".join(lines) + "\n"
+
+
+def _quantile(ordered: List[float], q: float) -> float:
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)] if ordered else 0.0
+
+
+# アプリ全体で共有する既定のレジストリ
+registry = SpanRegistry()
+begin_rerun = registry.begin_rerun
+timing_rows = registry.timing_rows
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    """with span("区間名"): で囲んだ区間の所要時間を記録する"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        registry.record(name, time.perf_counter() - started)
+
+
+def traced(name: Optional[str] = None) -> Callable[[Callable], Callable]:
+    """関数の所要時間を記録するデコレーター（区間名の既定は関数名）"""
+    def decorator(func: Callable) -> Callable:
+        span_name = name or getattr(func, '__name__', repr(func))
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                registry.record(span_name, time.perf_counter() - started)
+        return wrapper
+    return decorator
+
+
+def start_metrics_server(port: int, host: str = "127.0.0.1", spans: SpanRegistry = registry) -> ThreadingHTTPServer:
+    """GET /metrics で区間の集計を返すサーバーを起動（Accept に openmetrics を含めば OpenMetrics）"""
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != "/metrics":
+                self.send_error(404)
+                return
+            openmetrics = "application/openmetrics-text" in self.headers.get("Accept", "")
+            body = spans.exposition(openmetrics).encode('utf-8')
+            self.send_response(200)
+            self.send_header("Content-Type", OPENMETRICS_CONTENT_TYPE if openmetrics else PROMETHEUS_CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+_server_lock = threading.Lock()
+_server: Optional[ThreadingHTTPServer] = None
+
+
+def ensure_metrics_server() -> Optional[ThreadingHTTPServer]:
+    """KOTOGAWA_METRICS_PORT が指定されていれば、プロセスで1回だけ /metrics を起動する"""
+    global _server
+    port = os.environ.get(METRICS_PORT_ENV)
+    if not port:
+        return None
+    with _server_lock:
+        if _server is None:
+            try:
+                _server = start_metrics_server(int(port))
+            except (OSError, ValueError):
+                return None
+    return _server
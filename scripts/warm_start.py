@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+ウォームスタート用の成果物（再起動直後の最初の表示を速くする）
+再起動した直後の最初の閲覧者は、履歴の読み込みと全グラフの作成を待つことになる。
+そこで最新の観測時刻（世代）ごとに、グラフタブに必要なものを data/warm_start/ に保存しておく。
+
+- figures.json: 表示期間（DISPLAY_HOURS）ごとのグラフ（Plotly の JSON、直近 WINDOW_HOURS 時間の履歴から作成）
+- manifest.json: 世代・形式のバージョンなど（最後に書き込み、figures.json と世代が揃ったときだけ有効）
+
+アプリは latest.json と同じ世代の成果物があれば、グラフの JSON をそのまま表示する
+（履歴の読み込みとグラフの作成を省く。全ての表示期間のグラフを持つため、履歴そのものは保存しない）。世代が古い・成果物がないときは従来どおり作成し、
+その世代の成果物をバックグラウンドで書き出す。収集側では保存のたびに
+`python scripts/warm_start.py --data-dir data` を実行すれば、再起動直後から使える。
+
+グラフの期間は世代（観測時刻）を終点とする。観測が FRESH_FOR より古いとき（収集の停止中など）は使わない。
+"""
+
+import argparse
+import importlib
+import json
+import os
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from scripts.history_store import JST, _write_atomic, iter_snapshots, parse_jst, snapshot_key
+
+if TYPE_CHECKING:
+    from scripts.shared_cache import SharedCache
+
+FORMAT_VERSION = 2
+WARM_DIR_NAME = "warm_start"
+# 成果物の置き場所を変える（計測でデータセットに書き込まないときなど）
+WARM_DIR_ENV = "KOTOGAWA_WARM_START_DIR"
+MANIFEST_FILE = "manifest.json"
+FIGURES_FILE = "figures.json"
+# 表示期間の選択肢（streamlit_app.py のスライダーと同じ）と、保存する履歴の長さ
+DISPLAY_HOURS = (6, 12, 24, 48, 72)
+WINDOW_HOURS = max(DISPLAY_HOURS)
+# 観測時刻からこの時間を過ぎた世代は使わない（現在時刻基準の表示と大きくずれるため）
+FRESH_FOR = timedelta(hours=1)
+
+# グラフ名 → (履歴, 表示期間) からグラフを作る関数
+FigureBuilders = Dict[str, Callable[[List[Dict[str, Any]], int], Any]]
+
+
+def warm_dir_of(data_dir: Path) -> Path:
+    """成果物のディレクトリ（既定は data_dir/warm_start、KOTOGAWA_WARM_START_DIR で変更）"""
+    override = os.environ.get(WARM_DIR_ENV)
+    return Path(override) if override else data_dir / WARM_DIR_NAME
+
+
+def is_fresh(generation: str, now: datetime) -> bool:
+    """世代（観測時刻）が FRESH_FOR 以内か"""
+    generated = parse_jst(generation)
+    return generated is not None and now - generated <= FRESH_FOR
+
+
+@dataclass
+class WarmStart:
+    """読み込んだ成果物"""
+    generation: str
+    # グラフの作成に使った履歴の行数
+    rows: int
+    # 表示期間 → グラフ名 → Plotly の図（dict）。期間内に履歴がなければ空の dict
+    figures: Dict[int, Dict[str, Dict[str, Any]]]
+
+
+def load_artifact(warm_dir: Path, generation: Optional[str] = None) -> Optional[WarmStart]:
+    """成果物を読み込む（世代が一致しない・壊れている・書き込み途中なら None）"""
+    try:
+        manifest = json.loads((warm_dir / MANIFEST_FILE).read_text(encoding='utf-8'))
+        if manifest.get('format_version') != FORMAT_VERSION:
+            return None
+        if generation is not None and manifest.get('generation') != generation:
+            return None
+        figures = json.loads((warm_dir / FIGURES_FILE).read_text(encoding='utf-8'))
+    except (OSError, ValueError):
+        return None
+    if figures.get('generation') != manifest['generation']:
+        return None
+    return WarmStart(manifest['generation'], manifest.get('rows', 0),
+                     {int(hours): charts for hours, charts in figures['figures'].items()})
+
+
+def write_artifact(warm_dir: Path, generation: str, rows: int, figures: Dict[int, Dict[str, str]]) -> None:
+    """グラフ・マニフェストの順にアトミックに書き込む（figures の値は Plotly の JSON 文字列）"""
+    warm_dir.mkdir(parents=True, exist_ok=True)
+    charts = ",".join(
+        f'"{hours}":{{' + ",".join(f'{json.dumps(name)}:{figure}' for name, figure in by_name.items()) + "}"
+        for hours, by_name in figures.items()
+    )
+    _write_atomic(warm_dir / FIGURES_FILE,
+                  f'{{"generation":{json.dumps(generation)},"figures":{{{charts}}}}}'.encode('utf-8'))
+
+    manifest = {
+        'format_version': FORMAT_VERSION,
+        'generation': generation,
+        'built_at': datetime.now(JST).isoformat(),
+        'window_hours': WINDOW_HOURS,
+        'display_hours': sorted(figures),
+        'rows': rows
+    }
+    _write_atomic(warm_dir / MANIFEST_FILE, json.dumps(manifest, ensure_ascii=False, indent=2).encode('utf-8'))
+
+
+def build_artifact(data_dir: Path, latest: Dict[str, Any], builders: FigureBuilders,
+                   display_hours: Tuple[int, ...] = DISPLAY_HOURS) -> Optional[Dict[str, Any]]:
+    """latest の世代の成果物を作って書き込む（履歴がなければ書き込まず None）
+
+    Returns: {'generation', 'rows', 'build_ms'}
+    """
+    import plotly.io as pio
+
+    started = time.perf_counter()
+    generation = snapshot_key(latest)
+    end = parse_jst(generation)
+    if end is None:
+        return None
+    history = list(iter_snapshots(data_dir / "history", end - timedelta(hours=WINDOW_HOURS), end))
+    rows = [(parse_jst(snapshot_key(item)), item) for item in history]
+    rows = sorted(((data_dt, item) for data_dt, item in rows if data_dt is not None), key=lambda row: row[0])
+    if not rows:
+        return None
+
+    # グラフはアプリが履歴から作るときと同じく、期間内のスナップショットから作る
+    figures = {}
+    for hours in display_hours:
+        start = end - timedelta(hours=hours)
+        window = [item for data_dt, item in rows if data_dt >= start]
+        figures[hours] = {name: pio.to_json(build(window, hours), validate=False)
+                          for name, build in builders.items()} if window else {}
+    write_artifact(warm_dir_of(data_dir), generation, len(rows), figures)
+    return {'generation': generation, 'rows': len(rows),
+            'build_ms': round((time.perf_counter() - started) * 1000, 1)}
+
+
+_building_lock = threading.Lock()
+_building: Dict[Path, str] = {}
+
+
+def build_in_background(data_dir: Path, latest: Dict[str, Any], builders: FigureBuilders,
+                        cache: Optional["SharedCache"] = None) -> bool:
+    """別スレッドで成果物を作る（同じデータディレクトリ・世代の作成中・作成済みなら何もしない）
+
+    cache（scripts/shared_cache.py）を渡すと、複数のプロセスのうち最初の1つだけが作る。
+
+    Returns: 作成を始めたら True
+    """
+    generation = snapshot_key(latest)
+    with _building_lock:
+        if _building.get(data_dir) == generation:
+            return False
+        _building[data_dir] = generation
+
+    def build() -> None:
+        try:
+            if cache is None:
+                build_artifact(data_dir, latest, builders)
+            else:
+                cache.get_or_compute(f"warm_start:{warm_dir_of(data_dir)}:{generation}", generation,
+                                     lambda: json.dumps(build_artifact(data_dir, latest, builders)).encode('utf-8'))
+        except Exception as e:  # 表示には影響させない（次の世代で再試行）
+            print(f"ウォームスタートの成果物を作成できませんでした: {e!r}", file=sys.stderr)
+
+    threading.Thread(target=build, name="kotogawa-warm-start", daemon=True).start()
+    return True
+
+
+def app_builders(app: str = "streamlit_app") -> FigureBuilders:
+    """アプリのグラフ関数（アプリのモジュールを読み込む）"""
+    return importlib.import_module(app).WARM_START_FIGURES
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="ウォームスタート用の成果物を作成・確認する")
+    parser.add_argument("--data-dir", type=Path, default=ROOT / "data")
+    parser.add_argument("--check", action="store_true", help="作成せず、latest.json と同じ世代の成果物があるか確認する")
+    args = parser.parse_args()
+
+    latest_file = args.data_dir / "latest.json"
+    if not latest_file.exists():
+        parser.error(f"{latest_file} がありません")
+    latest = json.loads(latest_file.read_text(encoding='utf-8'))
+
+    if args.check:
+        artifact = load_artifact(warm_dir_of(args.data_dir), snapshot_key(latest))
+        if artifact is None:
+            print(f"世代 {snapshot_key(latest)} の成果物はありません")
+            sys.exit(1)
+        print(f"世代 {artifact.generation}: {artifact.rows}行, 表示期間 {sorted(artifact.figures)}")
+        return
+
+    result = build_artifact(args.data_dir, latest, app_builders())
+    if result is None:
+        print("履歴がないため作成しませんでした")
+        sys.exit(1)
+    print(f"世代 {result['generation']}: {result['rows']}行, {result['build_ms']:.0f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,22 +7,32 @@
 
 import json
 import os
+import threading
 import time
 from datetime import datetime, timedelta, timezone
+from datetime import time as dt_time
 from pathlib import Path
-from typing import Dict, Any, List, Optional
-import pandas as pd
+from typing import TYPE_CHECKING, Dict, Any, List, Mapping, Optional, Sequence
 try:
     from zoneinfo import ZoneInfo
 except ImportError:
     # Python 3.8以前の場合
     import pytz
     ZoneInfo = lambda x: pytz.timezone(x)
-import plotly.express as px
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
 import streamlit as st
-from streamlit_autorefresh import st_autorefresh
+
+from scripts import clock, live_window, memprofile, shared_cache, spans, warm_start
+from scripts.history_index import HistoryIndex
+from scripts.history_store import iter_snapshots, parse_jst
+from scripts.spans import span, traced
+
+# pandas・plotly・streamlit_autorefresh はグラフ・表・自動更新でのみ使う。
+# 警戒バナーとメトリクスは latest.json だけで描けるため、モジュールの読み込み時には import せず
+# 最初の再実行でバックグラウンドの先読みを始め、使う関数の中で import する（コールドスタートの短縮）
+if TYPE_CHECKING:
+    import plotly.graph_objects as go
+    
+    from scripts.history_records import CompactHistory
 
 # ページ設定
 st.set_page_config(
@@ -300,10 +310,14 @@ st.markdown("""
 # 日本時間のタイムゾーン
 JST = ZoneInfo('Asia/Tokyo')
 
+# データディレクトリ（リプレイ時は KOTOGAWA_DATA_DIR で再生先を指定する）
+DATA_DIR = Path(os.environ.get("KOTOGAWA_DATA_DIR", "data"))
+
+@traced()
 def load_latest_data() -> Optional[Dict[str, Any]]:
     """最新データを読み込む"""
     try:
-        json_path = Path("data/latest.json")
+        json_path = DATA_DIR / "latest.json"
         if json_path.exists():
             with open(json_path, 'r', encoding='utf-8') as f:
                 return json.load(f)
@@ -335,6 +349,7 @@ def get_rain_alert_level(hourly_rain: float) -> tuple:
     else:
         return ("通常", "normal", "☁️", "問題なし")
 
+@traced()
 def display_alert_banner(data: Dict[str, Any]):
     """最上部に警戒情報バナーを表示"""
     river_level = data.get('river', {}).get('water_level', 0)
@@ -411,6 +426,7 @@ def display_info_boxes():
             </div>
         """, unsafe_allow_html=True)
 
+@traced()
 def display_metrics_cards(data: Dict[str, Any]):
     """メトリクスをカード形式で表示"""
     col1, col2, col3, col4 = st.columns(4)
@@ -506,55 +522,83 @@ def display_metrics_cards(data: Dict[str, Any]):
             </div>
         """, unsafe_allow_html=True)
 
-def load_history_data(hours: int = 72) -> List[Dict[str, Any]]:
-    """履歴データを読み込む"""
+@st.cache_resource(show_spinner=False)
+def get_history_index(history_dir: str) -> HistoryIndex:
+    """履歴の時刻インデックス（全セッションで共有し、表示のたびに新しい日の分だけ更新する）"""
+    return HistoryIndex(Path(history_dir))
+
+def load_snapshot_at(history_dir: str, data_time: str) -> Optional[Dict[str, Any]]:
+    """インデックスで解決した観測時刻のスナップショットを読み込む（読めなければ None）"""
+    try:
+        return _load_snapshot_at(history_dir, data_time)
+    except LookupError:
+        return None
+
+@st.cache_data(max_entries=256, show_spinner=False)
+def _load_snapshot_at(history_dir: str, data_time: str) -> Dict[str, Any]:
+    """読めなかった場合は例外にして、None をキャッシュしない（次の表示で読み直す）"""
+    data = get_history_index(history_dir).snapshot_as_of(parse_jst(data_time))
+    if data is None:
+        raise LookupError(data_time)
+    return data
+
+@traced()
+def load_history_data(hours: int = 72, as_of: Optional[datetime] = None,
+                      metrics_only: bool = False) -> Sequence[Mapping[str, Any]]:
+    """履歴データを読み込む（as_of を指定するとその時刻までの期間）
+
+    戻り値は観測時刻順の Mapping の列で、各行はスナップショットと同じように item.get(...) で読める。
+    最新の表示はディスクから読んだ dict のリスト、as_of では CompactHistory（どちらも全項目を含む）。
+
+    metrics_only=True の呼び出し（グラフの作成など）に限り、収集側が直近の履歴を共有メモリに公開していれば
+    （scripts/live_window.py）そのビューを返す。ビューの行にあるのは data_time と live_window.METRICS・
+    TEXT_METRICS（river.status）の項目だけで、timestamp・weather・precipitation_intensity などは含まない。
+    """
+    if as_of is not None:
+        return _load_history_window(hours, as_of.isoformat())
+    
     history_data = []
-    data_dir = Path("data/history")
+    data_dir = DATA_DIR / "history"
     
     if not data_dir.exists():
         return history_data
     
     # 現在時刻から指定時間分のデータを取得
-    now = datetime.now(JST)
+    now = clock.now()
     start_time = now - timedelta(hours=hours)
     
-    # 年/月/日のディレクトリ構造を走査
-    for year_dir in sorted(data_dir.iterdir(), reverse=True):
-        if not year_dir.is_dir():
-            continue
-        for month_dir in sorted(year_dir.iterdir(), reverse=True):
-            if not month_dir.is_dir():
-                continue
-            for day_dir in sorted(month_dir.iterdir(), reverse=True):
-                if not day_dir.is_dir():
-                    continue
-                
-                # JSONファイルを読み込み
-                for json_file in sorted(day_dir.glob("*.json"), reverse=True):
-                    try:
-                        with open(json_file, 'r', encoding='utf-8') as f:
-                            data = json.load(f)
-                            
-                        # タイムスタンプを確認
-                        timestamp_str = data.get('timestamp') or data.get('data_time')
-                        if timestamp_str:
-                            timestamp = datetime.fromisoformat(timestamp_str.replace('Z', '+00:00'))
-                            if timestamp.tzinfo is None:
-                                timestamp = timestamp.replace(tzinfo=JST)
-                            else:
-                                timestamp = timestamp.astimezone(JST)
-                            
-                            if timestamp >= start_time:
-                                history_data.append(data)
-                    except Exception:
-                        continue
+    # メトリクスだけでよければ、共有メモリの直近の履歴が表示期間を含むときはディスクから読まずに配列のビューを使う
+    live = live_window.current(DATA_DIR) if metrics_only else None
+    if live is not None and live.covers(start_time):
+        return live.between(start_time, now)
+    
+    # 開始時刻の日付ディレクトリから順に読み込み（日次ログはインデックスで開始位置へ seek）
+    history_data.extend(iter_snapshots(data_dir, start_time, now))
     
     # 時刻順にソート
     history_data.sort(key=lambda x: x.get('timestamp') or x.get('data_time', ''))
     return history_data
 
-def create_river_water_level_graph(history_data: List[Dict[str, Any]], display_hours: int = 24) -> go.Figure:
+@st.cache_data(max_entries=64, show_spinner=False)
+def _load_history_window(hours: int, end_time: str) -> "CompactHistory":
+    """過去の時点までの履歴（スライダーで行き来しても同じ時点は読み直さない）
+
+    キャッシュに最大64件残るため、列で持つ CompactHistory にして保持・復元の量を減らす
+    """
+    from scripts.history_records import CompactHistory
+    
+    end_dt = parse_jst(end_time)
+    history_data = list(iter_snapshots(DATA_DIR / "history", end_dt - timedelta(hours=hours), end_dt))
+    history_data.sort(key=lambda x: x.get('timestamp') or x.get('data_time', ''))
+    return CompactHistory.from_snapshots(history_data)
+
+@traced()
+def create_river_water_level_graph(history_data: List[Dict[str, Any]], display_hours: int = 24) -> "go.Figure":
     """河川水位グラフを作成（河川水位 + ダム全放流量の二軸表示）"""
+    import pandas as pd
+    import plotly.graph_objects as go
+    from plotly.subplots import make_subplots
+    
     # データをDataFrameに変換
     df_data = []
     for item in history_data:
@@ -665,8 +709,13 @@ def create_river_water_level_graph(history_data: List[Dict[str, Any]], display_h
     
     return fig
 
-def create_dam_water_level_graph(history_data: List[Dict[str, Any]], display_hours: int = 24) -> go.Figure:
+@traced()
+def create_dam_water_level_graph(history_data: List[Dict[str, Any]], display_hours: int = 24) -> "go.Figure":
     """ダム貯水位グラフを作成（ダム水位 + 時間雨量の二軸表示）"""
+    import pandas as pd
+    import plotly.graph_objects as go
+    from plotly.subplots import make_subplots
+    
     # データをDataFrameに変換
     df_data = []
     for item in history_data:
@@ -766,38 +815,203 @@ def create_dam_water_level_graph(history_data: List[Dict[str, Any]], display_hou
     
     return fig
 
-def display_graphs(data: Dict[str, Any]):
-    """グラフ表示セクション"""
+# ウォームスタートの成果物に保存するグラフ（scripts/warm_start.py が同じ関数で作る）
+WARM_START_FIGURES = {
+    'river': create_river_water_level_graph,
+    'dam': create_dam_water_level_graph
+}
+
+@st.cache_resource(max_entries=2, show_spinner=False)
+def _load_warm_start(warm_dir: str, generation: str, manifest_mtime: float) -> Optional[warm_start.WarmStart]:
+    """ウォームスタートの成果物（世代・マニフェストの更新時刻ごとに1回だけ読み込む）"""
+    return warm_start.load_artifact(Path(warm_dir), generation)
+
+@traced()
+def get_warm_start(data: Dict[str, Any]) -> Optional[warm_start.WarmStart]:
+    """latest.json と同じ世代のウォームスタートの成果物（ない・古いときは None）"""
+    generation = data.get('data_time')
+    if not generation or not warm_start.is_fresh(generation, clock.now()):
+        return None
+    warm_dir = warm_start.warm_dir_of(DATA_DIR)
+    try:
+        manifest_mtime = (warm_dir / warm_start.MANIFEST_FILE).stat().st_mtime
+    except OSError:
+        return None
+    return _load_warm_start(str(warm_dir), generation, manifest_mtime)
+
+def _shared_history(cache: shared_cache.SharedCache, generation: str, hours: int) -> "CompactHistory":
+    """共有ディスクキャッシュの直近72時間の履歴（世代ごとに1回だけ読み込み）から、表示期間の分を取り出す"""
+    import pickle
+    import numpy as np
+    from scripts.history_records import CompactHistory
+    
+    def compute() -> bytes:
+        history = load_history_data(warm_start.WINDOW_HOURS, metrics_only=True)
+        if not isinstance(history, CompactHistory):
+            history = CompactHistory.from_snapshots(history)
+        return pickle.dumps(history, protocol=pickle.HIGHEST_PROTOCOL)
+    
+    history = pickle.loads(cache.get_or_compute(f"history:{generation}:{warm_start.WINDOW_HOURS}", generation, compute))
+    start = clock.now() - timedelta(hours=hours)
+    data_times = [parse_jst(value or '') for value in history.column('data_time')]
+    return history.filter(np.array([data_dt is not None and data_dt >= start for data_dt in data_times], dtype=bool))
+
+@traced()
+def load_shared_figures(data: Dict[str, Any], display_hours: int) -> Optional[Dict[str, Dict[str, Any]]]:
+    """共有ディスクキャッシュのグラフ（複数のプロセスで、最初に作ったプロセスの結果を使う）
+
+    Returns: グラフ名 → Plotly の図（dict）。履歴がなければ空の dict、キャッシュが無効・世代が古ければ None
+    """
+    cache = shared_cache.get_cache(DATA_DIR)
+    generation = data.get('data_time')
+    if cache is None or not generation or not warm_start.is_fresh(generation, clock.now()):
+        return None
+    
+    def compute() -> bytes:
+        import plotly.io as pio
+        
+        history_data = _shared_history(cache, generation, display_hours)
+        if not history_data:
+            return b"{}"
+        return ("{" + ",".join(f"{json.dumps(name)}:{pio.to_json(build(history_data, display_hours), validate=False)}"
+                               for name, build in WARM_START_FIGURES.items()) + "}").encode('utf-8')
+    
+    return json.loads(cache.get_or_compute(f"figures:{generation}:{display_hours}", generation, compute))
+
+def display_graphs(data: Dict[str, Any], as_of: Optional[datetime] = None):
+    """グラフ表示セクション（as_of を指定するとその時刻までを表示）"""
     # 表示期間の選択
     display_hours = st.select_slider(
         "表示期間",
-        options=[6, 12, 24, 48, 72],
+        options=list(warm_start.DISPLAY_HOURS),
         value=24,
         format_func=lambda x: f"{x}時間"
     )
     
-    # 履歴データを読み込み
-    history_data = load_history_data(display_hours)
-    
-    if not history_data:
+    # 最新の表示では、同じ世代の成果物があれば保存済みのグラフをそのまま使う（履歴の読み込み・作成を省く）
+    warm = get_warm_start(data) if as_of is None else None
+    figures = warm.figures.get(display_hours) if warm is not None else None
+    if as_of is None and warm is None and warm_start.is_fresh(data.get('data_time', ''), clock.now()):
+        # 次の再起動・他のセッションのために、この世代の成果物をバックグラウンドで作っておく
+        # （共有ディスクキャッシュが有効なら、作るのは複数のプロセスのうち1つだけ）
+        warm_start.build_in_background(DATA_DIR, data, WARM_START_FIGURES, shared_cache.get_cache(DATA_DIR))
+        # 成果物ができるまでは、複数のプロセスで共有するディスクキャッシュ（KOTOGAWA_SHARED_CACHE）を使う
+        figures = load_shared_figures(data, display_hours)
+    if figures is None:
+        # 履歴データを読み込み
+        history_data = load_history_data(display_hours, as_of, metrics_only=True)
+        
+        if not history_data:
+            st.warning("履歴データがありません")
+            return
+        
+        figures = {name: build(history_data, display_hours) for name, build in WARM_START_FIGURES.items()}
+    elif not figures:
         st.warning("履歴データがありません")
         return
+    else:
+        # plotly は読み込み済みの pandas を参照するため、先読み中の pandas の import が終わるのを待つ
+        import pandas  # noqa: F401
     
     # 2列レイアウトでグラフを表示
     col1, col2 = st.columns(2)
     
     with col1:
         st.markdown("#### 河川水位・全放流量")
-        fig1 = create_river_water_level_graph(history_data, display_hours)
-        st.plotly_chart(fig1, use_container_width=True)
+        st.plotly_chart(figures['river'], use_container_width=True)
     
     with col2:
         st.markdown("#### ダム貯水位・時間雨量")
-        fig2 = create_dam_water_level_graph(history_data, display_hours)
-        st.plotly_chart(fig2, use_container_width=True)
+        st.plotly_chart(figures['dam'], use_container_width=True)
+
+def select_as_of() -> Optional[datetime]:
+    """サイドバーで過去の時点を選ぶ（URL の ?as_of=2025-08-05T12:00 でも指定できる）
+
+    Returns: 選んだ時刻（JST）。最新を表示する場合は None
+    """
+    history_dir = DATA_DIR / "history"
+    if not history_dir.is_dir():
+        return None
+    
+    requested = parse_jst(st.query_params.get("as_of", ""))
+    st.markdown("### 🕰️ 過去の時点")
+    if not st.checkbox("過去の時点を表示", value=requested is not None, key="as_of_enabled"):
+        st.query_params.pop("as_of", None)
+        return None
+    
+    # インデックスは過去の時点を表示するときだけ作る（長い履歴では初回の作成に時間がかかる）
+    index = get_history_index(str(history_dir))
+    index.refresh()
+    if index.first is None:
+        st.caption("履歴データがありません")
+        return None
+    first, last = index.first, index.last
+    # 初期値は最初の表示時だけ決める（以降はウィジェットの状態を使う）
+    if "as_of_day" not in st.session_state:
+        initial = min(max(requested or last, first), last)
+        st.session_state["as_of_day"] = initial.date()
+        st.session_state["as_of_time"] = dt_time(initial.hour, initial.minute - initial.minute % 10)
+    day = st.date_input("日付", min_value=first.date(), max_value=last.date(), key="as_of_day")
+    # 日付内の時刻はスライダーで選ぶ（10分刻み = 観測間隔）
+    time_of_day = st.slider(
+        "時刻",
+        min_value=dt_time(0, 0),
+        max_value=dt_time(23, 50),
+        step=timedelta(minutes=10),
+        format="HH:mm",
+        key="as_of_time"
+    )
+    as_of = datetime.combine(day, time_of_day, tzinfo=JST)
+    st.query_params["as_of"] = as_of.strftime('%Y-%m-%dT%H:%M')
+    return as_of
+
+def display_span_timings(panel):
+    """開発者向け: この再実行の区間ごとの処理時間（p50/p95 はプロセス全体の直近値）"""
+    import pandas as pd
+    
+    rows = spans.timing_rows()
+    if not rows:
+        return
+    with panel.expander("🛠️ 開発者向け: 処理時間", expanded=False):
+        st.dataframe(pd.DataFrame(rows), hide_index=True, use_container_width=True)
+        if os.environ.get(spans.METRICS_PORT_ENV):
+            st.caption(f"メトリクス: http://127.0.0.1:{os.environ[spans.METRICS_PORT_ENV]}/metrics")
+        cache = shared_cache.get_cache(DATA_DIR)
+        if cache is not None:
+            stats = cache.stats()
+            st.caption(f"共有キャッシュ（このプロセス）: ヒット {stats['hit']} / 計算 {stats['computed']} / "
+                       f"待機 {stats['waited']}（全体 {stats['entries']} 件, {stats['bytes'] / 1024 / 1024:,.1f} MB）")
+        report = memprofile.last_report()
+        if report:
+            st.caption(f"メモリ（前回の再実行後）: {report['traced_kb'] / 1024:,.1f} MB"
+                       f"（残った確保 {report['retained']['total_diff_kb']:+,.0f} KB）")
+            st.dataframe(pd.DataFrame(report['retained']['functions'][:5]), hide_index=True, use_container_width=True)
+            st.dataframe(pd.DataFrame(report['caches']), hide_index=True, use_container_width=True)
+
+@st.cache_resource(show_spinner=False)
+def preload_heavy_modules() -> threading.Thread:
+    """グラフ・表・自動更新に使うモジュールの読み込みをバックグラウンドで始める（プロセスで1回）
+
+    スクリプトが同じモジュールを import すると、先読みの完了を待ってから続く。
+    """
+    def preload():
+        import pandas  # noqa: F401
+        import plotly.graph_objects as go
+        from plotly.subplots import make_subplots  # noqa: F401
+        import streamlit_autorefresh  # noqa: F401
+        # plotly.graph_objects は属性の参照時に各クラスを読み込む
+        go.Figure, go.Scatter, go.Bar
+    
+    thread = threading.Thread(target=preload, name="kotogawa-preload", daemon=True)
+    thread.start()
+    return thread
 
 def main():
     """メインアプリケーション"""
+    run_started = time.perf_counter()
+    spans.begin_rerun()
+    spans.ensure_metrics_server()
+    preload_heavy_modules()
     
     # 自動更新（サイドバーで設定）
     with st.sidebar:
@@ -812,8 +1026,7 @@ def main():
             index=0
         )
         
-        if auto_refresh:
-            st_autorefresh(interval=refresh_interval * 60 * 1000, key="datarefresh")
+        as_of = select_as_of()
         
         # 通知設定（将来実装用）
         st.markdown("### 🔔 通知設定")
@@ -831,13 +1044,50 @@ def main():
             - Yahoo! Weather API
             - 更新: 10分間隔
             """)
+        
+        # 処理時間は描画が終わってから書き込む
+        timing_panel = st.container()
+    
+    data = display_dashboard(as_of)
+    
+    # 自動更新のコンポーネントは警戒バナー・グラフの後で読み込む（過去の時点を表示している間は自動更新しない）
+    if auto_refresh and as_of is None:
+        from streamlit_autorefresh import st_autorefresh
+        
+        with st.sidebar:
+            # リプレイ中は倍速に合わせて更新間隔を縮める
+            st_autorefresh(interval=max(int(refresh_interval * 60 * 1000 / clock.speed()), 1000), key="datarefresh")
     
-    # データ読み込み
-    data = load_latest_data()
+    # リプレイ中は描画したスナップショットを記録（書き込みから描画までの遅延の集計用）
+    if clock.active_clock() is not None and as_of is None:
+        from scripts.replay import record_render
+        
+        record_render(DATA_DIR, data.get('data_time') if data else None, (time.perf_counter() - run_started) * 1000)
+    
+    display_span_timings(timing_panel)
+
+def display_dashboard(as_of: Optional[datetime]) -> Optional[Dict[str, Any]]:
+    """本体: 警戒バナー・メトリクス（latest.json のみで描画）→ グラフ・天気・表
+
+    Returns: 表示したスナップショット（データがなければ None）
+    """
+    # データ読み込み（過去の時点はインデックスで、その時刻以前で最新のスナップショットを探す）
+    if as_of is None:
+        data = load_latest_data()
+    else:
+        history_dir = str(DATA_DIR / "history")
+        data_key = get_history_index(history_dir).key_as_of(as_of)
+        data = load_snapshot_at(history_dir, data_key.isoformat()) if data_key else None
     
     if not data:
-        st.error("データが見つかりません")
-        return
+        if as_of is not None:
+            st.warning(f"{as_of.strftime('%Y/%m/%d %H:%M')} 以前のデータがありません")
+        else:
+            st.error("データが見つかりません")
+        return None
+    
+    if as_of is not None:
+        st.info(f"🕰️ {as_of.strftime('%Y/%m/%d %H:%M')} 時点の表示です（観測時刻 {data_key.strftime('%Y/%m/%d %H:%M')}）")
     
     # 警戒バナー表示
     display_alert_banner(data)
@@ -855,7 +1105,7 @@ def main():
     
     with tab1:
         # 既存のグラフ表示ロジックを移植
-        display_graphs(data)
+        display_graphs(data, as_of)
     
     with tab2:
         # 天気予報
@@ -880,7 +1130,14 @@ def main():
     
     with tab3:
         # データテーブル
-        st.dataframe(pd.DataFrame([data]), use_container_width=True)
+        with span("data_table"):
+            import pandas as pd
+            
+            st.dataframe(pd.DataFrame([data]), use_container_width=True)
+    
+    return data
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    # KOTOGAWA_MEMPROFILE を指定したときだけ再実行の前後でメモリを計測する
+    with memprofile.rerun("streamlit_app"):
+        main()
\ No newline at end of file
@@ -4,6 +4,7 @@
 """
 
 import json
+import os
 import streamlit as st
 from pathlib import Path
 from datetime import datetime
@@ -17,7 +18,7 @@ st.set_page_config(
 
 def load_latest_data():
     """最新データを読み込む"""
-    data_dir = Path(__file__).parent / "data"
+    data_dir = Path(os.environ.get("KOTOGAWA_DATA_DIR", Path(__file__).parent / "data"))
     latest_file = data_dir / "latest.json"
     
     if not latest_file.exists():
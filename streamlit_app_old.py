@@ -4,12 +4,13 @@
 山口県宇部市の厚東川ダムおよび厚東川（持世寺）の監視データを表示
 """
 
+import hashlib
 import json
 import os
 import time
 from datetime import datetime, timedelta, timezone
 from pathlib import Path
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Mapping, Optional, Sequence
 import pandas as pd
 try:
     from zoneinfo import ZoneInfo
@@ -23,6 +24,12 @@ from plotly.subplots import make_subplots
 import streamlit as st
 from streamlit_autorefresh import st_autorefresh
 
+from scripts import clock, memprofile, spans
+from scripts.history_records import CompactHistory
+from scripts.history_store import load_day_snapshots
+from scripts.replay import record_render
+from scripts.spans import span, traced
+
 # ページ設定
 st.set_page_config(
     page_title="厚東川監視システム",
@@ -130,10 +137,16 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+def file_digest(path: Path) -> str:
+    """ファイル内容のハッシュ（キャッシュキー用）"""
+    return hashlib.sha1(path.read_bytes()).hexdigest()
+
+
 class KotogawaMonitor:
     def __init__(self):
         self.base_dir = Path(__file__).parent
-        self.data_dir = self.base_dir / "data"
+        # リプレイ時は KOTOGAWA_DATA_DIR で再生先のデータディレクトリを指定する
+        self.data_dir = Path(os.environ.get("KOTOGAWA_DATA_DIR", self.base_dir / "data"))
         self.history_dir = self.data_dir / "history"
         
         # アラート閾値（デフォルト値）
@@ -144,6 +157,7 @@ class KotogawaMonitor:
             'dam_danger': 95.0
         }
     
+    @traced()
     def load_latest_data(_self) -> Optional[Dict[str, Any]]:
         """最新データを読み込む（ファイル更新時刻ベースのキャッシュ）"""
         latest_file = _self.data_dir / "latest.json"
@@ -195,11 +209,11 @@ class KotogawaMonitor:
             return "error"
     
     @st.cache_data(ttl=300)  # 5分間キャッシュ（短縮）
-    def load_history_data(_self, hours: int = 72, cache_key: str = None) -> List[Dict[str, Any]]:
+    def load_history_data(_self, hours: int = 72, cache_key: str = None) -> Sequence[Mapping[str, Any]]:
         """履歴データを読み込む（固定期間で全データを読み込み、表示はグラフ側で制御）"""
         history_data = []
         # JST（日本標準時）で現在時刻を取得
-        end_time = datetime.now(ZoneInfo('Asia/Tokyo'))
+        end_time = clock.now()
         start_time = end_time - timedelta(hours=hours)
         
         if not _self.history_dir.exists():
@@ -220,47 +234,20 @@ class KotogawaMonitor:
                        current_time.strftime("%d"))
             
             if date_dir.exists():
-                # ファイルを降順でソートして新しいものから処理
-                json_files = sorted(date_dir.glob("*.json"), reverse=True)
-                for file_path in json_files:
+                # コンパクト済みの日次ログとバラのファイルをまとめて読み込み、新しいものから処理
+                day_snapshots, day_errors = load_day_snapshots(date_dir)
+                error_count += day_errors
+                for data in reversed(day_snapshots):
                     if processed_files >= max_files:
                         break
                     
-                    # daily_summaryファイルはスキップ
-                    if file_path.name == "daily_summary.json":
-                        continue
-                    
-                    try:
-                        with open(file_path, 'r', encoding='utf-8') as f:
-                            data = json.load(f)
-                            
-                            # データの基本検証とJST時刻での範囲チェック
-                            if data and 'timestamp' in data:
-                                # タイムスタンプをJSTで解析
-                                try:
-                                    data_timestamp = datetime.fromisoformat(data['timestamp'].replace('Z', '+00:00'))
-                                    if data_timestamp.tzinfo is None:
-                                        data_timestamp = data_timestamp.replace(tzinfo=ZoneInfo('Asia/Tokyo'))
-                                    else:
-                                        data_timestamp = data_timestamp.astimezone(ZoneInfo('Asia/Tokyo'))
-                                    
-                                    # 全データを読み込み（表示範囲はグラフ側で制御）
-                                    history_data.append(data)
-                                    processed_files += 1
-                                    
-                                except Exception as e:
-                                    # タイムスタンプ解析エラーの場合も追加（後方互換性）
-                                    history_data.append(data)
-                                    processed_files += 1
-                            else:
-                                error_count += 1
-                                
-                    except json.JSONDecodeError:
-                        error_count += 1
-                        # 個別のファイルエラーは表示しない（サマリーのみ）
-                    except Exception as e:
+                    # データの基本検証
+                    if data and 'timestamp' in data:
+                        # 全データを読み込み（表示範囲はグラフ側で制御）
+                        history_data.append(data)
+                        processed_files += 1
+                    else:
                         error_count += 1
-                        # 個別のファイルエラーは表示しない（サマリーのみ）
             
             current_time -= timedelta(days=1)
         
@@ -273,166 +260,29 @@ class KotogawaMonitor:
             history_data.sort(key=lambda x: x.get('timestamp', ''))
         except Exception as e:
             st.error(f"× 履歴データソートエラー: {e}")
-            
-        return history_data
-    
-    def load_sample_csv_data(self) -> List[Dict[str, Any]]:
-        """サンプルCSVファイルを読み込んで通常モードと同じJSON形式に変換"""
-        import pandas as pd
-        from datetime import datetime
         
+        # キャッシュには列で持つ形で保持する（各行は dict と同じように読める）
+        return CompactHistory.from_snapshots(history_data)
+    
+    def load_sample_csv_data(self) -> Sequence[Mapping[str, Any]]:
+        """サンプルCSVファイルを読み込んで通常モードと同じJSON形式に変換（ファイルのハッシュでキャッシュ）"""
         # CSVファイルのパス
         dam_csv_path = Path("sample/dam_20230625-20230701.csv")
         water_csv_path = Path("sample/water-level_20230625-20230701.csv")
         
+        # ファイル存在確認
+        if not dam_csv_path.exists():
+            st.error(f"❌ ダムCSVファイルが見つかりません: {dam_csv_path}")
+            return []
+        if not water_csv_path.exists():
+            st.error(f"❌ 河川CSVファイルが見つかりません: {water_csv_path}")
+            return []
+        
         try:
-            
-            # ファイル存在確認
-            if not dam_csv_path.exists():
-                st.error(f"❌ ダムCSVファイルが見つかりません: {dam_csv_path}")
-                return []
-            if not water_csv_path.exists():
-                st.error(f"❌ 河川CSVファイルが見つかりません: {water_csv_path}")
-                return []
-            
-            
-            # ダムデータの読み込み（Shift-JISエンコーディング）
-            dam_df = pd.read_csv(dam_csv_path, encoding='shift_jis', skiprows=7)
-            
-            dam_df.columns = ['timestamp', 'hourly_rain', 'cumulative_rain', 'water_level', 
-                             'storage_rate', 'inflow', 'outflow', 'storage_change']
-            
-            # 河川水位データの読み込み（Shift-JISエンコーディング）
-            water_df = pd.read_csv(water_csv_path, encoding='shift_jis', skiprows=6)
-            
-            # 列数に応じて適切に列名を設定
-            if len(water_df.columns) == 4:
-                water_df.columns = ['timestamp', 'water_level', 'level_change', 'empty']
-                # 不要な空列を削除
-                water_df = water_df.drop('empty', axis=1)
-            else:
-                water_df.columns = ['timestamp', 'water_level', 'level_change']
-            
-            # 河川データのタイムスタンプもクリーニング（ダムデータと同じ形式に統一）
-            water_df['clean_timestamp'] = water_df['timestamp'].astype(str).str.replace('　', '').str.strip()
-            
-            # データクリーニング：空の値を適切に処理
-            dam_df['hourly_rain'] = pd.to_numeric(dam_df['hourly_rain'], errors='coerce').fillna(0)
-            dam_df['cumulative_rain'] = pd.to_numeric(dam_df['cumulative_rain'], errors='coerce').fillna(0)
-            dam_df['water_level'] = pd.to_numeric(dam_df['water_level'], errors='coerce')
-            dam_df['storage_rate'] = pd.to_numeric(dam_df['storage_rate'], errors='coerce')
-            dam_df['inflow'] = pd.to_numeric(dam_df['inflow'], errors='coerce')
-            dam_df['outflow'] = pd.to_numeric(dam_df['outflow'], errors='coerce')
-            
-            water_df['water_level'] = pd.to_numeric(water_df['water_level'], errors='coerce')
-            water_df['level_change'] = pd.to_numeric(water_df['level_change'], errors='coerce').fillna(0)
-            
-            # データの結合と変換
-            sample_data = []
-            processed_count = 0
-            error_count = 0
-            
-            for idx, row in dam_df.iterrows():
-                timestamp_str = str(row['timestamp']).strip()
-                if pd.isna(timestamp_str) or timestamp_str == '' or timestamp_str == 'nan':
-                    continue
-                
-                # 複数の形式を試行（全角スペースや半角スペースを考慮）
-                # 先頭と末尾の全角スペースや半角スペースのみを削除して標準化
-                clean_timestamp = timestamp_str.replace('　', '').strip()
-                
-                
-                # タイムスタンプの解析とISO形式への変換
-                dt = None
-                formatted_timestamp = None
-                
-                timestamp_formats = [
-                    '%Y/%m/%d %H:%M',    # 標準形式: '2023/06/25 00:20'
-                    '%Y/%m/%d %H:%M:%S', # 秒あり: '2023/06/25 00:20:00'
-                ]
-                
-                for fmt in timestamp_formats:
-                    try:
-                        dt = datetime.strptime(clean_timestamp, fmt)
-                        formatted_timestamp = dt.strftime('%Y-%m-%dT%H:%M:%S+09:00')
-                        
-                        break
-                        
-                    except ValueError:
-                        continue
-                
-                if dt is None:
-                    error_count += 1
-                    if processed_count < 5:
-                        st.error(f"❌ 全ての形式で解析失敗: '{timestamp_str}' (長さ: {len(timestamp_str)}文字)")
-                        # 文字の詳細表示
-                        char_info = [f"'{c}' ({ord(c)})" for c in timestamp_str[:20]]  # 最初の20文字
-                        st.error(f"文字詳細: {', '.join(char_info)}")
-                    continue
-                
-                # 対応する河川データを探す（クリーニング済みタイムスタンプでマッチング）
-                water_row = water_df[water_df['clean_timestamp'] == clean_timestamp]
-                
-                if processed_count < 5:  # デバッグ出力
-                    if not water_row.empty:
-                        river_level = water_row['water_level'].iloc[0]
-                    else:
-                        st.warning(f"⚠️ 河川データマッチ失敗: '{clean_timestamp}'")
-                
-                # 通常モードと同じJSON形式のデータ構造に変換
-                data_point = {
-                    'timestamp': formatted_timestamp,
-                    'data_time': formatted_timestamp,
-                    'dam': {
-                        'water_level': float(row['water_level']) if pd.notna(row['water_level']) else None,
-                        'storage_rate': float(row['storage_rate']) if pd.notna(row['storage_rate']) else None,
-                        'inflow': float(row['inflow']) if pd.notna(row['inflow']) else None,
-                        'outflow': float(row['outflow']) if pd.notna(row['outflow']) else None,
-                        'storage_change': None  # サンプルデータには含まれない
-                    },
-                    'river': {
-                        'water_level': float(water_row['water_level'].iloc[0]) if not water_row.empty and pd.notna(water_row['water_level'].iloc[0]) else None,
-                        'level_change': float(water_row['level_change'].iloc[0]) if not water_row.empty and pd.notna(water_row['level_change'].iloc[0]) else 0.0,
-                        'status': '正常'  # サンプルデータでは常に正常とする
-                    },
-                    'rainfall': {
-                        'hourly': int(row['hourly_rain']) if pd.notna(row['hourly_rain']) else 0,
-                        'cumulative': int(row['cumulative_rain']) if pd.notna(row['cumulative_rain']) else 0,
-                        'change': 0  # 通常データとの互換性のため
-                    },
-                    # ダミーの天気データ（グラフ描画に必要）
-                    'weather': {
-                        'today': {
-                            'weather_code': '100',
-                            'weather_text': 'サンプルデータ',
-                            'temp_max': None,
-                            'temp_min': None,
-                            'precipitation_probability': [0],
-                            'precipitation_times': ['']
-                        },
-                        'tomorrow': {
-                            'weather_code': '100',
-                            'weather_text': 'サンプルデータ',
-                            'temp_max': None,
-                            'temp_min': None,
-                            'precipitation_probability': [0],
-                            'precipitation_times': ['']
-                        },
-                        'update_time': formatted_timestamp,
-                        'weekly_forecast': []
-                    },
-                    # ダミーの降水強度データ
-                    'precipitation_intensity': {
-                        'observation': [],
-                        'forecast': [],
-                        'update_time': formatted_timestamp
-                    }
-                }
-                
-                sample_data.append(data_point)
-                processed_count += 1
-            
-            # 統計情報を表示
+            dam_hash = file_digest(dam_csv_path)
+            water_hash = file_digest(water_csv_path)
+            self.sample_data_key = f"demo:{dam_hash[:12]}:{water_hash[:12]}"
+            sample_data = self._load_sample_csv_cached(str(dam_csv_path), str(water_csv_path), dam_hash, water_hash)
             
             if not sample_data:
                 st.warning("⚠️ サンプルデータの読み込みに失敗しました")
@@ -445,6 +295,49 @@ class KotogawaMonitor:
             st.error(f"詳細エラー: {traceback.format_exc()}")
             return []
     
+    @st.cache_data(show_spinner=False)  # ファイルのハッシュが変わるまでキャッシュ
+    def _load_sample_csv_cached(_self, dam_path: str, water_path: str, dam_hash: str, water_hash: str) -> CompactHistory:
+        """サンプルCSVを列単位で変換（CSV一括取り込みと同じ処理）
+
+        キャッシュには履歴と同じく列で持つ CompactHistory で保持する（共通の天気データは1つにまとまる）
+        """
+        # pandas・観測表の解析モジュールを読み込むため、デモモードを使うときだけ import する
+        from scripts.import_csv import frame_to_snapshots, load_exports, merge_series
+        
+        dam_df, water_df, _ = load_exports([Path(dam_path), Path(water_path)])
+        merged = merge_series(dam_df, water_df)
+        
+        # ダムの観測時刻の行のみ、欠測は従来どおり0・正常として扱う
+        merged = merged[merged['time'].isin(dam_df['time'])]
+        merged = merged.assign(
+            rainfall_hourly=merged['rainfall_hourly'].fillna(0),
+            rainfall_cumulative=merged['rainfall_cumulative'].fillna(0),
+            river_level_change=merged['river_level_change'].fillna(0),
+            river_status='正常',
+            rainfall_change=0
+        )
+        merged['dam_storage_change'] = None  # サンプルデータには含まれない
+        
+        sample_data = frame_to_snapshots(merged)
+        for data_point in sample_data:
+            # ダミーの天気データ（グラフ描画に必要）
+            sample_day = {
+                'weather_code': '100',
+                'weather_text': 'サンプルデータ',
+                'temp_max': None,
+                'temp_min': None,
+                'precipitation_probability': [0],
+                'precipitation_times': ['']
+            }
+            data_point['weather'] = {
+                'today': sample_day,
+                'tomorrow': dict(sample_day),
+                'update_time': data_point['data_time'],
+                'weekly_forecast': []
+            }
+        return CompactHistory.from_snapshots(sample_data)
+    
+    @traced()
     def check_alert_status(self, data: Dict[str, Any], thresholds: Dict[str, float]) -> Dict[str, str]:
         """アラート状態をチェック"""
         alerts = {
@@ -865,8 +758,7 @@ class KotogawaMonitor:
                     day_of_week = day_data.get('day_of_week', date_obj.strftime('%a'))
                     
                     # 今日・明日・明後日のラベル
-                    jst = ZoneInfo('Asia/Tokyo')
-                    today = datetime.now(jst).date()
+                    today = clock.now().date()
                     target_date = date_obj.date()
                     
                     if target_date == today:
@@ -936,8 +828,37 @@ class KotogawaMonitor:
         
         st.markdown("---")
     
-    def create_data_analysis_display(self, history_data: List[Dict[str, Any]], enable_graph_interaction: bool, display_hours: int = 24, demo_mode: bool = False) -> None:
-        """データ分析セクションを表示する"""
+    def build_figure(self, kind: str, history_data: List[Dict[str, Any]], enable_interaction: bool, display_hours: int, demo_mode: bool, precipitation_data: Dict[str, Any] = None) -> go.Figure:
+        """種類に応じてグラフを作成"""
+        if kind == 'river_water_level':
+            return self.create_river_water_level_graph(history_data, enable_interaction, display_hours, demo_mode)
+        if kind == 'dam_discharge_rainfall':
+            return self.create_dam_discharge_rainfall_graph(history_data, enable_interaction, precipitation_data, display_hours, demo_mode)
+        if kind == 'dam_water_level':
+            return self.create_dam_water_level_graph(history_data, enable_interaction, precipitation_data, display_hours, demo_mode)
+        if kind == 'dam_flow':
+            return self.create_dam_flow_graph(history_data, enable_interaction, display_hours, demo_mode)
+        if kind == 'precipitation_intensity':
+            return self.create_precipitation_intensity_graph(precipitation_data, enable_interaction, history_data, display_hours, demo_mode)
+        raise ValueError(f"不明なグラフ種類です: {kind}")
+    
+    @st.cache_data(ttl=300, max_entries=64, show_spinner=False)
+    def _get_figure_cached(_self, kind: str, data_key: str, enable_interaction: bool, display_hours: int, demo_mode: bool, _history_data: List[Dict[str, Any]], _precipitation_data: Dict[str, Any] = None) -> go.Figure:
+        """data_key（データの世代）と表示設定が同じ間は作成済みのグラフを使う"""
+        return _self.build_figure(kind, _history_data, enable_interaction, display_hours, demo_mode, _precipitation_data)
+    
+    @traced()
+    def get_figure(self, kind: str, data_key: Optional[str], history_data: List[Dict[str, Any]], enable_interaction: bool, display_hours: int, demo_mode: bool, precipitation_data: Dict[str, Any] = None) -> go.Figure:
+        """グラフを取得（data_key がなければ毎回作成）"""
+        if data_key is None:
+            return self.build_figure(kind, history_data, enable_interaction, display_hours, demo_mode, precipitation_data)
+        return self._get_figure_cached(kind, data_key, enable_interaction, display_hours, demo_mode, history_data, precipitation_data)
+    
+    def create_data_analysis_display(self, history_data: List[Dict[str, Any]], enable_graph_interaction: bool, display_hours: int = 24, demo_mode: bool = False, data_key: Optional[str] = None) -> None:
+        """データ分析セクションを表示する
+
+        data_key はデータの世代を表すキー（同じ間はグラフをキャッシュから表示する）
+        """
         # データ分析セクション
         st.markdown("## データ分析")
         
@@ -960,7 +881,7 @@ class KotogawaMonitor:
             
             with col1:
                 st.subheader("河川水位・全放流量")
-                fig1 = self.create_river_water_level_graph(history_data, enable_graph_interaction, display_hours, demo_mode)
+                fig1 = self.get_figure('river_water_level', data_key, history_data, enable_graph_interaction, display_hours, demo_mode)
                 st.plotly_chart(fig1, use_container_width=True, config=plotly_config, key="river_water_level_chart")
             
             with col2:
@@ -974,7 +895,7 @@ class KotogawaMonitor:
                 except:
                     pass
                 
-                fig2 = self.create_dam_discharge_rainfall_graph(history_data, enable_graph_interaction, latest_precipitation_data, display_hours, demo_mode)
+                fig2 = self.get_figure('dam_discharge_rainfall', data_key, history_data, enable_graph_interaction, display_hours, demo_mode, latest_precipitation_data)
                 st.plotly_chart(fig2, use_container_width=True, config=plotly_config, key="dam_discharge_rainfall_chart")
             
             # 2行目
@@ -983,12 +904,12 @@ class KotogawaMonitor:
             with col3:
                 st.subheader("ダム貯水位・時間雨量")
                 # 最新の降水強度データを取得（ダム放流量と同じものを使用）
-                fig3 = self.create_dam_water_level_graph(history_data, enable_graph_interaction, latest_precipitation_data, display_hours, demo_mode)
+                fig3 = self.get_figure('dam_water_level', data_key, history_data, enable_graph_interaction, display_hours, demo_mode, latest_precipitation_data)
                 st.plotly_chart(fig3, use_container_width=True, config=plotly_config, key="dam_water_level_chart")
             
             with col4:
                 st.subheader("ダム流入出量・累加雨量")
-                fig4 = self.create_dam_flow_graph(history_data, enable_graph_interaction, display_hours, demo_mode)
+                fig4 = self.get_figure('dam_flow', data_key, history_data, enable_graph_interaction, display_hours, demo_mode)
                 st.plotly_chart(fig4, use_container_width=True, config=plotly_config, key="dam_flow_chart")
             
             # 3行目
@@ -1054,7 +975,7 @@ class KotogawaMonitor:
                 ):
                     st.subheader("降水強度・時間雨量")
                     
-                    fig5 = self.create_precipitation_intensity_graph(latest_api_precipitation_data, enable_graph_interaction, history_data, display_hours, demo_mode)
+                    fig5 = self.get_figure('precipitation_intensity', data_key, history_data, enable_graph_interaction, display_hours, demo_mode, latest_api_precipitation_data)
                     st.plotly_chart(fig5, use_container_width=True, config=plotly_config, key="precipitation_intensity_chart")
             
             with col6:
@@ -1078,6 +999,7 @@ class KotogawaMonitor:
             else:
                 st.info("表示するデータがありません")
     
+    @traced()
     def create_metrics_display(self, data: Dict[str, Any]) -> None:
         """現在の状況表示を作成"""
         if not data:
@@ -1268,7 +1190,7 @@ class KotogawaMonitor:
             
         else:
             # 通常モード: 現在時刻（日本時間）基準
-            now_jst = datetime.now(ZoneInfo('Asia/Tokyo'))
+            now_jst = clock.now()
             
             # 表示期間に基づいた開始時刻を計算
             start_time = now_jst - timedelta(hours=display_hours)
@@ -1305,10 +1227,11 @@ class KotogawaMonitor:
         
         return filtered_data
     
+    @traced()
     def create_river_water_level_graph(self, history_data: List[Dict[str, Any]], enable_interaction: bool = False, display_hours: int = 24, demo_mode: bool = False) -> go.Figure:
         """河川水位グラフを作成（河川水位 + ダム全放流量の二軸表示）"""
         # 現在時刻を取得
-        now_jst = datetime.now(ZoneInfo('Asia/Tokyo'))
+        now_jst = clock.now()
         
         # 表示期間に基づいてデータをフィルタリング（デモモード時はスキップ）
         if demo_mode:
@@ -1484,10 +1407,11 @@ class KotogawaMonitor:
         
         return fig
     
+    @traced()
     def create_dam_water_level_graph(self, history_data: List[Dict[str, Any]], enable_interaction: bool = False, latest_precipitation_data: Dict[str, Any] = None, display_hours: int = 24, demo_mode: bool = False) -> go.Figure:
         """ダム水位グラフを作成（ダム水位 + 時間雨量の二軸表示）"""
         # 現在時刻を取得（予測データ処理で使用）
-        now_jst = datetime.now(ZoneInfo('Asia/Tokyo'))
+        now_jst = clock.now()
         
         # 表示期間に基づいてデータをフィルタリング（デモモード時はスキップ）
         if demo_mode:
@@ -1757,10 +1681,11 @@ class KotogawaMonitor:
         
         return fig
     
+    @traced()
     def create_dam_discharge_rainfall_graph(self, history_data: List[Dict[str, Any]], enable_interaction: bool = False, latest_precipitation_data: Dict[str, Any] = None, display_hours: int = 24, demo_mode: bool = False) -> go.Figure:
         """ダム放流量グラフを作成（ダム放流量 + 時間雨量の二軸表示）"""
         # 現在時刻を取得（予測データ処理で使用）
-        now_jst = datetime.now(ZoneInfo('Asia/Tokyo'))
+        now_jst = clock.now()
         
         # 表示期間に基づいてデータをフィルタリング（デモモード時はスキップ）
         if demo_mode:
@@ -2030,10 +1955,11 @@ class KotogawaMonitor:
         
         return fig
     
+    @traced()
     def create_dam_flow_graph(self, history_data: List[Dict[str, Any]], enable_interaction: bool = False, display_hours: int = 24, demo_mode: bool = False) -> go.Figure:
         """ダム流入出量グラフを作成（流入量・全放流量 + 累加雨量の二軸表示）"""
         # 現在時刻を取得
-        now_jst = datetime.now(ZoneInfo('Asia/Tokyo'))
+        now_jst = clock.now()
         
         # 表示期間に基づいてデータをフィルタリング（デモモード時はスキップ）
         if demo_mode:
@@ -2206,13 +2132,14 @@ class KotogawaMonitor:
         
         return fig
     
+    @traced()
     def create_precipitation_intensity_graph(self, precipitation_data: Dict[str, Any], enable_interaction: bool = True, history_data: List[Dict[str, Any]] = None, display_hours: int = 24, demo_mode: bool = False) -> go.Figure:
         """降水強度グラフを作成"""
         from plotly.subplots import make_subplots
         fig = make_subplots(specs=[[{"secondary_y": True}]])
         
         # 現在時刻を取得
-        now_jst = datetime.now(ZoneInfo('Asia/Tokyo'))
+        now_jst = clock.now()
         
         # 表示期間の計算
         end_time = now_jst
@@ -2401,6 +2328,7 @@ class KotogawaMonitor:
         
         return fig
     
+    @traced()
     def create_data_table(self, history_data: List[Dict[str, Any]]) -> pd.DataFrame:
         """データテーブルを作成"""
         if not history_data:
@@ -2435,6 +2363,9 @@ class KotogawaMonitor:
 
 def main():
     """メイン関数"""
+    run_started = time.perf_counter()
+    spans.begin_rerun()
+    spans.ensure_metrics_server()
     monitor = KotogawaMonitor()
     
     # サイドバー設定
@@ -2511,24 +2442,31 @@ def main():
     
     # 自動更新の実行（ヘッダーの後に配置）- デモモード時は無効化
     if refresh_interval[1] > 0 and not demo_mode:
+        # リプレイ中は倍速に合わせて更新間隔を縮める
         count = st_autorefresh(
-            interval=refresh_interval[1],
+            interval=max(int(refresh_interval[1] / clock.speed()), 1000),
             limit=None,
             key="autorefresh"
         )
     
+    # デモモードの切り替えを検出（切り替えから描画までの時間を計測）
+    demo_toggled = st.session_state.get('demo_mode_prev', demo_mode) != demo_mode
+    st.session_state['demo_mode_prev'] = demo_mode
+    
     # データ読み込み
     if demo_mode:
         # デモモードの場合はサンプルデータを読み込む
         with st.spinner('デモデータを読み込み中...'):
             sample_data = monitor.load_sample_csv_data()
             if sample_data:
-                latest_data = sample_data[-1]  # 最新のデータポイントを取得
+                latest_data = sample_data[-1].to_dict()  # 最新のデータポイントを取得
                 history_data = sample_data
             else:
                 latest_data = None
                 history_data = []
         cache_key = "demo_mode"
+        # グラフのキャッシュキー（サンプルCSVのハッシュ + 降水強度に使う latest.json の更新時刻）
+        figure_key = f"{getattr(monitor, 'sample_data_key', 'demo')}:{monitor.get_cache_key()}"
     else:
         # 通常モード
         with st.spinner('データを更新中...'):
@@ -2536,11 +2474,15 @@ def main():
         
         # キャッシュキー取得
         cache_key = monitor.get_cache_key()
+        # グラフは現在時刻基準の表示範囲を使うため、分単位で作り直す
+        figure_key = f"{cache_key}:{clock.now().strftime('%Y%m%d%H%M')}"
         
         # 履歴データの読み込み
         try:
             with st.spinner("履歴データを読み込み中..."):
-                history_data = monitor.load_history_data(120, cache_key)
+                # キャッシュ済みメソッドは .clear() を使うためデコレーターではなく呼び出し側で計測する
+                with span("load_history_data"):
+                    history_data = monitor.load_history_data(120, cache_key)
         except Exception as e:
             st.warning(f"履歴データの読み込みに失敗しました: {e}")
             history_data = []
@@ -2621,7 +2563,15 @@ def main():
         monitor.create_weather_forecast_display(latest_data, show_weekly_weather)
     
     # データ分析表示
-    monitor.create_data_analysis_display(history_data, enable_graph_interaction, display_hours, demo_mode)
+    monitor.create_data_analysis_display(history_data, enable_graph_interaction, display_hours, demo_mode, figure_key)
+    
+    if demo_toggled:
+        st.session_state['demo_toggle_ms'] = (time.perf_counter() - run_started) * 1000
+    
+    # リプレイ中は描画したスナップショットを記録（書き込みから描画までの遅延の集計用）
+    if clock.active_clock() is not None and not demo_mode:
+        record_render(monitor.data_dir, latest_data.get('data_time') if latest_data else None,
+                      (time.perf_counter() - run_started) * 1000)
     
     # システム情報（サイドバー）
     with st.sidebar.expander("システム情報", expanded=True):
@@ -2636,7 +2586,7 @@ def main():
                         obs_time = obs_time.replace(tzinfo=ZoneInfo('Asia/Tokyo'))
                     
                     # 現在時刻（日本時間）
-                    now_jst = datetime.now(ZoneInfo('Asia/Tokyo'))
+                    now_jst = clock.now()
                     time_diff = now_jst - obs_time
                     minutes_ago = int(time_diff.total_seconds() / 60)
                     
@@ -2651,6 +2601,10 @@ def main():
             
             # データ統計
             st.info(f"データ件数 ： {len(history_data)}件")
+            
+            # デモモード切り替えから描画完了までの時間（直近の切り替え）
+            if 'demo_toggle_ms' in st.session_state:
+                st.caption(f"デモ切替→描画 ： {st.session_state['demo_toggle_ms']:.0f}ms")
         
         # 警戒レベル説明
         with st.expander("■ 警戒レベル説明", expanded=False):
@@ -2672,6 +2626,18 @@ def main():
             - 危険: 50mm/h以上
             """)
         
+        # 区間ごとの処理時間（この再実行 / プロセス全体の p50・p95）
+        with st.expander("■ 開発者向け: 処理時間", expanded=False):
+            st.dataframe(pd.DataFrame(spans.timing_rows()), hide_index=True, use_container_width=True)
+            if os.environ.get(spans.METRICS_PORT_ENV):
+                st.caption(f"メトリクス: http://127.0.0.1:{os.environ[spans.METRICS_PORT_ENV]}/metrics")
+            report = memprofile.last_report()
+            if report:
+                st.caption(f"メモリ（前回の再実行後）: {report['traced_kb'] / 1024:,.1f} MB"
+                           f"（残った確保 {report['retained']['total_diff_kb']:+,.0f} KB）")
+                st.dataframe(pd.DataFrame(report['retained']['functions'][:5]), hide_index=True, use_container_width=True)
+                st.dataframe(pd.DataFrame(report['caches']), hide_index=True, use_container_width=True)
+        
         # データソース情報
         with st.expander("■ データソース", expanded=False):
             st.write("""
@@ -2695,4 +2661,6 @@ def main():
     
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    # KOTOGAWA_MEMPROFILE を指定したときだけ再実行の前後でメモリを計測する
+    with memprofile.rerun("streamlit_app_old"):
+        main()
\ No newline at end of file
@@ -0,0 +1,90 @@
+"""scripts/collector の観測表の行の選択（観測時刻と日付・時刻が一致する行だけを使う）"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from scripts.collector import parsers
+from scripts.collector.runner import CollectorConfig, FetchResult, collect, parse_results
+from scripts.collector.stub_server import (
+    FIXTURE_OBSERVATION_TIME, FIXTURES_DIR, shift_table_times, start_stub_server
+)
+from scripts.history_store import JST
+
+OBSERVATION_TIME = FIXTURE_OBSERVATION_TIME.replace(tzinfo=JST)
+
+
+def dam_table(rows) -> bytes:
+    """ダム観測表（時刻, 60分雨量, 累加雨量, 貯水位, 貯水率, 流入量, 全放流量）"""
+    body = "".join(f'<tr><td class="time">{time_cell}</td><td>{rain}</td><td>10</td><td>{level}</td>'
+                   f'<td>90.5</td><td>3.2</td><td>1.1</td></tr>' for time_cell, rain, level in rows)
+    return f'<html><head><meta charset="utf-8"></head><body><table>{body}</table></body></html>'.encode('utf-8')
+
+
+def test_row_time():
+    assert parsers.row_time('2025/08/10　06:10', OBSERVATION_TIME) == OBSERVATION_TIME
+    assert parsers.row_time('2025/08/09 06:10', OBSERVATION_TIME) == OBSERVATION_TIME - timedelta(days=1)
+    # 日付のないセルは観測時刻の日付、24:00 は翌日の 0:00
+    assert parsers.row_time('06:10', OBSERVATION_TIME) == OBSERVATION_TIME
+    assert parsers.row_time('2025/08/09 24:00', OBSERVATION_TIME) == datetime(2025, 8, 10, 0, 0, tzinfo=JST)
+    assert parsers.row_time('2025/02/30 06:10', OBSERVATION_TIME) is None
+    assert parsers.row_time('欠測', OBSERVATION_TIME) is None
+
+
+@pytest.mark.parametrize("name", ['dam_table.html', 'dam_table_day_sjis.html'])
+def test_fixture_uses_observation_row(name):
+    rows = parsers.parse_table_rows((FIXTURES_DIR / name).read_bytes())
+    cells = parsers.select_observation_row(rows, OBSERVATION_TIME)
+    assert parsers.row_time(cells[0], OBSERVATION_TIME) == OBSERVATION_TIME
+
+
+def test_table_ending_before_observation_time_is_rejected():
+    # 最後の行が観測時刻より古い（更新されていない表）
+    content = dam_table([('2025/08/10 05:50', '1', '36.10'), ('2025/08/10 06:00', '2', '36.20')])
+    assert parsers.select_observation_row(parsers.parse_table_rows(content), OBSERVATION_TIME) is None
+    with pytest.raises(ValueError):
+        parsers.parse_dam_table(content, OBSERVATION_TIME)
+
+
+def test_previous_day_row_with_same_clock_time_is_rejected():
+    content = dam_table([('2025/08/09 06:00', '1', '36.10'), ('2025/08/09 06:10', '2', '36.20')])
+    with pytest.raises(ValueError):
+        parsers.parse_dam_table(content, OBSERVATION_TIME)
+
+
+def test_observation_row_without_value_is_rejected():
+    content = dam_table([('2025/08/10 06:00', '2', '36.20'), ('2025/08/10 06:10', '-', '-')])
+    with pytest.raises(ValueError):
+        parsers.parse_dam_table(content, OBSERVATION_TIME)
+
+
+def test_matching_row_is_used_even_if_not_last():
+    content = dam_table([('2025/08/10 06:00', '1', '36.10'), ('2025/08/10 06:10', '2', '36.20'),
+                         ('2025/08/10 06:20', '3', '36.30')])
+    section = parsers.parse_dam_table(content, OBSERVATION_TIME)
+    assert section['dam']['water_level'] == 36.2
+    assert section['rainfall']['hourly'] == 2
+
+
+def test_stale_table_counts_as_failed_source():
+    content = dam_table([('2025/08/10 05:50', '1', '36.10'), ('2025/08/10 06:00', '2', '36.20')])
+    results = {'dam': FetchResult(name='dam', url='stub', status=200, content=content)}
+    parsed = parse_results(results, CollectorConfig(), OBSERVATION_TIME)
+    assert 'dam' not in parsed['parsed']
+    assert parsed['errors']['dam'].startswith("parse error")
+
+
+def test_stub_server_shifts_tables_to_requested_time():
+    obs_time = datetime(2026, 1, 1, 0, 0, tzinfo=JST)
+    content = shift_table_times((FIXTURES_DIR / 'river_table.html').read_bytes(), obs_time.strftime('%Y%m%d%H%M'))
+    assert parsers.parse_river_table(content, obs_time)['river']['water_level'] == 2.93
+
+    server = start_stub_server()
+    try:
+        config = CollectorConfig(bousai_base=server.base_url, jma_base=server.base_url)
+        outcome = collect(config, now=obs_time + timedelta(minutes=15))
+    finally:
+        server.shutdown()
+    assert outcome['errors'] == {}
+    assert outcome['snapshot']['data_time'] == obs_time.isoformat()
+    assert outcome['snapshot']['river']['water_level'] == 2.93
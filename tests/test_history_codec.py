@@ -0,0 +1,84 @@
+"""scripts/history_codec.py の圧縮・展開（辞書の有無）"""
+
+import json
+
+import pytest
+
+from scripts import history_codec
+from scripts.history_codec import (
+    available_codecs, build_dictionary, clear_dictionary_cache, compress, decompress, read_bytes,
+    save_dictionary
+)
+from scripts.history_store import write_snapshot
+
+SAMPLES = [
+    json.dumps({
+        'data_time': f"2025-08-05T{hour:02d}:00:00+09:00",
+        'river': {'water_level': 3.0 + hour / 100, 'status': '正常'},
+        'weather': {'today': {'weather_text': 'くもり　時々　晴れ　所により　雨'}},
+    }, ensure_ascii=False).encode('utf-8')
+    for hour in range(24)
+]
+PAYLOAD = SAMPLES[-1]
+
+
+@pytest.fixture(autouse=True)
+def empty_dictionary_cache():
+    clear_dictionary_cache()
+    yield
+    clear_dictionary_cache()
+
+
+@pytest.mark.parametrize("codec", available_codecs())
+def test_round_trip_without_dictionary(tmp_path, codec):
+    assert decompress(compress(PAYLOAD, codec), codec, tmp_path) == PAYLOAD
+    assert decompress(compress(b'', codec), codec, tmp_path) == b''
+
+
+@pytest.mark.parametrize("codec", [codec for codec in available_codecs() if codec != 'gzip'])
+def test_round_trip_with_dictionary(tmp_path, codec):
+    dictionary = build_dictionary(SAMPLES[:-1], codec)
+    save_dictionary(tmp_path, dictionary, codec)
+    payload = compress(PAYLOAD, codec, dictionary)
+    assert len(payload) < len(compress(PAYLOAD, codec))
+    assert decompress(payload, codec, tmp_path) == PAYLOAD
+    # プロセス内のキャッシュからも同じ内容
+    assert decompress(payload, codec, tmp_path) == PAYLOAD
+
+
+def test_gzip_has_no_dictionary():
+    with pytest.raises(ValueError):
+        build_dictionary(SAMPLES, 'gzip')
+
+
+def test_unknown_codec():
+    with pytest.raises(ValueError):
+        compress(PAYLOAD, 'lz4')
+
+
+def test_missing_dictionary_is_not_cached(tmp_path):
+    dictionary = build_dictionary(SAMPLES[:-1], 'zlib')
+    payload = compress(PAYLOAD, 'zlib', dictionary)
+    with pytest.raises(ValueError):
+        decompress(payload, 'zlib', tmp_path)
+    # 後から保存された辞書は、次の展開で読み込まれる
+    save_dictionary(tmp_path, dictionary, 'zlib')
+    assert decompress(payload, 'zlib', tmp_path) == PAYLOAD
+
+
+def test_dictionary_cache_is_bounded(tmp_path):
+    for size in range(history_codec.DICT_CACHE_SIZE + 4):
+        dictionary = build_dictionary(SAMPLES, 'zlib', size=1024 + size)
+        dict_id = save_dictionary(tmp_path, dictionary, 'zlib')
+        assert history_codec.load_dictionary(tmp_path, 'zlib', dict_id) == dictionary
+    assert len(history_codec._dictionaries) == history_codec.DICT_CACHE_SIZE
+
+
+@pytest.mark.parametrize("codec", ['gzip', 'zlib'])
+def test_compressed_snapshot_file(tmp_path, codec):
+    if codec != 'gzip':
+        save_dictionary(tmp_path, build_dictionary(SAMPLES, codec), codec)
+    data = json.loads(PAYLOAD)
+    path = write_snapshot(tmp_path, data, codec=codec)
+    assert path.name == "2300.json" + history_codec.CODEC_SUFFIXES[codec]
+    assert json.loads(read_bytes(path, tmp_path)) == data
@@ -0,0 +1,63 @@
+"""scripts/history_index.py の時刻インデックス（コンパクション・削除後の更新）"""
+
+import shutil
+from datetime import date, datetime, timedelta
+
+from scripts.history_index import HistoryIndex
+from scripts.history_store import JST, compact_history, day_dir_for, write_snapshot
+
+START = datetime(2025, 8, 5, 0, 0, tzinfo=JST)
+
+
+def write_days(history_dir, days: int = 3):
+    for i in range(days * 144):
+        data_dt = START + timedelta(minutes=10 * i)
+        write_snapshot(history_dir, {'data_time': data_dt.isoformat(), 'river': {'water_level': i}})
+
+
+def test_as_of_lookup(tmp_path):
+    write_days(tmp_path)
+    index = HistoryIndex(tmp_path)
+    assert len(index) == 3 * 144
+    assert index.first == START
+    assert index.last == START + timedelta(minutes=10 * (3 * 144 - 1))
+    assert index.key_as_of(START - timedelta(minutes=1)) is None
+    as_of = START + timedelta(hours=1, minutes=15)
+    assert index.key_as_of(as_of) == START + timedelta(hours=1, minutes=10)
+    assert index.snapshot_as_of(as_of)['river'] == {'water_level': 7}
+
+
+def test_refresh_after_compaction(tmp_path):
+    write_days(tmp_path)
+    index = HistoryIndex(tmp_path)
+    as_of = START + timedelta(days=1, hours=2, minutes=5)
+    assert index.snapshot_as_of(as_of)['river'] == {'water_level': 156}
+
+    compact_history(tmp_path, today=date(2025, 8, 10))
+    assert index.refresh()
+    assert not index.refresh()
+    assert len(index) == 3 * 144
+    assert index.snapshot_as_of(as_of)['river'] == {'water_level': 156}
+
+
+def test_stale_location_is_reindexed_without_refresh(tmp_path):
+    write_days(tmp_path)
+    index = HistoryIndex(tmp_path)
+    compact_history(tmp_path, today=date(2025, 8, 10), codec='gzip')
+    # refresh していなくても、読めなくなった日は索引し直して読む
+    assert index.snapshot_as_of(START + timedelta(hours=23, minutes=59))['river'] == {'water_level': 143}
+
+
+def test_refresh_drops_removed_days_and_adds_new_ones(tmp_path):
+    write_days(tmp_path)
+    index = HistoryIndex(tmp_path)
+    shutil.rmtree(day_dir_for(tmp_path, START.date()))
+    assert index.refresh()
+    assert len(index) == 2 * 144
+    assert index.first == START + timedelta(days=1)
+    assert index.snapshot_as_of(START + timedelta(hours=12)) is None
+
+    new_dt = START + timedelta(days=5)
+    write_snapshot(tmp_path, {'data_time': new_dt.isoformat(), 'river': {'water_level': -1}})
+    assert index.refresh()
+    assert index.last == new_dt
@@ -0,0 +1,125 @@
+"""scripts/history_records.py の CompactHistory の往復（スナップショット → 列 → スナップショット）"""
+
+import pickle
+
+import numpy as np
+import pytest
+
+from scripts.history_records import CompactHistory, SnapshotView
+
+WEATHER = {'today': {'weather_text': '晴れ', 'precipitation_probability': [0, 10, 20, 10]}}
+
+
+def make_snapshots():
+    return [
+        {
+            'timestamp': '2025-08-05T10:02:11+09:00',
+            'data_time': '2025-08-05T10:00:00+09:00',
+            'river': {'water_level': 3.02, 'status': '正常', 'level_change': 0.0},
+            'dam': {'water_level': 36.85, 'storage_rate': 91.2, 'inflow': 12.3, 'outflow': 10.0},
+            'rainfall': {'hourly': 0, 'cumulative': 12, 'change': 0},
+            'weather': WEATHER,
+        },
+        {
+            # river.water_level が None、rainfall の節がない
+            'timestamp': '2025-08-05T10:12:05+09:00',
+            'data_time': '2025-08-05T10:10:00+09:00',
+            'river': {'water_level': None, 'status': '欠測', 'level_change': None},
+            'dam': {'water_level': 36.9, 'storage_rate': 91.4, 'inflow': 15, 'outflow': 10.0},
+            'weather': WEATHER,
+        },
+        {
+            # dam.inflow がない、weather がない、rainfall.hourly が float
+            'timestamp': '2025-08-05T10:22:08+09:00',
+            'data_time': '2025-08-05T10:20:00+09:00',
+            'river': {'water_level': 3.1, 'status': '正常', 'level_change': 0.08},
+            'dam': {'water_level': 36.92, 'storage_rate': 91.5, 'outflow': 11.5},
+            'rainfall': {'hourly': 2.5, 'cumulative': 14.5, 'change': 2.5},
+        },
+    ]
+
+
+def test_round_trip_to_dicts():
+    snapshots = make_snapshots()
+    history = CompactHistory.from_snapshots(snapshots)
+    assert len(history) == len(snapshots)
+    assert history.to_dicts() == snapshots
+    assert [dict(view) for view in history] == snapshots
+
+
+def test_nested_sections():
+    history = CompactHistory.from_snapshots(make_snapshots())
+    view = history[0]
+    assert isinstance(view, SnapshotView)
+    assert view['river'] == {'water_level': 3.02, 'status': '正常', 'level_change': 0.0}
+    assert view['dam']['storage_rate'] == 91.2
+    assert view['rainfall'] == {'hourly': 0, 'cumulative': 12, 'change': 0}
+    assert view['weather'] == WEATHER
+    # 入れ子の項目は読むたびに新しいオブジェクト（書き換えても履歴には影響しない）
+    view['weather']['today']['weather_text'] = '雨'
+    assert history[1]['weather'] == WEATHER
+    # 整数の列と小数の列が混ざっても、値の型は元のまま
+    assert isinstance(history[1]['dam']['inflow'], int)
+    assert isinstance(history[0]['rainfall']['hourly'], int)
+    assert isinstance(history[2]['rainfall']['hourly'], float)
+
+
+def test_get_on_missing_sections_and_none_metrics():
+    history = CompactHistory.from_snapshots(make_snapshots())
+    missing_rainfall, missing_weather = history[1], history[2]
+
+    # 節がない行
+    assert 'rainfall' not in missing_rainfall
+    assert missing_rainfall.get('rainfall') is None
+    assert missing_rainfall.get('rainfall', {}).get('hourly') is None
+    with pytest.raises(KeyError):
+        missing_rainfall['rainfall']
+    assert 'weather' not in missing_weather
+    assert missing_weather.get('weather') is None
+    assert 'no_such_key' not in history[0]
+    assert history[0].get('no_such_key', 'default') == 'default'
+
+    # 値が None の項目（キーはある）と、キーそのものがない項目
+    assert missing_rainfall['river']['water_level'] is None
+    assert 'water_level' in missing_rainfall['river']
+    assert 'inflow' not in missing_weather['dam']
+    assert missing_weather.get('dam', {}).get('inflow') is None
+    assert set(missing_weather) == {'timestamp', 'data_time', 'river', 'dam', 'rainfall'}
+    assert len(missing_weather) == 5
+
+
+def test_column_marks_missing_and_none_as_nan():
+    history = CompactHistory.from_snapshots(make_snapshots())
+    levels = history.column('river', 'water_level')
+    assert levels.dtype == np.float64
+    assert levels[0] == 3.02 and np.isnan(levels[1]) and levels[2] == 3.1
+    inflow = history.column('dam', 'inflow')
+    assert inflow[1] == 15 and np.isnan(inflow[2])
+    assert np.isnan(history.column('rainfall', 'hourly')[1])
+    assert np.isnan(history.column('no_such', 'metric')).all()
+    assert list(history.column('river', 'status')) == ['正常', '欠測', '正常']
+
+
+def test_slice_filter_and_negative_index():
+    snapshots = make_snapshots()
+    history = CompactHistory.from_snapshots(snapshots)
+    assert history[1:].to_dicts() == snapshots[1:]
+    assert history[-1].to_dict() == snapshots[-1]
+    assert history.filter(np.array([True, False, True])).to_dicts() == [snapshots[0], snapshots[2]]
+    with pytest.raises(IndexError):
+        history[len(snapshots)]
+
+
+def test_pickle_round_trip():
+    snapshots = make_snapshots()
+    history = CompactHistory.from_snapshots(snapshots)
+    restored = pickle.loads(pickle.dumps(history, protocol=pickle.HIGHEST_PROTOCOL))
+    assert restored.to_dicts() == snapshots
+    assert restored[1:].to_dicts() == snapshots[1:]
+
+
+def test_empty_history():
+    history = CompactHistory.from_snapshots([])
+    assert len(history) == 0
+    assert not history
+    assert history.to_dicts() == []
@@ -0,0 +1,166 @@
+"""scripts/history_retention.py の時間・日集計と保持期間の適用"""
+
+import json
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from scripts.history_retention import (
+    aggregate_day, apply_retention, daily_file, expiring_day_dirs, hourly_file, iter_daily, iter_hourly
+)
+from scripts.history_store import JST, day_dir_for, iter_snapshots, write_snapshot
+
+DAY = date(2025, 8, 5)
+START = datetime(DAY.year, DAY.month, DAY.day, tzinfo=JST)
+
+
+def make_snapshot(data_dt: datetime, level, rain=0) -> dict:
+    return {
+        'data_time': data_dt.isoformat(),
+        'river': {'water_level': level, 'status': '正常'},
+        'dam': {'water_level': 36.5},
+        'rainfall': {'hourly': rain},
+    }
+
+
+def test_aggregate_day_buckets():
+    snapshots = [make_snapshot(START + timedelta(minutes=10 * i), float(i)) for i in range(12)]
+    # None・真偽値・欠損は集計に含めない（スナップショット数には含める）
+    snapshots.append(make_snapshot(START + timedelta(hours=1, minutes=55), None))
+    snapshots.append({'data_time': (START + timedelta(hours=1, minutes=56)).isoformat(), 'river': {'water_level': True}})
+    snapshots.append({'data_time': 'broken'})
+
+    result = aggregate_day(snapshots, DAY)
+    hourly = result['hourly']
+    assert [record['time'] for record in hourly] == [START.isoformat(), (START + timedelta(hours=1)).isoformat()]
+    assert hourly[0]['snapshots'] == 6
+    assert hourly[0]['metrics']['river_water_level'] == {'min': 0.0, 'max': 5.0, 'mean': 2.5, 'count': 6}
+    assert hourly[1]['snapshots'] == 8
+    assert hourly[1]['metrics']['river_water_level'] == {'min': 6.0, 'max': 11.0, 'mean': 8.5, 'count': 6}
+    assert hourly[1]['metrics']['dam_water_level']['count'] == 7
+    assert 'dam_inflow' not in hourly[0]['metrics']
+
+    daily = result['daily']
+    assert daily['time'] == START.isoformat()
+    assert daily['snapshots'] == 14
+    assert daily['metrics']['river_water_level'] == {'min': 0.0, 'max': 11.0, 'mean': 5.5, 'count': 12}
+    assert daily['metrics']['rainfall_hourly'] == {'min': 0.0, 'max': 0.0, 'mean': 0.0, 'count': 13}
+
+
+def write_days(history_dir, days: int):
+    for day in range(days):
+        for i in range(144):
+            data_dt = START + timedelta(days=day, minutes=10 * i)
+            write_snapshot(history_dir, make_snapshot(data_dt, float(i % 6), rain=day))
+
+
+def read_records(path) -> list:
+    return [json.loads(line) for line in path.read_text(encoding='utf-8').splitlines()]
+
+
+def test_apply_retention_archives_expired_days(tmp_path):
+    history_dir, archive_dir = tmp_path / "history", tmp_path / "archive"
+    write_days(history_dir, 4)
+    today = DAY + timedelta(days=4)
+
+    dry = apply_retention(history_dir, archive_dir, raw_days=2, today=today, dry_run=True)
+    assert dry['expired_days'] == ['2025-08-05', '2025-08-06']
+    assert dry['deleted_files'] == 288
+    assert dry['snapshots'] == 0
+    assert not archive_dir.exists()
+    assert len(expiring_day_dirs(history_dir, 2, today)) == 2
+
+    stats = apply_retention(history_dir, archive_dir, raw_days=2, today=today)
+    assert stats['expired_days'] == dry['expired_days']
+    assert stats['deleted_files'] == dry['deleted_files']
+    assert stats['freed_bytes'] == dry['freed_bytes']
+    assert stats['snapshots'] == 288
+    assert stats['hourly_records'] == 48
+    assert stats['daily_records'] == 2
+    assert not day_dir_for(history_dir, DAY).exists()
+    assert day_dir_for(history_dir, DAY + timedelta(days=2)).exists()
+
+    hourly = read_records(hourly_file(archive_dir, DAY))
+    assert len(hourly) == 48
+    assert hourly[0]['metrics']['river_water_level'] == {'min': 0.0, 'max': 5.0, 'mean': 2.5, 'count': 6}
+    daily = read_records(daily_file(archive_dir, DAY))
+    assert [record['metrics']['rainfall_hourly']['max'] for record in daily] == [0.0, 1.0]
+
+    # 再実行しても重複して追記しない
+    again = apply_retention(history_dir, archive_dir, raw_days=2, today=today)
+    assert again['expired_days'] == []
+    assert len(read_records(daily_file(archive_dir, DAY))) == 2
+
+
+def test_apply_retention_removes_expired_hourly_files(tmp_path):
+    history_dir, archive_dir = tmp_path / "history", tmp_path / "archive"
+    write_days(history_dir, 1)
+    apply_retention(history_dir, archive_dir, raw_days=0, today=DAY + timedelta(days=1))
+    assert hourly_file(archive_dir, DAY).exists()
+
+    stats = apply_retention(history_dir, archive_dir, raw_days=0, hourly_days=30, today=date(2025, 10, 1))
+    assert stats['removed_hourly_files'] == ["hourly/2025/08.ndjson"]
+    assert not hourly_file(archive_dir, DAY).exists()
+    # 日集計は無期限に残す
+    assert daily_file(archive_dir, DAY).exists()
+
+
+def test_apply_retention_without_archive(tmp_path):
+    history_dir, archive_dir = tmp_path / "history", tmp_path / "archive"
+    write_days(history_dir, 2)
+    stats = apply_retention(history_dir, archive_dir, raw_days=1, today=DAY + timedelta(days=2), archive=False)
+    assert stats['expired_days'] == ['2025-08-05']
+    assert stats['snapshots'] == 0
+    assert not archive_dir.exists()
+    assert not day_dir_for(history_dir, DAY).exists()
+
+
+@pytest.mark.parametrize("raw_days", [7, 30])
+def test_nothing_expires_within_raw_days(tmp_path, raw_days):
+    write_days(tmp_path / "history", 2)
+    stats = apply_retention(tmp_path / "history", tmp_path / "archive", raw_days=raw_days,
+                            today=DAY + timedelta(days=2))
+    assert stats['expired_days'] == [] and stats['deleted_files'] == 0
+
+
+def test_archived_days_read_back(tmp_path):
+    history_dir, archive_dir = tmp_path / "history", tmp_path / "archive"
+    write_days(history_dir, 3)
+    second_day = START + timedelta(days=1)
+    expected = aggregate_day(list(iter_snapshots(history_dir, second_day, second_day + timedelta(hours=23, minutes=50))),
+                             DAY + timedelta(days=1))
+    apply_retention(history_dir, archive_dir, raw_days=1, today=DAY + timedelta(days=3))
+    assert list(iter_snapshots(history_dir, START, second_day + timedelta(hours=23, minutes=50))) == []
+
+    # 生データを削除した日も、集計から読める（期間の両端を含む）
+    hourly = list(iter_hourly(archive_dir, second_day, second_day + timedelta(hours=23)))
+    assert hourly == expected['hourly']
+    assert [record['time'] for record in iter_hourly(archive_dir, second_day + timedelta(minutes=30),
+                                                     second_day + timedelta(hours=2))] == [
+        (second_day + timedelta(hours=1)).isoformat(), (second_day + timedelta(hours=2)).isoformat()
+    ]
+    daily = list(iter_daily(archive_dir, START, START + timedelta(days=10)))
+    assert [record['time'] for record in daily] == [START.isoformat(), second_day.isoformat()]
+    assert daily[1] == expected['daily']
+    # 再実行しても同じ区間は1件
+    apply_retention(history_dir, archive_dir, raw_days=1, today=DAY + timedelta(days=3))
+    assert len(list(iter_daily(archive_dir, START, START + timedelta(days=10)))) == 2
+
+
+def test_archive_readers_cross_month_and_year(tmp_path):
+    archive_dir = tmp_path / "archive"
+    for day in (date(2024, 12, 31), date(2025, 1, 1)):
+        start = datetime(day.year, day.month, day.day, tzinfo=JST)
+        snapshots = [make_snapshot(start + timedelta(hours=hour), float(hour)) for hour in range(24)]
+        history_dir = tmp_path / "history"
+        for data in snapshots:
+            write_snapshot(history_dir, data)
+    apply_retention(tmp_path / "history", archive_dir, raw_days=0, today=date(2025, 1, 2))
+
+    start, end = datetime(2024, 12, 31, 22, tzinfo=JST), datetime(2025, 1, 1, 1, tzinfo=JST)
+    assert [record['time'] for record in iter_hourly(archive_dir, start, end)] == [
+        '2024-12-31T22:00:00+09:00', '2024-12-31T23:00:00+09:00',
+        '2025-01-01T00:00:00+09:00', '2025-01-01T01:00:00+09:00'
+    ]
+    assert len(list(iter_daily(archive_dir, datetime(2024, 12, 1, tzinfo=JST), end))) == 2
+    assert list(iter_daily(tmp_path / "missing", start, end)) == []
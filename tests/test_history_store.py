@@ -0,0 +1,151 @@
+"""scripts/history_store.py の日次ログへのコンパクションと期間の読み込み"""
+
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from scripts.history_codec import CODEC_SUFFIXES
+from scripts.history_store import (
+    DAY_INDEX_NAME, DAY_LOG_NAME, JST, _seek_offset, append_snapshot, compact_day, compact_history, day_dir_for,
+    day_log_path, iter_snapshots, loose_snapshot_files, read_day_index, snapshot_key, write_snapshot
+)
+
+START = datetime(2025, 8, 5, 0, 0, tzinfo=JST)
+
+
+def make_snapshot(data_dt: datetime, level: float) -> dict:
+    return {
+        'timestamp': (data_dt + timedelta(minutes=2)).isoformat(),
+        'data_time': data_dt.isoformat(),
+        'river': {'water_level': level, 'status': '正常'},
+        'dam': {'water_level': 36.0 + level / 100, 'outflow': 10.0},
+        'rainfall': {'hourly': 0, 'cumulative': 0},
+    }
+
+
+def write_days(history_dir, days: int = 3, mode: str = "files"):
+    snapshots = [make_snapshot(START + timedelta(minutes=10 * i), round(i * 0.01, 2)) for i in range(days * 144)]
+    for data in snapshots:
+        write_snapshot(history_dir, data, mode=mode)
+    return snapshots
+
+
+def read_range(history_dir, start: datetime, end: datetime) -> list:
+    return list(iter_snapshots(history_dir, start, end))
+
+
+RANGES = [
+    (START, START + timedelta(days=3)),
+    (START + timedelta(hours=5, minutes=5), START + timedelta(hours=30)),
+    (START + timedelta(days=1), START + timedelta(days=1)),
+    (START + timedelta(days=2, hours=23, minutes=55), START + timedelta(days=4)),
+]
+
+
+@pytest.mark.parametrize("codec", [None, "gzip", "zlib"])
+def test_compact_day_keeps_iter_snapshots_results(tmp_path, codec):
+    snapshots = write_days(tmp_path)
+    before = [read_range(tmp_path, start, end) for start, end in RANGES]
+    assert before[0] == snapshots
+
+    stats = compact_history(tmp_path, today=date(2025, 8, 10), codec=codec)
+    assert stats['compacted_days'] == 3
+    assert stats['snapshots'] == len(snapshots)
+    for day in range(3):
+        day_dir = day_dir_for(tmp_path, (START + timedelta(days=day)).date())
+        assert loose_snapshot_files(day_dir) == []
+        assert (day_dir / DAY_INDEX_NAME).exists()
+        assert day_log_path(day_dir).name.startswith(DAY_LOG_NAME)
+
+    assert [read_range(tmp_path, start, end) for start, end in RANGES] == before
+    # 2回目は何もしない
+    assert compact_history(tmp_path, today=date(2025, 8, 10), codec=codec)['compacted_days'] == 0
+
+
+def test_compact_day_takes_in_loose_files_added_later(tmp_path):
+    write_days(tmp_path, days=1)
+    day_dir = day_dir_for(tmp_path, START.date())
+    assert compact_day(day_dir) == 144
+    late = make_snapshot(START + timedelta(hours=3, minutes=5), -1.0)
+    write_snapshot(tmp_path, late)
+    assert len(loose_snapshot_files(day_dir)) == 1
+
+    day = read_range(tmp_path, START, START + timedelta(days=1))
+    assert len(day) == 145
+    assert [snapshot_key(data) for data in day] == sorted(snapshot_key(data) for data in day)
+
+    assert compact_day(day_dir) == 145
+    assert loose_snapshot_files(day_dir) == []
+    assert read_range(tmp_path, START, START + timedelta(days=1)) == day
+
+
+def test_append_keeps_day_log_sorted(tmp_path):
+    snapshots = write_days(tmp_path, days=1, mode="ndjson")
+    day_dir = day_dir_for(tmp_path, START.date())
+    assert len(read_day_index(day_dir)) == 144
+
+    # 同じ時刻は追記しない
+    assert append_snapshot(tmp_path, snapshots[10]) is None
+    # ログの最後より前の時刻はバラのファイルに書き、ログは時刻順のまま
+    late = make_snapshot(START + timedelta(hours=1, minutes=5), -1.0)
+    assert append_snapshot(tmp_path, late) is None
+    entries = read_day_index(day_dir)
+    assert len(entries) == 144
+    assert [key for key, _ in entries] == sorted(key for key, _ in entries)
+    assert len(loose_snapshot_files(day_dir)) == 1
+
+    start = START + timedelta(hours=1)
+    window = read_range(tmp_path, start, start + timedelta(minutes=20))
+    assert [snapshot_key(data) for data in window] == [
+        '2025-08-05T01:00:00+09:00', late['data_time'], '2025-08-05T01:10:00+09:00', '2025-08-05T01:20:00+09:00'
+    ]
+
+
+def test_seek_with_index_matches_full_scan(tmp_path):
+    snapshots = write_days(tmp_path, days=1, mode="ndjson")
+    for minutes in (0, 1, 9, 10, 11, 715, 1430, 1435):
+        start = START + timedelta(minutes=minutes)
+        expected = [data for data in snapshots if start.isoformat() <= data['data_time']]
+        assert read_range(tmp_path, start, START + timedelta(days=1)) == expected
+
+
+def test_seek_offset_bisects_index(tmp_path):
+    # ワークフローの Python 3.9 でも動く（bisect の key= を使わない）
+    day_dir = tmp_path / "2025" / "08" / "05"
+    day_dir.mkdir(parents=True)
+    (day_dir / DAY_INDEX_NAME).write_text(
+        "broken\t0\n"
+        "2025-08-05T00:00:00+09:00\t10\n"
+        "2025-08-05T00:10:00+09:00\t20\n"
+        "2025-08-05T00:20:00+09:00\t30\n", encoding='utf-8')
+    assert _seek_offset(day_dir, START - timedelta(hours=1)) == 10
+    assert _seek_offset(day_dir, START) == 10
+    assert _seek_offset(day_dir, START + timedelta(minutes=5)) == 20
+    assert _seek_offset(day_dir, START + timedelta(minutes=20)) == 30
+    # 開始時刻以降の行がなければ末尾の行から
+    assert _seek_offset(day_dir, START + timedelta(hours=1)) == 30
+
+
+@pytest.mark.parametrize("codec", ["gzip", "zlib"])
+def test_compaction_without_codec_keeps_compressed_logs(tmp_path, codec):
+    write_days(tmp_path, days=2)
+    compact_history(tmp_path, today=date(2025, 8, 10), codec=codec)
+    first, second = (day_dir_for(tmp_path, (START + timedelta(days=day)).date()) for day in range(2))
+    compressed = day_log_path(first)
+    assert compressed.name == DAY_LOG_NAME + CODEC_SUFFIXES[codec]
+    before = read_range(tmp_path, START, START + timedelta(days=2))
+
+    # 既定（codec=None）の夜間のコンパクションは圧縮済みの日を書き直さない
+    mtime = compressed.stat().st_mtime_ns
+    assert compact_history(tmp_path, today=date(2025, 8, 10))['compacted_days'] == 0
+    assert day_log_path(first) == compressed
+    assert compressed.stat().st_mtime_ns == mtime
+
+    # 遅れて届いたファイルを取り込むときも、今の圧縮形式のまま
+    write_snapshot(tmp_path, make_snapshot(START + timedelta(days=1, minutes=5), -1.0))
+    assert compact_history(tmp_path, today=date(2025, 8, 10))['days'] == ['2025-08-06']
+    assert day_log_path(second).name == DAY_LOG_NAME + CODEC_SUFFIXES[codec]
+    assert len(read_range(tmp_path, START, START + timedelta(days=2))) == len(before) + 1
+
+    # 形式を指定すれば変換する
+    assert compact_history(tmp_path, today=date(2025, 8, 10), codec='gzip' if codec == 'zlib' else 'zlib')['compacted_days'] == 2